@@ -6,9 +6,49 @@
 # for details.
 ##########################################################################
 
+import sys
+import importlib
+
 from .info import __version__
 from .utils import tree
 from .parser import LogParser
-from .manager import dump_log_es
-from .manager import load_log_es
-from .manager import match
+from .parser import ParserProfile
+from .cache import ParseCache
+from .store import ColumnarStore
+from .timestamps import TimestampNormalizer
+from .stats import ParseStats
+
+# The storage symbols are imported on first access: their modules import the
+# elasticsearch and sqlite3 modules that are slow to import
+_LAZY_SYMBOLS = {
+    "LogBackend": "backends",
+    "SQLiteBackend": "backends",
+    "dump_log_es": "manager",
+    "load_log_es": "manager",
+    "iter_log_es": "manager",
+    "match": "manager",
+    "LogStore": "manager"
+}
+
+
+def __getattr__(name):
+    """ Import a storage symbol.
+    """
+    if name not in _LAZY_SYMBOLS:
+        raise AttributeError("module '{0}' has no attribute '{1}'".format(
+            __name__, name))
+    module = importlib.import_module("." + _LAZY_SYMBOLS[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_SYMBOLS))
+
+
+# COMPATIBILITY: the module attributes can be lazily computed since python
+# 3.7
+if sys.version_info[:2] < (3, 7):
+    for _name in _LAZY_SYMBOLS:
+        __getattr__(_name)
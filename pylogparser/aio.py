@@ -0,0 +1,444 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+"""
+Asyncio counterparts of the parsing and manager functions, available since
+python 3.5.
+
+The log files are parsed in an executor by independent parsers, thus the
+ingestion of many projects can overlap. The ES requests are sent with an
+asynchronous client, by default an 'elasticsearch_async.AsyncElasticsearch'
+client, and at most 'concurrency' requests are pending at the same time.
+The blocking work is run in an executor.
+"""
+
+# System import
+from __future__ import print_function
+import json
+import asyncio
+import functools
+from collections import OrderedDict
+# COMPATIBILITY: the asynchronous ES client is an optional dependency
+try:
+    from elasticsearch_async import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+
+# Pylogparser import
+from .parser import LogParser
+from .manager import MAPPING
+from .manager import _PAGE_SIZE
+from .manager import _add_match
+from .manager import _check_item
+from .manager import _get_matches
+from .manager import _iter_actions
+from .manager import _load_query
+from .manager import _match_body
+from .manager import _older_body
+
+
+async def parse_logfile(logfile, executor=None, data=None, **kwargs):
+    """ Parse a log file in an executor with an independent parser.
+
+    See 'pylogparser.LogParser.parse_logfile' for the parameters
+    description.
+
+    Parameters
+    ----------
+    executor: Executor (optional, default None)
+        the executor running the parsing, None for the loop default
+        executor.
+    data: dict (optional, default None)
+        the empty dataset of the independent parser, for instance an empty
+        'ColumnarStore'. If None, an empty dictionary.
+
+    Returns
+    -------
+    data: dict
+        the parsed dataset, that can be merged in a shared parser with
+        'LogParser.merge'.
+    """
+    return await _run_parser(executor, "parse_logfile", data, (logfile, ),
+                             kwargs)
+
+
+async def load(json_file, executor=None, data=None, **kwargs):
+    """ Load data from a Json configuration file in an executor with an
+    independent parser.
+
+    See 'pylogparser.LogParser.load' for the parameters description.
+
+    Parameters
+    ----------
+    executor: Executor (optional, default None)
+        the executor running the parsing, None for the loop default
+        executor.
+    data: dict (optional, default None)
+        the empty dataset of the independent parser, for instance an empty
+        'ColumnarStore'. If None, an empty dictionary.
+
+    Returns
+    -------
+    data: dict
+        the parsed dataset.
+    """
+    return await _run_parser(executor, "load", data, (json_file, ), kwargs)
+
+
+async def match(match_name, login, password, url="localhost", port=9200,
+                match_value=None, index=None, doc_type=None, verbose=0,
+                client=None):
+    """ Match the first occurence of an element in ElasticSearch (ES).
+
+    See 'pylogparser.manager.match' for the parameters description.
+
+    Parameters
+    ----------
+    client: object (optional, default None)
+        an asynchronous ES client whose connections are reused. If set, the
+        login, password, url and port parameters are ignored.
+
+    Return
+    ------
+    matches: dict
+        the requested matches.
+    """
+    es, owner = _get_client(login, password, url, port, client)
+    try:
+        result = await es.search(index=index, doc_type=doc_type,
+                                 body=_match_body(match_name, match_value))
+        if verbose > 1:
+            print("[info] '{0} hits found.".format(result["hits"]["total"]))
+        mismatches = []
+        matches = _get_matches(result, match_name, match_value, mismatches)
+        for index_name, doc_type_name in mismatches:
+            offset = 1
+            while True:
+                hits = (await es.search(
+                    index=index_name, doc_type=doc_type_name,
+                    body=_older_body(match_name, match_value, offset)))[
+                        "hits"]["hits"]
+                if (_add_match(matches, hits, match_name, match_value) or
+                        len(hits) < _PAGE_SIZE):
+                    break
+                offset += len(hits)
+    finally:
+        if owner:
+            await es.transport.close()
+    return matches
+
+
+async def dump_log_es(data, login, password, url="localhost", port=9200,
+                      verbose=0, chunk_size=500,
+                      max_chunk_bytes=100 * 1024 ** 2, concurrency=4,
+                      client=None, executor=None):
+    """ Dump log data in an elesticsearch (ES) database.
+
+    The mappings are defined concurrently before any record is sent, then
+    the bulk requests are sent concurrently. The records are serialized in
+    an executor one chunk at a time, while the previous chunks are sent,
+    and at most 'concurrency' serialized chunks are kept in memory.
+
+    See 'pylogparser.manager.dump_log_es' for the parameters description.
+
+    Parameters
+    ----------
+    concurrency: int (optional, default 4)
+        the maximum number of pending ES requests.
+    client: object (optional, default None)
+        an asynchronous ES client whose connections are reused. If set, the
+        login, password, url and port parameters are ignored.
+    executor: Executor (optional, default None)
+        the executor running the blocking work, None for the loop default
+        executor.
+
+    Returns
+    -------
+    errors: list of dict
+        the ES response item of each record that failed to be inserted.
+    """
+    es, owner = _get_client(login, password, url, port, client)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_event_loop()
+    try:
+        # Define the mappings
+        await asyncio.gather(*[
+            _send(semaphore, es.indices.create, index=index, ignore=400)
+            for index in data])
+        await asyncio.gather(*[
+            _send(semaphore, es.indices.put_mapping, dtype, MAPPING, [index])
+            for index, index_struct in data.items()
+            for dtype in index_struct])
+
+        # Parse and save log data
+        chunks = _iter_chunks(data, chunk_size, max_chunk_bytes, verbose)
+        tasks = []
+        pending = set()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    executor, next, chunks, None)
+                if chunk is None:
+                    break
+                task = asyncio.ensure_future(_send(semaphore, es.bulk, chunk))
+                tasks.append(task)
+                pending.add(task)
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    finally:
+        if owner:
+            await es.transport.close()
+    errors = []
+    for result in results:
+        for item in result["items"]:
+            item = item["index"]
+            if not _check_item(200 <= item.get("status", 500) < 300, item,
+                               verbose):
+                errors.append(item)
+
+    return errors
+
+
+async def load_log_es(login, password, url="localhost", port=9200,
+                      verbose=0, index=None, preserve_order=True, size=1000,
+                      concurrency=4, client=None):
+    """ Load all the data of an elasticsearch (ES) database.
+
+    The indices are paged concurrently with the scroll API.
+
+    See 'pylogparser.manager.load_log_es' for the parameters description.
+
+    Parameters
+    ----------
+    concurrency: int (optional, default 4)
+        the maximum number of pending ES requests.
+    client: object (optional, default None)
+        an asynchronous ES client whose connections are reused. If set, the
+        login, password, url and port parameters are ignored.
+
+    Returns
+    -------
+    data: dict
+        a dictionary containing the ES log data.
+    """
+    es, owner = _get_client(login, password, url, port, client)
+    semaphore = asyncio.Semaphore(concurrency)
+    query = _load_query(preserve_order)
+    try:
+        if index is None:
+            indices = list((await _send(
+                semaphore, es.indices.get_aliases)).keys())
+        else:
+            indices = [index]
+        results = await asyncio.gather(*[
+            _scroll(semaphore, es, name, query, size) for name in indices])
+    finally:
+        if owner:
+            await es.transport.close()
+
+    # Get all data
+    data = OrderedDict()
+    nb_hits = 0
+    for hits in results:
+        for hit in hits:
+            _data = data
+            for key in (hit["_index"], hit["_type"], hit["_id"]):
+                if key not in _data:
+                    _data[key] = OrderedDict()
+                _data = _data[key]
+            _data.update(hit["_source"])
+            nb_hits += 1
+    if verbose > 1:
+        print("[info] '{0} hits found.".format(nb_hits))
+
+    return data
+
+
+async def _run_parser(executor, method, data, args, kwargs):
+    """ Run a parsing method of an independent parser in an executor.
+
+    Parameters
+    ----------
+    executor: Executor (mandatory)
+        the executor running the parsing, None for the loop default
+        executor.
+    method: str (mandatory)
+        the parsing method name.
+    data: dict (mandatory)
+        the empty dataset of the independent parser, may be None.
+    args, kwargs: tuple and dict (mandatory)
+        the method parameters.
+
+    Returns
+    -------
+    data: dict
+        the parsed dataset.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, functools.partial(
+        _parse, method, data, args, kwargs))
+
+
+def _parse(method, data, args, kwargs):
+    """ Parse data with an independent parser. This function is defined at
+    the module level in order to be sent to the worker processes of a
+    process pool executor.
+
+    Parameters
+    ----------
+    method: str (mandatory)
+        the parsing method name.
+    data: dict (mandatory)
+        the empty dataset of the independent parser, may be None.
+    args, kwargs: tuple and dict (mandatory)
+        the method parameters.
+
+    Returns
+    -------
+    data: dict
+        the parsed dataset.
+    """
+    parser = LogParser.isolated(data)
+    getattr(parser, method)(*args, **kwargs)
+    return parser.data
+
+
+def _get_client(login, password, url, port, client):
+    """ Get an asynchronous ES client.
+
+    Parameters
+    ----------
+    login: str (mandatory)
+        the login used to contact ES.
+    password: str (mandatory)
+        the password used to contact ES.
+    url: str (mandatory)
+        the ES URL.
+    port: int (mandatory)
+        the port ES is listen to.
+    client: object (mandatory)
+        an asynchronous ES client, None to create a new client.
+
+    Returns
+    -------
+    es: object
+        the asynchronous ES client.
+    owner: bool
+        True if the client has been created and must be closed.
+    """
+    if client is not None:
+        return client, False
+    if AsyncElasticsearch is None:
+        raise ValueError("An asynchronous ES client can't be created without "
+                         "the 'elasticsearch_async' module.")
+    return AsyncElasticsearch(
+        [url], http_auth=(login, password), port=port), True
+
+
+async def _send(semaphore, method, *args, **kwargs):
+    """ Send an ES request when less than the maximum number of requests
+    are pending.
+
+    Parameters
+    ----------
+    semaphore: Semaphore (mandatory)
+        the pending requests counter.
+    method: callable (mandatory)
+        the asynchronous ES client method.
+    args, kwargs: (optional)
+        the method parameters.
+
+    Returns
+    -------
+    result: object
+        the ES response.
+    """
+    async with semaphore:
+        return await method(*args, **kwargs)
+
+
+async def _scroll(semaphore, es, index, query, size):
+    """ Page through all the hits of an index with the scroll API.
+
+    Parameters
+    ----------
+    semaphore: Semaphore (mandatory)
+        the pending requests counter.
+    es: object (mandatory)
+        the asynchronous ES client.
+    index: str (mandatory)
+        an ES index.
+    query: dict (mandatory)
+        the ES query.
+    size: int (mandatory)
+        the number of hits of each page.
+
+    Returns
+    -------
+    hits: list of dict
+        the ES hits.
+    """
+    result = await _send(semaphore, es.search, index=index, body=query,
+                         scroll="5m", size=size)
+    scroll_id = result.get("_scroll_id")
+    hits = []
+    try:
+        while scroll_id is not None and result["hits"]["hits"]:
+            hits.extend(result["hits"]["hits"])
+            result = await _send(semaphore, es.scroll, scroll_id=scroll_id,
+                                 scroll="5m")
+            scroll_id = result.get("_scroll_id")
+    finally:
+        if scroll_id is not None:
+            await _send(semaphore, es.clear_scroll,
+                        body={"scroll_id": [scroll_id]}, ignore=(404, ))
+    return hits
+
+
+def _iter_chunks(data, chunk_size, max_chunk_bytes, verbose=0):
+    """ Serialize the bulk actions inserting log data in chunks, one chunk
+    at a time.
+
+    Parameters
+    ----------
+    data: dict (mandatory)
+        a dictionary containing the parsed log data.
+    chunk_size: int (mandatory)
+        the maximum number of records of a chunk.
+    max_chunk_bytes: int (mandatory)
+        the maximum size in bytes of a chunk.
+    verbose: int (optional, default 0)
+        control the verbosity level.
+
+    Returns
+    -------
+    chunks: generator of str
+        the ES bulk requests bodies.
+    """
+    lines = []
+    nb_bytes = 0
+    for action in _iter_actions(data, verbose):
+        source = action.pop("_source")
+        new_lines = [json.dumps({"index": action}), json.dumps(source)]
+        new_bytes = sum(len(line.encode("utf-8")) + 1 for line in new_lines)
+        if lines and (len(lines) // 2 >= chunk_size or
+                      nb_bytes + new_bytes > max_chunk_bytes):
+            yield "\n".join(lines) + "\n"
+            lines = []
+            nb_bytes = 0
+        lines.extend(new_lines)
+        nb_bytes += new_bytes
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,318 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import json
+import sqlite3
+from pprint import pprint
+from collections import OrderedDict
+
+# Pylogparser import
+from .timestamps import TimestampNormalizer
+
+
+class LogBackend(object):
+    """ The interface of the log data storages.
+
+    The log data are organized by project (ie. an ES index), job (ie. an
+    ES type) and timestamp.
+
+    Methods
+    -------
+    dump
+    load
+    match
+    close
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def dump(self, data, verbose=0):
+        """ Dump log data.
+
+        Parameters
+        ----------
+        data: dict (mandatory)
+            a dictionary containing the parsed log data.
+        verbose: int (optional, default 0)
+            control the verbosity level.
+
+        Returns
+        -------
+        errors: list of dict
+            the description of each record that failed to be inserted.
+        """
+        raise NotImplementedError("The 'dump' method is not implemented.")
+
+    def load(self, verbose=0):
+        """ Load all the log data.
+
+        Parameters
+        ----------
+        verbose: int (optional, default 0)
+            control the verbosity level.
+
+        Returns
+        -------
+        data: dict
+            a dictionary containing the log data, the records of each job
+            are sorted by decreasing timestamps.
+        """
+        raise NotImplementedError("The 'load' method is not implemented.")
+
+    def match(self, match_name, match_value=None, index=None, doc_type=None,
+              verbose=0):
+        """ Match the latest occurence of an element in each job.
+
+        Parameters
+        ----------
+        match_name: str (mandatory)
+            the element name to be matched.
+        match_value: object (optional, default None)
+            the element value to be matched. If None, the element value of
+            the latest record is returned.
+        index: str (optional, default None)
+            a project.
+        doc_type: str (optional, default None)
+            a job.
+        verbose: int (optional, default 0)
+            the verbosity level.
+
+        Returns
+        -------
+        matches: dict
+            the requested matches.
+        """
+        raise NotImplementedError("The 'match' method is not implemented.")
+
+    def close(self):
+        """ Release the storage resources.
+        """
+        pass
+
+
+def _field_key(value):
+    """ Get the key of an indexed field value: the numbers are normalized,
+    thus the values that are equal in python, eg. 1, 1.0 and True, have the
+    same key.
+
+    Parameters
+    ----------
+    value: object (mandatory)
+        a Json serializable value.
+
+    Returns
+    -------
+    key: str
+        the value key.
+    """
+    def normalize(value):
+        if isinstance(value, bool) or (
+                isinstance(value, float) and value.is_integer()):
+            return int(value)
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if isinstance(value, dict):
+            return dict((key, normalize(item)) for key, item in value.items())
+        return value
+    return json.dumps(normalize(value), sort_keys=True)
+
+
+class SQLiteBackend(LogBackend):
+    """ A log data storage in a local SQLite database.
+
+    The records are stored as Json documents in a 'records' table indexed
+    by project, job and timestamp. The values of the indexed fields are also
+    stored in a 'fields' table indexed by field name and value, thus a match
+    on an indexed field is an indexed SQL query. The values are stored as
+    keys that are equal if the values are equal in python, eg. 1 and 1.0,
+    as in the scan of the records.
+
+    Attributes
+    ----------
+    `connection`: sqlite3.Connection
+        the database connection.
+    `fields`: list of str
+        the indexed fields.
+    `batch_size`: int
+        the number of records inserted by each SQL statement.
+    """
+    def __init__(self, path=":memory:", fields=None, batch_size=500):
+        """ Initialize the 'SQLiteBackend' class.
+
+        Parameters
+        ----------
+        path: str (optional, default ':memory:')
+            the database file, created if necessary.
+        fields: list of str (optional, default None)
+            the fields to be indexed, the existing records are indexed if
+            necessary. The previously indexed fields remain indexed.
+        batch_size: int (optional, default 500)
+            the number of records inserted by each SQL statement.
+        """
+        self.connection = sqlite3.connect(path)
+        self.batch_size = batch_size
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    project TEXT NOT NULL,
+                    job TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (project, job, timestamp));
+                CREATE TABLE IF NOT EXISTS fields (
+                    name TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    project TEXT NOT NULL,
+                    job TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    PRIMARY KEY (project, job, timestamp, name));
+                CREATE INDEX IF NOT EXISTS fields_value
+                    ON fields (name, value, project, job, timestamp);
+                CREATE TABLE IF NOT EXISTS indexed_fields (
+                    name TEXT PRIMARY KEY);
+            """)
+        self.fields = [row[0] for row in self.connection.execute(
+            "SELECT name FROM indexed_fields ORDER BY name")]
+        for name in fields or []:
+            if name not in self.fields:
+                self._index_field(name)
+
+    def dump(self, data, verbose=0):
+        """ Dump log data, the existing records are replaced.
+        See 'LogBackend.dump' for the parameters description.
+        """
+        records = []
+        normalizer = TimestampNormalizer()
+        for index, index_struct in data.items():
+            for dtype, dtype_struct in index_struct.items():
+                for timestamp, sdata in dtype_struct.items():
+                    if verbose > 1:
+                        print("[info] Inserting '{0}-{1}-{2}' in SQLite."
+                              .format(index, dtype, timestamp))
+                    timestamp = normalizer.normalize(
+                        timestamp, (index, dtype))
+                    sdata = dict(sdata)
+                    sdata["timestamp"] = timestamp
+                    records.append((index, dtype, timestamp, sdata))
+                    if len(records) >= self.batch_size:
+                        self._insert(records)
+                        records = []
+        if records:
+            self._insert(records)
+        return []
+
+    def load(self, verbose=0):
+        """ Load all the log data.
+        See 'LogBackend.load' for the parameters description.
+        """
+        data = OrderedDict()
+        nb_hits = 0
+        for index, dtype, timestamp, sdata in self.connection.execute(
+                "SELECT project, job, timestamp, data FROM records "
+                "ORDER BY project, job, timestamp DESC"):
+            data.setdefault(index, OrderedDict()).setdefault(
+                dtype, OrderedDict())[timestamp] = json.loads(sdata)
+            nb_hits += 1
+        if verbose > 1:
+            print("[info] '{0} records found.".format(nb_hits))
+        return data
+
+    def match(self, match_name, match_value=None, index=None, doc_type=None,
+              verbose=0):
+        """ Match the latest occurence of an element in each job. The match
+        of a value of a not indexed field scans the records.
+        See 'LogBackend.match' for the parameters description.
+        """
+        conditions = []
+        parameters = []
+        for column, value in (("project", index), ("job", doc_type)):
+            if value is not None:
+                conditions.append("{0} = ?".format(column))
+                parameters.append(value)
+        matches = {}
+        if match_value is not None and match_name in self.fields:
+            rows = self.connection.execute(
+                "SELECT project, job, data, MAX(timestamp) FROM fields "
+                "JOIN records USING (project, job, timestamp) "
+                "WHERE " + " AND ".join(
+                    ["name = ?", "value = ?"] + conditions) + " "
+                "GROUP BY project, job",
+                [match_name, _field_key(match_value)] + parameters)
+            for project, job, sdata, timestamp in rows:
+                matches.setdefault(project, {})[job] = json.loads(
+                    sdata)[match_name]
+        else:
+            rows = self.connection.execute(
+                "SELECT project, job, data FROM records " + (
+                    "WHERE " + " AND ".join(conditions) + " "
+                    if conditions else "") +
+                "ORDER BY project, job, timestamp DESC", parameters)
+            for project, job, sdata in rows:
+                if job in matches.get(project, {}):
+                    continue
+                value = json.loads(sdata).get(match_name, None)
+                if match_value is not None and value != match_value:
+                    continue
+                matches.setdefault(project, {})[job] = value
+        if verbose > 0:
+            print("Matches for '{0}={1}'...".format(match_name, match_value))
+            pprint(matches)
+        return matches
+
+    def close(self):
+        """ Close the database connection.
+        """
+        self.connection.close()
+
+    def _insert(self, records):
+        """ Insert or replace records in a single transaction.
+
+        Parameters
+        ----------
+        records: list of 4-uplet (mandatory)
+            the (project, job, timestamp, data) records.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM fields WHERE project = ? AND job = ? AND "
+                "timestamp = ?", [record[:3] for record in records])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                [record[:3] + (json.dumps(record[3]), )
+                 for record in records])
+            self.connection.executemany(
+                "INSERT INTO fields VALUES (?, ?, ?, ?, ?)",
+                [(name, _field_key(record[3][name])) + record[:3]
+                 for record in records
+                 for name in self.fields if name in record[3]])
+
+    def _index_field(self, name):
+        """ Index a field of the existing records.
+
+        Parameters
+        ----------
+        name: str (mandatory)
+            the field name.
+        """
+        rows = self.connection.execute(
+            "SELECT project, job, timestamp, data FROM records").fetchall()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO indexed_fields VALUES (?)", (name, ))
+            self.connection.executemany(
+                "INSERT INTO fields VALUES (?, ?, ?, ?, ?)",
+                [(name, _field_key(sdata[name]), project, job, timestamp)
+                 for project, job, timestamp, sdata in (
+                     row[:3] + (json.loads(row[3]), ) for row in rows)
+                 if name in sdata])
+        self.fields.append(name)
@@ -0,0 +1,527 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+"""
+Benchmarks of the log parser.
+
+Run 'python -m pylogparser.benchmark' to time the parsing steps and the
+manager functions against a local ES stub, to compare the matching engines,
+the compressed log files streaming and the records stores on synthetic logs,
+and to time the package import. Run it with '--help' to configure the
+synthetic logs and to write the results in a Json file, in order to compare
+the results of different versions.
+"""
+
+# System import
+from __future__ import print_function
+import os
+import sys
+import bz2
+import json
+import gzip
+import time
+import argparse
+import platform
+import shutil
+import datetime
+import subprocess
+import tempfile
+# COMPATIBILITY: the lzma module is available since python 3.3
+try:
+    import lzma
+except ImportError:
+    lzma = None
+# COMPATIBILITY: the tracemalloc module is available since python 3.4
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Pylogparser import
+from pylogparser.info import __version__
+from pylogparser.manager import dump_log_es
+from pylogparser.manager import load_log_es
+from pylogparser.manager import match
+from pylogparser.parser import LogParser
+from pylogparser.store import ColumnarStore
+from pylogparser.utils import tree
+from pylogparser.testing import ElasticsearchStub
+
+
+def write_logfile(logfile, nb_jobs=1000, nb_fields=20, noise_ratio=0.5):
+    """ Write a synthetic log file in the 'fsreconall' format.
+
+    Parameters
+    ----------
+    logfile: str (mandatory)
+        the destination log file.
+    nb_jobs: int (optional, default 1000)
+        the number of jobs in the log.
+    nb_fields: int (optional, default 20)
+        the number of custom fields logged for each job.
+    noise_ratio: float (optional, default 0.5)
+        the number of lines that match no pattern for each matching line.
+
+    Returns
+    -------
+    custom_patterns: dict of dict
+        the custom patterns describing the generated fields: the
+        'code_in_study', 'cmd', 'exitcode' and 'hostname' fields of the demo
+        log files followed by 'field<i>' fields.
+    """
+    start = datetime.datetime(2015, 11, 10)
+    noise = 0.
+    with open(logfile, "wt") as open_file:
+        for job_index in range(nb_jobs):
+            date = start + datetime.timedelta(minutes=job_index)
+            prefix = "{0},539 - INFO - job_{1}.".format(
+                date.strftime("%Y-%m-%dT%H:%M:%S"), job_index + 1)
+            fields = [
+                "subjectid = {0:04d}".format(job_index % 10000),
+                "cmd = recon-all -all -s {0:04d}".format(job_index % 10000),
+                "exitcode = {0}".format(job_index % 2),
+                "hostname = host{0}.domain".format(job_index % 8)]
+            fields.extend("field{0} = value{1}".format(index, job_index)
+                          for index in range(len(fields), nb_fields))
+            for field in fields[:nb_fields]:
+                open_file.write("{0}{1}\n".format(prefix, field))
+                noise += noise_ratio
+                while noise >= 1:
+                    open_file.write("{0}fsdir = /my/path/freesurfer\n".format(
+                        prefix))
+                    noise -= 1
+    demo_patterns = [
+        ("code_in_study", r"subjectid = \d{4}"),
+        ("cmd", "cmd = .*"),
+        ("exitcode", r"exitcode = \d"),
+        ("hostname", "hostname = .*")]
+    demo_patterns.extend(
+        ("field{0}".format(index), "field{0} = .*".format(index))
+        for index in range(len(demo_patterns), nb_fields))
+    custom_patterns = dict(
+        (name, {"regex": regex, "splitter": (" = ", 1)})
+        for name, regex in demo_patterns[:nb_fields])
+    return custom_patterns
+
+
+def write_logdirs(dirname, nb_jobs=100, nb_fields=5):
+    """ Write synthetic job directories in the 'dtifit' format.
+
+    Parameters
+    ----------
+    dirname: str (mandatory)
+        the destination directory.
+    nb_jobs: int (optional, default 100)
+        the number of job directories.
+    nb_fields: int (optional, default 5)
+        the number of outputs logged for each job.
+
+    Returns
+    -------
+    logfiles: list of dict
+        the 'LogParser.parse_logdir' log files of each job directory.
+    """
+    start = datetime.datetime(2016, 7, 13)
+    jobs_logfiles = []
+    for job_index in range(nb_jobs):
+        subjectid = "{0:04d}".format(job_index % 10000)
+        jobdir = os.path.join(dirname, "dtifit_{0:04d}".format(job_index))
+        os.makedirs(jobdir)
+        subjdir = "/my/path/connectomist/{0}/dtifit".format(subjectid)
+        date = start + datetime.timedelta(seconds=job_index)
+        contents = {
+            "runtime.json": {
+                "connectomist_version": "6.0",
+                "timestamp": date.isoformat(),
+                "tool": "pyconnectomist_dtifit",
+                "tool_version": "2.0.0"
+            },
+            "inputs.json": {
+                "outdir": "/my/path/connectomist",
+                "subjdir": subjdir,
+                "subjectid": subjectid
+            },
+            "outputs.json": {
+                "scalars": dict(
+                    ("scalar{0}".format(index),
+                     "{0}/dti_scalar{1}.nii.gz".format(subjdir, index))
+                    for index in range(nb_fields))
+            }
+        }
+        logfiles = {}
+        for basename, content in contents.items():
+            path = os.path.join(jobdir, basename)
+            with open(path, "wt") as open_file:
+                json.dump(content, open_file, indent=4)
+            logfiles[path] = (basename == "runtime.json")
+        jobs_logfiles.append(logfiles)
+    return jobs_logfiles
+
+
+def benchmark_engines(logfile, job_pattern, timestamp_pattern,
+                      custom_patterns, hierarchy=None, repeat=3):
+    """ Time the parsing of a log file with each matching engine, with and
+    without the literal prefilter, and in memory map mode.
+
+    Parameters
+    ----------
+    logfile : str (mandatory)
+        a log file to be parsed.
+    job_pattern : str (mandatory)
+        the regular expression used to detect the job IDs.
+    timestamp_pattern : str (mandatory)
+        the regular expression used to detect the timestamps.
+    custom_patterns : dict of dict (mandatory)
+        the custom patterns as described in 'LogParser.parse_logfile'.
+    hierarchy: dict (optional, default None)
+        the parsed log final organization.
+    repeat: int (optional, default 3)
+        the number of runs, the best one is kept.
+
+    Returns
+    -------
+    results: dict
+        the best parsing throughput in lines/sec for each engine, the
+        '-prefilter' suffixed keys for the prefiltered runs and the '-mmap'
+        suffixed keys for the memory map runs.
+    """
+    if hierarchy is None:
+        hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
+    with open(logfile, "rt") as open_file:
+        nb_lines = sum(1 for row in open_file)
+    results = {}
+    for engine in ("loop", "combined"):
+        for suffix, prefilter, memory_map in (
+                ("", False, False), ("-prefilter", True, False),
+                ("-mmap", None, True)):
+            patterns = LogParser._compile_patterns(
+                job_pattern, timestamp_pattern, custom_patterns, engine,
+                prefilter)
+            timings = []
+            for cnt in range(repeat):
+                start = time.time()
+                LogParser._parse(
+                    LogParser._iter_matches(logfile, *patterns,
+                                            memory_map=memory_map),
+                    logfile, hierarchy)
+                timings.append(time.time() - start)
+            results[engine + suffix] = nb_lines / max(min(timings), 1e-9)
+    return results
+
+
+def benchmark_compression(logfile, job_pattern, timestamp_pattern,
+                          custom_patterns, hierarchy=None, repeat=3):
+    """ Time the parsing of a log file and of its compressed copies.
+
+    Parameters
+    ----------
+    logfile : str (mandatory)
+        an uncompressed log file to be parsed.
+    job_pattern : str (mandatory)
+        the regular expression used to detect the job IDs.
+    timestamp_pattern : str (mandatory)
+        the regular expression used to detect the timestamps.
+    custom_patterns : dict of dict (mandatory)
+        the custom patterns as described in 'LogParser.parse_logfile'.
+    hierarchy: dict (optional, default None)
+        the parsed log final organization.
+    repeat: int (optional, default 3)
+        the number of runs, the best one is kept.
+
+    Returns
+    -------
+    results: dict
+        the best parsing throughput in lines/sec of the uncompressed log
+        file ('plain' key) and of each compressed format.
+    """
+    openers = [("gzip", gzip.GzipFile), ("bz2", bz2.BZ2File)]
+    if lzma is not None:
+        openers.append(("xz", lzma.LZMAFile))
+    with open(logfile, "rt") as open_file:
+        nb_lines = sum(1 for row in open_file)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        logfiles = [("plain", logfile)]
+        for name, opener in openers:
+            path = os.path.join(tmpdir, "{0}.{1}".format(
+                os.path.basename(logfile), name))
+            with open(logfile, "rb") as in_file:
+                with opener(path, "wb") as out_file:
+                    shutil.copyfileobj(in_file, out_file)
+            logfiles.append((name, path))
+        results = {}
+        for name, path in logfiles:
+            timings = []
+            for cnt in range(repeat):
+                start = time.time()
+                LogParser._parse_logfile(
+                    path, job_pattern, timestamp_pattern, custom_patterns,
+                    hierarchy)
+                timings.append(time.time() - start)
+            results[name] = nb_lines / max(min(timings), 1e-9)
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def benchmark_store(logfile, job_pattern, timestamp_pattern, custom_patterns,
+                    hierarchy=None):
+    """ Measure the memory used by the parsed records in nested dictionaries
+    and in a columnar store.
+
+    Parameters
+    ----------
+    logfile : str (mandatory)
+        a log file to be parsed.
+    job_pattern : str (mandatory)
+        the regular expression used to detect the job IDs.
+    timestamp_pattern : str (mandatory)
+        the regular expression used to detect the timestamps.
+    custom_patterns : dict of dict (mandatory)
+        the custom patterns as described in 'LogParser.parse_logfile'.
+    hierarchy: dict (optional, default None)
+        the parsed log final organization.
+
+    Returns
+    -------
+    results: dict
+        the memory in bytes used by the 'dict' and the 'columnar' records,
+        empty if the memory can't be traced.
+    """
+    if tracemalloc is None:
+        return {}
+    results = {}
+    for name, store in (("dict", {}), ("columnar", ColumnarStore())):
+        tracemalloc.start()
+        records = LogParser._parse_logfile(
+            logfile, job_pattern, timestamp_pattern, custom_patterns,
+            hierarchy)
+        if isinstance(store, ColumnarStore):
+            store.merge(records)
+        else:
+            LogParser._merge_records(store, records)
+        del records
+        results[name] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return results
+
+
+def benchmark_suite(dirname, nb_jobs=1000, nb_fields=20, noise_ratio=0.5,
+                    nb_dirs=100, repeat=3):
+    """ Time the parsing steps, the description file loading, the tree
+    display and the manager functions against a local ES stub on synthetic
+    logs.
+
+    Parameters
+    ----------
+    dirname: str (mandatory)
+        the directory where the synthetic logs are written.
+    nb_jobs: int (optional, default 1000)
+        the number of jobs in the synthetic log file.
+    nb_fields: int (optional, default 20)
+        the number of custom fields logged for each job.
+    noise_ratio: float (optional, default 0.5)
+        the number of lines that match no pattern for each matching line.
+    nb_dirs: int (optional, default 100)
+        the number of synthetic job directories.
+    repeat: int (optional, default 3)
+        the number of runs, the best one is kept.
+
+    Returns
+    -------
+    results: dict
+        the best duration in seconds of each step.
+    """
+    # Write the synthetic logs and their description
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    logfile = os.path.join(dirname, "fsreconall.txt")
+    custom_patterns = write_logfile(logfile, nb_jobs, nb_fields, noise_ratio)
+    jobs_logfiles = write_logdirs(os.path.join(dirname, "dtifit"), nb_dirs)
+    kwargs = {
+        "job_pattern": r"job_\d+",
+        "timestamp_pattern": r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+        "custom_patterns": custom_patterns
+    }
+    description = {
+        "profiles": {
+            "freesurfer": dict(jobs_alias="project_freesurfer", **kwargs),
+            "dtifit": {
+                "job_name": "project_dtifit",
+                "timestamp_key": "timestamp",
+                "hierarchy": {"job_name": {"subjectid": {"timestamp": {
+                    "custom_data": None}}}},
+                "extract_keys": ["subjectid"]
+            }
+        },
+        "fsreconall": {"type": "logfile", "logfile": logfile,
+                       "profile": "freesurfer"}
+    }
+    for index, logfiles in enumerate(jobs_logfiles):
+        description["dtifit{0}".format(index)] = {
+            "type": "logdir", "logfiles": logfiles, "profile": "dtifit"}
+    description_file = os.path.join(dirname, "description.json")
+    with open(description_file, "wt") as open_file:
+        json.dump(description, open_file)
+
+    # Prepare the parsing steps inputs
+    hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
+    patterns = LogParser._compile_patterns(
+        kwargs["job_pattern"], kwargs["timestamp_pattern"], custom_patterns)
+    matches = list(LogParser._iter_matches(logfile, *patterns))
+    records = LogParser._parse(matches, logfile, hierarchy)
+    items = []
+    for (job_id, timestamp), record in records:
+        record = dict(record)
+        record.update(job_id=job_id, timestamp=timestamp)
+        items.append(record)
+    data = {"project_freesurfer": LogParser._get_struct(records)}
+
+    # Time the steps: the description is loaded in independent parsers in
+    # order to leave the shared parser dataset untouched
+    parsers = [LogParser.isolated()]
+
+    def parse():
+        LogParser._parse(matches, logfile, hierarchy)
+
+    def load():
+        parsers[0] = LogParser.isolated()
+        parsers[0].load(description_file)
+
+    def display():
+        stdout = sys.stdout
+        with open(os.devnull, "wt") as sys.stdout:
+            try:
+                tree(parsers[0].data, display_content=True)
+            finally:
+                sys.stdout = stdout
+
+    steps = [
+        ("_parse", parse, None),
+        ("_get_records", LogParser._get_records,
+         lambda: [[dict(item) for item in items], hierarchy]),
+        ("_merge_records", LogParser._merge_records, lambda: [{}, records]),
+        ("load", load, None),
+        ("tree", display, None)]
+    results = {}
+    with ElasticsearchStub() as stub:
+        es_kwargs = {"login": "login", "password": "password",
+                     "url": "localhost",
+                     "port": stub.port}
+        steps.extend([
+            ("dump_log_es", lambda: dump_log_es(data, **es_kwargs), None),
+            ("load_log_es", lambda: load_log_es(**es_kwargs), None),
+            ("match", lambda: match("exitcode", match_value="1",
+                                    **es_kwargs), None)])
+        for name, function, inputs in steps:
+            timings = []
+            for cnt in range(repeat):
+                args = inputs() if inputs is not None else []
+                start = time.time()
+                function(*args)
+                timings.append(time.time() - start)
+            results[name] = min(timings)
+    return results
+
+
+def benchmark_import(repeat=5):
+    """ Time the package import in new interpreters, with and without the
+    storage functions.
+
+    Parameters
+    ----------
+    repeat: int (optional, default 5)
+        the number of runs, the best one is kept.
+
+    Returns
+    -------
+    results: dict
+        the best duration in seconds of the interpreter start ('python'
+        key), of a parse-only import ('parser' key) and of an import using
+        the storage functions ('manager' key).
+    """
+    statements = {
+        "python": "pass",
+        "parser": "import pylogparser; pylogparser.LogParser()",
+        "manager": "import pylogparser; pylogparser.LogParser(); "
+                   "pylogparser.LogStore"
+    }
+    results = {}
+    for name, statement in statements.items():
+        timings = []
+        for cnt in range(repeat):
+            start = time.time()
+            subprocess.check_call([sys.executable, "-c", statement])
+            timings.append(time.time() - start)
+        results[name] = min(timings)
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=(
+        "Benchmark pylogparser on synthetic hopla/FreeSurfer logs."))
+    parser.add_argument("-o", "--output", help=(
+        "the Json file where the results are written."))
+    parser.add_argument("-j", "--jobs", type=int, default=1000, help=(
+        "the number of jobs in the synthetic log file."))
+    parser.add_argument("-f", "--fields", type=int, default=20, help=(
+        "the number of custom fields logged for each job."))
+    parser.add_argument("-n", "--noise", type=float, default=0.5, help=(
+        "the number of not matching lines for each matching line."))
+    parser.add_argument("-d", "--dirs", type=int, default=100, help=(
+        "the number of synthetic job directories."))
+    parser.add_argument("-r", "--repeat", type=int, default=3, help=(
+        "the number of runs, the best one is kept."))
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        suite_results = benchmark_suite(
+            os.path.join(tmpdir, "suite"), args.jobs, args.fields, args.noise,
+            args.dirs, args.repeat)
+        logfile = os.path.join(tmpdir, "fsreconall.txt")
+        custom_patterns = write_logfile(logfile, args.jobs, args.fields,
+                                        args.noise)
+        kwargs = {
+            "job_pattern": r"job_\d+",
+            "timestamp_pattern": r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": custom_patterns
+        }
+        results = benchmark_engines(logfile, **kwargs)
+        compression_results = benchmark_compression(logfile, **kwargs)
+        store_results = benchmark_store(logfile, **kwargs)
+        import_results = benchmark_import()
+    finally:
+        shutil.rmtree(tmpdir)
+    for name, duration in sorted(suite_results.items()):
+        print("[info] '{0}': {1:.3f} sec.".format(name, duration))
+    for engine, throughput in sorted(results.items()):
+        print("[info] '{0}' engine: {1:.0f} lines/sec, {2:.1f}x.".format(
+            engine, throughput, throughput / results["loop"]))
+    for fmt, throughput in sorted(compression_results.items()):
+        print("[info] '{0}' log file: {1:.0f} lines/sec, {2:.1f}x.".format(
+            fmt, throughput, throughput / compression_results["plain"]))
+    for name, size in sorted(store_results.items()):
+        print("[info] '{0}' records: {1:.1f} MB, {2:.2f}x.".format(
+            name, size / 1024. ** 2, float(size) / store_results["dict"]))
+    for name, duration in sorted(import_results.items()):
+        print("[info] '{0}' import: {1:.3f} sec.".format(name, duration))
+    if args.output is not None:
+        with open(args.output, "wt") as open_file:
+            json.dump({
+                "version": __version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "parameters": vars(args),
+                "suite": suite_results,
+                "engines": results,
+                "compression": compression_results,
+                "store": store_results,
+                "import": import_results
+            }, open_file, indent=4, sort_keys=True)
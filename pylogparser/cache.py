@@ -0,0 +1,219 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import os
+import json
+import glob
+import pickle
+import hashlib
+import tempfile
+
+
+class ParseCache(object):
+    """ A persistent on-disk cache of the parsed log structures.
+
+    An entry is keyed by the parsed files fingerprints (path, size,
+    modification time and optionally a content hash) and by the parsing
+    configuration. Each entry is stored in a pickle file with a '.paths'
+    sidecar listing the parsed files. When the cache exceeds its size limit,
+    the least recently used entries are removed.
+
+    Attributes
+    ----------
+    `cachedir`: str
+        the cache directory.
+    `max_size`: int
+        the cache size limit in bytes.
+    `content_hash`: bool
+        if set, the files content hash is part of the keys.
+
+    Methods
+    -------
+    key
+    get
+    set
+    invalidate
+    """
+    def __init__(self, cachedir, max_size=100 * 1024 ** 2,
+                 content_hash=False):
+        """ Initialize the 'ParseCache' class.
+
+        Parameters
+        ----------
+        cachedir: str (mandatory)
+            the cache directory, created if necessary.
+        max_size: int (optional, default 100MB)
+            the cache size limit in bytes.
+        content_hash: bool (optional, default False)
+            if set, the files content hash is part of the keys. Otherwise a
+            file is considered unchanged if its size and modification time
+            are unchanged.
+        """
+        self.cachedir = os.path.abspath(cachedir)
+        self.max_size = max_size
+        self.content_hash = content_hash
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    def key(self, logfiles, config):
+        """ Compute the key of a parsing.
+
+        Parameters
+        ----------
+        logfiles: list of str (mandatory)
+            the parsed files.
+        config: dict (mandatory)
+            the Json serializable parsing configuration.
+
+        Returns
+        -------
+        key: str
+            the parsing key.
+        """
+        fingerprints = []
+        for path in logfiles:
+            stat = os.stat(path)
+            fingerprint = [os.path.abspath(path), stat.st_size, stat.st_mtime]
+            if self.content_hash:
+                fingerprint.append(self._hash_file(path))
+            fingerprints.append(fingerprint)
+        description = json.dumps([sorted(fingerprints), config],
+                                 sort_keys=True)
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Load a cached parsing.
+
+        Parameters
+        ----------
+        key: str (mandatory)
+            the parsing key.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) parsed items, None if the key is not
+            cached.
+        """
+        path = os.path.join(self.cachedir, key + ".pkl")
+        try:
+            with open(path, "rb") as open_file:
+                entry = pickle.load(open_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path, None)
+        return entry.get("records")
+
+    def set(self, key, logfiles, records):
+        """ Cache a parsing and evict the least recently used entries if the
+        cache exceeds its size limit.
+
+        Parameters
+        ----------
+        key: str (mandatory)
+            the parsing key.
+        logfiles: list of str (mandatory)
+            the parsed files.
+        records: list of 2-uplet (mandatory)
+            the (key path, record) parsed items.
+        """
+        entry = {"records": records}
+        self._write(key + ".paths", "\n".join(
+            os.path.abspath(path) for path in logfiles).encode("utf-8"))
+        self._write(key + ".pkl", pickle.dumps(
+            entry, pickle.HIGHEST_PROTOCOL))
+        self._evict()
+
+    def invalidate(self, logfile=None):
+        """ Remove cached parsings.
+
+        Parameters
+        ----------
+        logfile: str (optional, default None)
+            remove the entries involving this file. If None, remove all the
+            entries.
+        """
+        for path in glob.glob(os.path.join(self.cachedir, "*.paths")):
+            if logfile is not None:
+                with open(path, "rb") as open_file:
+                    logfiles = open_file.read().decode("utf-8").split("\n")
+                if os.path.abspath(logfile) not in logfiles:
+                    continue
+            self._remove(os.path.basename(path)[:-len(".paths")])
+
+    def _evict(self):
+        """ Remove the least recently used entries until the cache size is
+        under its limit.
+        """
+        entries = []
+        total_size = 0
+        for path in glob.glob(os.path.join(self.cachedir, "*.pkl")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(os.path.basename(path)[:-len(".pkl")])
+            total_size -= size
+
+    def _remove(self, key):
+        """ Remove a cached parsing.
+
+        Parameters
+        ----------
+        key: str (mandatory)
+            the parsing key.
+        """
+        for ext in (".pkl", ".paths"):
+            try:
+                os.remove(os.path.join(self.cachedir, key + ext))
+            except OSError:
+                pass
+
+    def _write(self, basename, content):
+        """ Atomically write a cache file, the cache may be shared by
+        several processes.
+
+        Parameters
+        ----------
+        basename: str (mandatory)
+            the cache file name.
+        content: bytes (mandatory)
+            the cache file content.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cachedir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as open_file:
+            open_file.write(content)
+        # COMPATIBILITY: atomic replace is available since python 3.3
+        getattr(os, "replace", os.rename)(
+            tmp_path, os.path.join(self.cachedir, basename))
+
+    def _hash_file(self, path):
+        """ Compute the content hash of a file.
+
+        Parameters
+        ----------
+        path: str (mandatory)
+            the file path.
+
+        Returns
+        -------
+        digest: str
+            the file content SHA1 digest.
+        """
+        digest = hashlib.sha1()
+        with open(path, "rb") as open_file:
+            for block in iter(lambda: open_file.read(1024 ** 2), b""):
+                digest.update(block)
+        return digest.hexdigest()
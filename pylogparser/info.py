@@ -56,4 +56,6 @@ REQUIRES = [
     "elasticsearch>=2.3.0",
     "python-dateutil>=1.5"
 ]
-EXTRA_REQUIRES = {}
+EXTRA_REQUIRES = {
+    "aio": ["elasticsearch-async>=1.0.0"]
+}
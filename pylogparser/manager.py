@@ -11,16 +11,153 @@ from __future__ import print_function
 from pprint import pprint
 from collections import OrderedDict
 from elasticsearch import Elasticsearch
-from dateutil import parser
+from elasticsearch import helpers
 
-# Pylogparser imports.
-from pylogparser import tree
+# Pylogparser import
+from .backends import LogBackend
+from .timestamps import TimestampNormalizer
+
+
+# The number of records of a type checked by each search when the latest
+# filtered record of the type has another value type
+_PAGE_SIZE = 100
+
+# The mapping of the log data: the strings are not analyzed, thus they are
+# matched as a whole by the term filters
+MAPPING = {
+    "dynamic_templates": [{
+        "strings": {
+            "match_mapping_type": "string",
+            "mapping": {
+                "type": "string",
+                "index": "not_analyzed"
+            }
+        }
+    }],
+    "properties": {
+        "timestamp": {
+            "type": "date"
+        }
+    }
+}
+
+
+class LogStore(LogBackend):
+    """ An elasticsearch (ES) session owning one client with a pool of
+    persistent connections.
+
+    The manager functions accept a session in order to reuse its
+    connections instead of reconnecting at each call. The session is also
+    the ES log data storage backend.
+
+    Attributes
+    ----------
+    `client`: Elasticsearch
+        the ES client.
+
+    Methods
+    -------
+    dump
+    load
+    match
+    close
+    """
+    def __init__(self, login, password, url="localhost", port=9200,
+                 maxsize=10, timeout=10, max_retries=3, retry_on_timeout=True):
+        """ Initialize the 'LogStore' class.
+
+        Parameters
+        ----------
+        login: str (mandatory)
+            the login used to contact ES.
+        password: str (mandatory)
+            the password used to contact ES.
+        url: str (optional, default 'localhost')
+            the ES URL.
+        port: int (optional, default 9200)
+            the port ES is listen to.
+        maxsize: int (optional, default 10)
+            the maximum number of kept alive connections.
+        timeout: float (optional, default 10)
+            the requests timeout in seconds.
+        max_retries: int (optional, default 3)
+            the maximum number of retries of a failed request.
+        retry_on_timeout: bool (optional, default True)
+            if set, the timed out requests are retried.
+        """
+        self.client = Elasticsearch(
+            [url], http_auth=(login, password), port=port, maxsize=maxsize,
+            timeout=timeout, max_retries=max_retries,
+            retry_on_timeout=retry_on_timeout)
+
+    def dump(self, data, verbose=0, **kwargs):
+        """ Dump log data with 'dump_log_es'.
+        See 'LogBackend.dump' for the parameters description.
+        """
+        return dump_log_es(data, None, None, verbose=verbose, store=self,
+                           **kwargs)
+
+    def load(self, verbose=0, **kwargs):
+        """ Load all the log data with 'load_log_es'.
+        See 'LogBackend.load' for the parameters description.
+        """
+        return load_log_es(None, None, verbose=verbose, store=self, **kwargs)
+
+    def match(self, match_name, match_value=None, index=None, doc_type=None,
+              verbose=0):
+        """ Match the latest occurence of an element in each type with
+        'match'.
+        See 'LogBackend.match' for the parameters description.
+        """
+        return match(match_name, None, None, match_value=match_value,
+                     index=index, doc_type=doc_type, verbose=verbose,
+                     store=self)
+
+    def close(self):
+        """ Close the session connections.
+        """
+        self.client.transport.close()
+
+
+def _get_client(login, password, url, port, store):
+    """ Get an ES client.
+
+    Parameters
+    ----------
+    login: str (mandatory)
+        the login used to contact ES.
+    password: str (mandatory)
+        the password used to contact ES.
+    url: str (mandatory)
+        the ES URL.
+    port: int (mandatory)
+        the port ES is listen to.
+    store: LogStore (mandatory)
+        an ES session, None to create a new client.
+
+    Returns
+    -------
+    es: Elasticsearch
+        the session client or a new client.
+    """
+    if store is not None:
+        return store.client
+    return Elasticsearch([url], http_auth=(login, password), port=port)
 
 
 def match(match_name, login, password, url="localhost", port=9200,
-          match_value=None, index=None, doc_type=None, verbose=0):
+          match_value=None, index=None, doc_type=None, verbose=0,
+          store=None):
     """ Match the first occurence of an element in ElasticSearch (ES).
 
+    The records are filtered and the latest matching record of each type is
+    selected by ES, thus only these records are sent back. If this record
+    value has another type, eg. the string '1' for the number 1, the older
+    records of its type are searched. The string values are only matched in
+    the types dumped with the not analyzed strings mapping of 'dump_log_es':
+    the indices dumped by previous versions must be deleted and dumped
+    again.
+
     Parameters
     ----------
     match_name: str (mandatory)
@@ -41,36 +178,39 @@ def match(match_name, login, password, url="localhost", port=9200,
         an ES type.
     verbose: int (optional, default 0)
         the verbosity level.
+    store: LogStore (optional, default None)
+        an ES session whose connections are reused. If set, the login,
+        password, url and port parameters are ignored.
 
     Return
     ------
     matches: dict
         the requested matches.
     """
-    # Get all the data
-    data = load_log_es(login, password, url=url, port=port, verbose=verbose)
-    if index is not None:
-        if doc_type is not None:
-            data = {index: {doc_type: data[index][doc_type]}}
-        else:
-            data = {index: data[index]}
+    # Create a connection
+    es = _get_client(login, password, url, port, store)
+
+    # Get the latest matching record of each index and type
+    body = _match_body(match_name, match_value)
+    result = es.search(index=index, doc_type=doc_type, body=body)
     if verbose > 1:
-        print("Data...")
-        tree(data, level=2, display_content=False)
+        print("[info] '{0} hits found.".format(result["hits"]["total"]))
 
-    # Get all matches
-    matches = {}
-    for index, index_struct in data.items():
-        for doc_type, doc_type_struct in index_struct.items():
-            for timestamp, record in doc_type_struct.items():
-                value = record.get(match_name, None)
-                if match_value is not None and value != match_value:
-                    continue
-                if index not in matches:
-                    matches[index] = {}
-                if doc_type not in matches[index]:
-                    matches[index][doc_type] = value
+    # Get all matches: the older records of the types whose latest filtered
+    # record has another value type are searched
+    mismatches = []
+    matches = _get_matches(result, match_name, match_value, mismatches)
+    for index_name, doc_type_name in mismatches:
+        offset = 1
+        while True:
+            hits = es.search(
+                index=index_name, doc_type=doc_type_name,
+                body=_older_body(match_name, match_value, offset))[
+                    "hits"]["hits"]
+            if (_add_match(matches, hits, match_name, match_value) or
+                    len(hits) < _PAGE_SIZE):
                 break
+            offset += len(hits)
     if verbose > 0:
         print("Matches for '{0}={1}'...".format(match_name, match_value))
         pprint(matches)
@@ -79,9 +219,16 @@ def match(match_name, login, password, url="localhost", port=9200,
 
 
 def dump_log_es(data, login, password, url="localhost", port=9200,
-                verbose=0):
+                verbose=0, chunk_size=500, max_chunk_bytes=100 * 1024 ** 2,
+                workers=1, store=None):
     """ Dump log data in an elesticsearch (ES) database.
 
+    The records are sent with the bulk API in chunks, and the mapping is
+    defined before any record is sent. The strings are mapped as not
+    analyzed values, as expected by 'match'. The mapping of the existing
+    fields of an index can't be changed: an index dumped by a previous
+    version must be deleted and dumped again.
+
     Parameters
     ----------
     data: dict (mandatory)
@@ -96,39 +243,94 @@ def dump_log_es(data, login, password, url="localhost", port=9200,
         the port ES is listen to.
     verbose: int (optional, default 0)
         control the verbosity level.
+    chunk_size: int (optional, default 500)
+        the maximum number of records sent in one bulk request.
+    max_chunk_bytes: int (optional, default 100MB)
+        the maximum size in bytes of a bulk request.
+    workers: int (optional, default 1)
+        the number of threads sending the bulk requests in parallel.
+    store: LogStore (optional, default None)
+        an ES session whose connections are reused. If set, the login,
+        password, url and port parameters are ignored.
+
+    Returns
+    -------
+    errors: list of dict
+        the ES response item of each record that failed to be inserted.
     """
     # Create a connection
-    es = Elasticsearch([url], http_auth=(login, password), port=port)
+    es = _get_client(login, password, url, port, store)
 
     # Define a mapping
-    mapping = {
-        "properties": {
-            "timestamp": {
-                "type": "date"
-            }
-        }
-    }
+    for index, index_struct in data.items():
+        es.indices.create(index=index, ignore=400)
+        for dtype in index_struct:
+            es.indices.put_mapping(dtype, MAPPING, [index])
 
     # Parse and save log data
-    for index, index_struct in data.items():
-        for dtype, dtype_struct in index_struct.items():
-            for timestamp, sdata in dtype_struct.items():
-                if verbose > 1:
-                    print("[info] Inserting '{0}-{1}-{2}' in ES.".format(
-                        index, dtype, timestamp))
-                date = parser.parse(timestamp)
-                timestamp = date.isoformat()
-                sdata["timestamp"] = timestamp
-                result = es.index(index=index, doc_type=dtype, id=timestamp,
-                                  body=sdata)
-                if verbose > 0 and not result["created"]:
-                    print(
-                        "[warn] '{0}-{1}-{2}' ES path already exists.".format(
-                            index, dtype, timestamp))
-            es.indices.put_mapping(dtype, mapping, [index])
+    actions = _iter_actions(data, verbose)
+    kwargs = {"chunk_size": chunk_size, "max_chunk_bytes": max_chunk_bytes,
+              "raise_on_error": False, "raise_on_exception": False}
+    if workers > 1:
+        results = helpers.parallel_bulk(es, actions, thread_count=workers,
+                                        **kwargs)
+    else:
+        results = helpers.streaming_bulk(es, actions, **kwargs)
+    errors = []
+    for success, item in results:
+        if not _check_item(success, item["index"], verbose):
+            errors.append(item["index"])
+
+    return errors
+
+
+def iter_log_es(login, password, url="localhost", port=9200, index=None,
+                preserve_order=True, size=1000, store=None):
+    """ Iterate over the records of an elasticsearch (ES) database.
 
+    The hits are paged with the scroll API, thus all the records are loaded
+    while only one page of hits is kept in memory.
+
+    Parameters
+    ----------
+    login: str (mandatory)
+        the login used to contact ES.
+    password: str (mandatory)
+        the password used to contact ES.
+    url: str (optional, default 'localhost')
+        the ES URL.
+    port: int (optional, default 9200)
+        the port ES is listen to.
+    index: str (optional, default None)
+        an ES index. If None, iterate over all the indices.
+    preserve_order: bool (optional, default True)
+        if set, the records are sorted by decreasing timestamps. Otherwise
+        the unsorted scan is faster.
+    size: int (optional, default 1000)
+        the number of hits of each page.
+    store: LogStore (optional, default None)
+        an ES session whose connections are reused. If set, the login,
+        password, url and port parameters are ignored.
 
-def load_log_es(login, password, url="localhost", port=9200, verbose=0):
+    Returns
+    -------
+    records: generator of 4-uplet
+        the (index, doc_type, id, record) ES items.
+    """
+    # Create a connection
+    es = _get_client(login, password, url, port, store)
+
+    # Define the query
+    query = _load_query(preserve_order)
+
+    # Page through all data
+    for hit in helpers.scan(es, query=query, index=index, size=size,
+                            preserve_order=preserve_order):
+        yield hit["_index"], hit["_type"], hit["_id"], hit["_source"]
+
+
+def load_log_es(login, password, url="localhost", port=9200, verbose=0,
+                index=None, preserve_order=True, size=1000, store=None):
     """ Load all the data of an elasticsearch (ES) database.
 
     Parameters
@@ -143,39 +345,260 @@ def load_log_es(login, password, url="localhost", port=9200, verbose=0):
         the port ES is listen to.
     verbose: int (optional, default 0)
         control the verbosity level.
+    index: str (optional, default None)
+        an ES index. If None, load all the indices.
+    preserve_order: bool (optional, default True)
+        if set, the records are sorted by decreasing timestamps.
+    size: int (optional, default 1000)
+        the number of hits loaded by each ES request.
+    store: LogStore (optional, default None)
+        an ES session whose connections are reused. If set, the login,
+        password, url and port parameters are ignored.
 
     Returns
     -------
     data: dict
         a dictionary containing the ES log data.
     """
-    # Create a connection
-    es = Elasticsearch([url], http_auth=(login, password), port=port)
+    # Get all data
+    data = OrderedDict()
+    nb_hits = 0
+    for hit in iter_log_es(login, password, url=url, port=port, index=index,
+                           preserve_order=preserve_order, size=size,
+                           store=store):
+        _data = data
+        for key in hit[:3]:
+            if key not in _data:
+                _data[key] = OrderedDict()
+            _data = _data[key]
+        _data.update(hit[3])
+        nb_hits += 1
+    if verbose > 1:
+        print("[info] '{0} hits found.".format(nb_hits))
 
-    # Define the query
+    return data
+
+
+def _load_query(preserve_order):
+    """ Define the query of all the records.
+
+    Parameters
+    ----------
+    preserve_order: bool (mandatory)
+        if set, the records are sorted by decreasing timestamps.
+
+    Returns
+    -------
+    query: dict
+        the ES query.
+    """
     query = {
         "query": {
             "match_all": {}
-        },
-        "sort": [{
+        }
+    }
+    if preserve_order:
+        query["sort"] = [{
             "timestamp": {
                 "order": "desc",
             }
         }]
+    return query
+
+
+def _iter_actions(data, verbose=0):
+    """ Iterate over the bulk actions inserting log data. The timestamps
+    format is detected once for each type.
+
+    Parameters
+    ----------
+    data: dict (mandatory)
+        a dictionary containing the parsed log data.
+    verbose: int (optional, default 0)
+        control the verbosity level.
+
+    Returns
+    -------
+    actions: generator of dict
+        the ES bulk index actions.
+    """
+    normalizer = TimestampNormalizer()
+    for index, index_struct in data.items():
+        for dtype, dtype_struct in index_struct.items():
+            for timestamp, sdata in dtype_struct.items():
+                if verbose > 1:
+                    print("[info] Inserting '{0}-{1}-{2}' in ES.".format(
+                        index, dtype, timestamp))
+                timestamp = normalizer.normalize(timestamp, (index, dtype))
+                sdata["timestamp"] = timestamp
+                yield {"_index": index, "_type": dtype, "_id": timestamp,
+                       "_source": dict(sdata)}
+
+
+def _check_item(success, item, verbose=0):
+    """ Check the response of a bulk action.
+
+    Parameters
+    ----------
+    success: bool (mandatory)
+        the action status.
+    item: dict (mandatory)
+        the ES response item.
+    verbose: int (optional, default 0)
+        control the verbosity level.
+
+    Returns
+    -------
+    success: bool
+        the action status.
+    """
+    if not success:
+        if verbose > 0:
+            print("[error] '{0}-{1}-{2}' ES insertion failed: {3}.".format(
+                item["_index"], item["_type"], item["_id"],
+                item.get("error")))
+    elif verbose > 0 and not item.get("created", True):
+        print("[warn] '{0}-{1}-{2}' ES path already exists.".format(
+            item["_index"], item["_type"], item["_id"]))
+    return success
+
+
+def _match_body(match_name, match_value=None):
+    """ Define the search selecting the latest matching record of each
+    index and type.
+
+    Parameters
+    ----------
+    match_name: str (mandatory)
+        the element name to be matched.
+    match_value: object (optional, default None)
+        the element value to be matched.
+
+    Returns
+    -------
+    body: dict
+        the ES search body.
+    """
+    if match_value is None:
+        query = {"match_all": {}}
+    else:
+        query = {"bool": {"filter": [{"term": {match_name: match_value}}]}}
+    return {
+        "size": 0,
+        "query": query,
+        "aggs": {
+            "indices": {
+                "terms": {"field": "_index", "size": 0},
+                "aggs": {
+                    "doc_types": {
+                        "terms": {"field": "_type", "size": 0},
+                        "aggs": {
+                            "latest": {
+                                "top_hits": {
+                                    "size": 1,
+                                    "sort": [{
+                                        "timestamp": {
+                                            "order": "desc"
+                                        }
+                                    }],
+                                    "_source": {"include": [match_name]}
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
     }
 
-    # Get all data
-    data = OrderedDict()
-    for index in es.indices.get_aliases().keys():
-        result = es.search(index=index, body=query)
-        if verbose > 1:
-            print("[info] '{0} hits found.".format(result["hits"]["total"]))
-        for hit in result["hits"]["hits"]:
-            _data = data
-            for key in (hit["_index"], hit["_type"], hit["_id"]):
-                if key not in _data:
-                    _data[key] = OrderedDict()
-                _data = _data[key]
-            _data.update(hit["_source"])
 
-    return data
+def _older_body(match_name, match_value, offset):
+    """ Define the search paging through the filtered records of a type,
+    from the latest one.
+
+    Parameters
+    ----------
+    match_name: str (mandatory)
+        the element name to be matched.
+    match_value: object (mandatory)
+        the element value to be matched.
+    offset: int (mandatory)
+        the number of skipped records.
+
+    Returns
+    -------
+    body: dict
+        the ES search body.
+    """
+    body = _match_body(match_name, match_value)
+    del body["aggs"]
+    body.update({
+        "from": offset,
+        "size": _PAGE_SIZE,
+        "sort": [{"timestamp": {"order": "desc"}}],
+        "_source": {"include": [match_name]}})
+    return body
+
+
+def _add_match(matches, hits, match_name, match_value=None):
+    """ Add the first hit with the requested value to the matches.
+
+    Parameters
+    ----------
+    matches: dict (mandatory)
+        the matches, updated in place.
+    hits: list of dict (mandatory)
+        the ES hits of a type.
+    match_name: str (mandatory)
+        the element name to be matched.
+    match_value: object (optional, default None)
+        the element value to be matched.
+
+    Returns
+    -------
+    found: bool
+        True if a hit has been added.
+    """
+    for hit in hits:
+        value = hit["_source"].get(match_name, None)
+        if match_value is not None and value != match_value:
+            continue
+        matches.setdefault(hit["_index"], {})[hit["_type"]] = value
+        return True
+    return False
+
+
+def _get_matches(result, match_name, match_value=None, mismatches=None):
+    """ Get the matches from the '_match_body' search result.
+
+    The term filter may match values of another type, eg. the number 1 for
+    the string '1', thus the values are checked. The older records of the
+    types whose latest filtered record is rejected must then be searched
+    with the '_older_body' search.
+
+    Parameters
+    ----------
+    result: dict (mandatory)
+        the ES search result.
+    match_name: str (mandatory)
+        the element name to be matched.
+    match_value: object (optional, default None)
+        the element value to be matched.
+    mismatches: list (optional, default None)
+        if set, the (index, type) items whose latest filtered record is
+        rejected are appended to this list.
+
+    Returns
+    -------
+    matches: dict
+        the requested matches.
+    """
+    matches = {}
+    for index_bucket in result["aggregations"]["indices"]["buckets"]:
+        for doc_type_bucket in index_bucket["doc_types"]["buckets"]:
+            hits = doc_type_bucket["latest"]["hits"]["hits"]
+            if (not _add_match(matches, hits, match_name, match_value) and
+                    mismatches is not None):
+                mismatches.extend(
+                    (hit["_index"], hit["_type"]) for hit in hits)
+    return matches
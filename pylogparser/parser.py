@@ -11,31 +11,116 @@ from __future__ import print_function
 import os
 import re
 import sys
+import copy
+import bisect
+import heapq
+import itertools
 import collections
 import json
-from pprint import pprint
+import mmap
+import time
+import locale
+import tempfile
+import threading
+
+# COMPATIBILITY: the regex parser has been moved in the re module since
+# python 3.11
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+# COMPATIBILITY: the abstract base classes have been moved in the
+# collections.abc module since python 3.3
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+# COMPATIBILITY: file locks are only available on POSIX systems
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+# COMPATIBILITY: unichr has been renamed chr in python 3
+try:
+    unichr
+except NameError:
+    unichr = chr
 
 # Module import
 from .utils import Singleton
 from .utils import with_metaclass
+from .utils import hybridmethod
+from .utils import compression
+from .utils import open_logfile
+from .store import ColumnarStore
+from .timestamps import TimestampNormalizer
+from .stats import ParseStats
+from .stats import clock
+
+
+# Regex features that can't be embedded in an alternation of patterns
+_UNCOMBINABLE_PATTERN = re.compile(r"\\[1-9]|\(\?\(")
+# Regex features that can't be searched in a whole log file buffer
+_UNSCANNABLE_PATTERN = re.compile(r"\\[AZ]")
+# Bytes on which the bytes and text patterns may not behave the same
+_NON_ASCII_BYTES = re.compile(b"[\r\x1c-\x1f\x80-\xff]")
+# Lock shared by all the parsers of a process to update the checkpoints
+_CHECKPOINT_LOCK = threading.Lock()
 
 
 @with_metaclass(Singleton)
 class LogParser(object):
     """ A class to parse and reorganize formatted logs.
 
+    The class is a singleton: the class methods and the 'LogParser()'
+    instance share the class dataset. Independent parsers, each with its
+    own dataset, indexes, statistics and lock, are created with
+    'LogParser.isolated()'. The methods of an independent parser work on
+    its own dataset, thus independent parsers can parse concurrently, eg.
+    in a thread pool. The merges in a dataset are locked, thus the threads
+    can also parse in the same dataset, and the datasets of independent
+    parsers can be merged in a shared dataset with 'merge'.
+
     Attributes
     ----------
     `data`: dict {node_name: node}
-        a dictionary containing the parsed log data.
+        a dictionary containing the parsed log data. It can be replaced by
+        an empty 'ColumnarStore' to store the records in compact columns,
+        ie. 'LogParser.data = ColumnarStore()'. The dataset and its indexes
+        are reset with 'clear'. If the dataset is cleared or replaced
+        directly, the index entries of the removed first level keys are
+        pruned at the next merge.
+    `stats`: ParseStats
+        the parsing statistics, None if the parsings are not instrumented.
+        The parsings are instrumented by setting an empty 'ParseStats', ie.
+        'LogParser.stats = ParseStats()'.
 
     Methods
     -------
+    isolated
     parse_logfile
     parse_logdir
+    merge
+    query_range
+    create_index
+    drop_index
+    lookup
+    clear
     """
     # Shared class data parameter
     data = {}
+    # Parsing statistics, None if not instrumented
+    stats = None
+    # Sorted (timestamp, key path) items of each first level key
+    _timestamps = {}
+    # Key paths of the records of each indexed field value
+    _indexes = {}
+    # Key paths length of the records of each first level key
+    _depths = {}
+    # Lock of the dataset and its indexes
+    _lock = threading.RLock()
 
     def __init__(self):
         """ Initialize the 'LogParser' class.
@@ -43,13 +128,41 @@ class LogParser(object):
         pass
 
     @classmethod
-    def load(cls, json_file, verbose=0):
+    def isolated(cls, data=None):
+        """ Create an independent parser, with its own dataset, indexes,
+        statistics and lock.
+
+        Parameters
+        ----------
+        data: dict (optional, default None)
+            the empty parser dataset, for instance an empty 'ColumnarStore'.
+            If None, an empty dictionary.
+
+        Returns
+        -------
+        parser: LogParser
+            the independent parser.
+        """
+        parser = object.__new__(cls)
+        parser.data = {} if data is None else data
+        parser._timestamps = {}
+        parser._indexes = {}
+        parser._depths = {}
+        parser.stats = None
+        parser._lock = threading.RLock()
+        return parser
+
+    @hybridmethod
+    def load(cls, json_file, verbose=0, workers=1, cache=None,
+             profiles=None):
         """ Load data from a Json configuration file.
         See the demonstration file for the synthax of this file. Briefly the
         same parameters as the 'parse_logfile' and 'parse_logdir' functions
         must be specified, with an extra 'type' parameters. The latter must be
         in ('logfile', 'logdir') and enables us to switch between the parsing
-        methods.
+        methods. An optional 'profiles' top level item maps profile names to
+        'ParserProfile' parameters, and an entry can use a shared profile by
+        name with a 'profile' parameter.
 
         Parameters
         ----------
@@ -58,10 +171,20 @@ class LogParser(object):
             system.
         verbose: int
             parameter to ccontrol the verbosity.
+        workers: int (optional, default 1)
+            the number of processes used to parse the description entries.
+            The parsed records are merged in the description order
+            in the parent process.
+        cache: ParseCache (optional, default None)
+            a cache of the parsed structures: the unchanged log files are
+            loaded from the cache instead of being parsed.
+        profiles: dict of ParserProfile (optional, default None)
+            named profiles that can be used by the description entries in
+            addition to the description profiles.
 
         Raises
         ------
-        ValueError: if the parsing method is not recognize.
+        ValueError: if the parsing method or a profile is not recognize.
         """
         # Check the input log file exists
         if not os.path.isfile(json_file):
@@ -72,24 +195,60 @@ class LogParser(object):
         with open(json_file, "rt") as open_file:
             description = json.load(open_file)
 
-        # Parse the data
+        # Compile the profiles
+        profiles = dict(profiles or {})
+        for name, params in description.pop("profiles", {}).items():
+            profiles[name] = ParserProfile(**params)
+
+        # Check the parsing methods
+        entries = []
         for name, log_struct in description.items():
-            if verbose > 0:
-                print("[info] Parsing '{0}'...".format(name))
-            if verbose > 1:
-                pprint(log_struct)
             ptype = log_struct.pop("type")
-            if ptype == "logfile":
-                cls.parse_logfile(**log_struct)
-            elif ptype == "logdir":
-                cls.parse_logdir(**log_struct)
-            else:
+            if ptype not in ("logfile", "logdir"):
                 raise ValueError(
                     "Unrecognize '{0}' parsing type.".format(ptype))
+            if "profile" in log_struct:
+                if log_struct["profile"] not in profiles:
+                    raise ValueError("Unrecognize '{0}' profile.".format(
+                        log_struct["profile"]))
+                log_struct["profile"] = profiles[log_struct["profile"]]
+            entries.append((name, ptype, log_struct, cache))
 
-    @classmethod
-    def parse_logfile(cls, logfile, job_pattern, timestamp_pattern,
-                      custom_patterns, hierarchy=None, jobs_alias=None):
+        # Parse the data
+        pool = None
+        if workers > 1:
+            # The multiprocessing module is slow to import: it is only
+            # imported when workers are used
+            import multiprocessing
+            pool = multiprocessing.Pool(workers)
+            structs = pool.imap(_parse_entry, [
+                entry + (cls.stats is not None, ) for entry in entries])
+        else:
+            structs = (_parse_entry(entry + (False, ), cls)
+                       for entry in entries)
+        try:
+            for name, ptype, log_struct, _ in entries:
+                if verbose > 0:
+                    print("[info] Parsing '{0}'...".format(name))
+                if verbose > 1:
+                    from pprint import pprint
+                    pprint(log_struct)
+                records, stats = next(structs)
+                if stats is not None:
+                    cls.stats.update(stats)
+                cls._merge(records, cls._get_hierarchy(
+                    log_struct.get("hierarchy"), log_struct.get("profile")))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    @hybridmethod
+    def parse_logfile(cls, logfile, job_pattern=None, timestamp_pattern=None,
+                      custom_patterns=None, hierarchy=None, jobs_alias=None,
+                      engine=None, prefilter=None, workers=1,
+                      checkpoint=None, cache=None, profile=None,
+                      memory_map=False, normalize_timestamps=None):
         """ Parse a log file that is composed of multiple jobs. This log file
         is supposed to be organized, thus it is possible to grab information
         using regular expressions.
@@ -97,18 +256,21 @@ class LogParser(object):
         Parameters
         ----------
         logfile : str (mandatory)
-            a log file to be parsed.
-        job_pattern : str (mandatory)
+            a log file to be parsed, the gzip, bz2 and xz compressed log files
+            are decompressed on the fly.
+        job_pattern : str (mandatory if no profile)
             the regular expression used to detect the job IDs.
-        timestamp_pattern : str (mandatory)
+        timestamp_pattern : str (mandatory if no profile)
             the regular expression used to detect the timestamps.
-        custom_patterns : dict of dict (mandatory)
+        custom_patterns : dict of dict (mandatory if no profile)
             a dict with custom names as keys and values that are dictionaries
             with one mandatory 'regex' item that will be used to identify some
-            data of interest in the log and an optional 'splitter' item
+            data of interest in the log, an optional 'splitter' item
             containing a 2-uplet of the form (splitter, position) that will be
-            used to keep only a part of the matched data. If not specified
-            or None, no filter is applied.
+            used to keep only a part of the matched data, and an optional
+            'literal' item with a substring contained in all the matched data.
+            If the splitter is not specified or None, no filter is applied.
+            If the literal is not specified, it is extracted from the regex.
         hierarchy: dict (optional, default None)
             the parsed log final organization. If None, the job IDs ('job_id'
             key) followed by the timestamps ('timestamp' key) and finally the
@@ -116,8 +278,752 @@ class LogParser(object):
         jobs_alias: str (optional, default None)
             if the log file concerns a single job, replace the job ID by this
             alias.
+        engine: str (optional, default None)
+            the matching engine: 'combined' scans each row once with an
+            alternation of all the custom patterns, 'loop' applies each
+            pattern in turn. If None, the profile engine, 'combined' by
+            default.
+        prefilter: bool (optional, default None)
+            if set, skip without applying any regex the rows that contain
+            none of the custom patterns literals, thus the skipped rows are
+            not checked for multiple job IDs or timestamps. The prefilter is
+            disabled if no literal can be found for one of the custom
+            patterns. If None, the profile option, not set by default.
+        workers: int (optional, default 1)
+            the number of processes used to parse the log file. The log file
+            is split in byte ranges ending on line boundaries, each range is
+            parsed in a separate process and the detected items are
+            organized in the file order, thus the result is the same as the
+            serial parsing. A compressed log file is parsed in a single
+            process.
+        checkpoint: str (optional, default None)
+            a Json file where the parsed byte offset of each log file is
+            persisted with an inode/size fingerprint. If specified, only the
+            complete lines appended since the previous call are parsed, and
+            the new records are merged in the existing leaves of the class
+            dataset. If the log file has been rotated or truncated, it is
+            parsed from its beginning. Not supported for compressed log
+            files.
+        cache: ParseCache (optional, default None)
+            a cache of the parsed structures: if the log file and the parsing
+            configuration are unchanged, the structure is loaded from the
+            cache instead of being parsed. Not used in incremental mode.
+        profile: ParserProfile (optional, default None)
+            a precompiled parsing configuration. The parameters that are not
+            None override the profile ones.
+        memory_map: bool (optional, default False)
+            if set, the log file is memory-mapped and the rows of interest
+            are detected by searching the whole buffer with bytes compiled
+            patterns. With the combined engine the rows are also matched
+            with bytes patterns and only the matched data are decoded. The
+            bytes character classes only match ASCII characters, hence this
+            mode is intended for ASCII logs. Not used for compressed log
+            files.
+        normalize_timestamps: bool (optional, default None)
+            if set, the timestamps are converted to the ISO 8601 format
+            with a 'TimestampNormalizer', thus the records are stored and
+            dumped with normalized timestamps. If None, the profile option
+            is used, not set by default.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) new items that have been merged, where
+            the key path is the tuple of the hierarchy keys of the record.
+        """
+        # Get the parsed byte range
+        start, end, fingerprint = 0, None, None
+        if checkpoint is not None:
+            start, end, fingerprint = cls._read_checkpoint(
+                checkpoint, logfile)
+
+        # Parse all the input log files
+        records = cls._parse_logfile(
+            logfile, job_pattern, timestamp_pattern, custom_patterns,
+            hierarchy, jobs_alias, engine, prefilter, workers, start, end,
+            cache, profile, memory_map, normalize_timestamps)
+
+        # Merge the new records
+        cls._merge(records, cls._get_hierarchy(hierarchy, profile),
+                   update=(checkpoint is not None))
+
+        # Persist the parsed byte offset
+        if checkpoint is not None:
+            cls._write_checkpoint(checkpoint, logfile, end, fingerprint)
+
+        return records
+
+    @hybridmethod
+    def follow_logfile(cls, logfile, job_pattern=None, timestamp_pattern=None,
+                       custom_patterns=None, checkpoint=None, hierarchy=None,
+                       jobs_alias=None, engine=None, prefilter=None,
+                       interval=1., timeout=None, callback=None, profile=None,
+                       memory_map=False, normalize_timestamps=None):
+        """ Follow a log file that is growing: poll the log file and merge
+        the new records in the class dataset as they appear.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file to be followed.
+        job_pattern : str (mandatory if no profile)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : str (mandatory if no profile)
+            the regular expression used to detect the timestamps.
+        custom_patterns : dict of dict (mandatory if no profile)
+            the custom patterns as described in 'parse_logfile'.
+        checkpoint: str (mandatory)
+            a Json file where the parsed byte offset of the log file is
+            persisted.
+        hierarchy: dict (optional, default None)
+            the parsed log final organization.
+        jobs_alias: str (optional, default None)
+            if the log file concerns a single job, replace the job ID by this
+            alias.
+        engine: str (optional, default None)
+            the matching engine in ('combined', 'loop'), if None the profile
+            engine.
+        prefilter: bool (optional, default None)
+            if set, skip the rows that contain none of the custom patterns
+            literals. If None, the profile option.
+        interval: float (optional, default 1.)
+            the polling interval in seconds.
+        timeout: float (optional, default None)
+            stop following the log file after this number of seconds. If
+            None, follow the log file forever.
+        callback: callable (optional, default None)
+            a function called with the structure of the new records after
+            each poll that found new records.
+        profile: ParserProfile (optional, default None)
+            a precompiled parsing configuration, the parameters that are not
+            None override the profile ones.
+        memory_map: bool (optional, default False)
+            if set, the new lines are searched in the memory-mapped log file
+            as described in 'parse_logfile'.
+        normalize_timestamps: bool (optional, default None)
+            if set, the timestamps are converted to the ISO 8601 format. If
+            None, the profile option is used.
+
+        Raises
+        ------
+        ValueError: if no checkpoint is specified.
+        """
+        if checkpoint is None:
+            raise ValueError("A 'checkpoint' is expected.")
+        start_time = time.time()
+        while True:
+            records = cls.parse_logfile(
+                logfile, job_pattern, timestamp_pattern, custom_patterns,
+                hierarchy=hierarchy, jobs_alias=jobs_alias, engine=engine,
+                prefilter=prefilter, checkpoint=checkpoint, profile=profile,
+                memory_map=memory_map,
+                normalize_timestamps=normalize_timestamps)
+            if callback is not None and len(records) > 0:
+                callback(cls._get_struct(records))
+            if timeout is not None and time.time() - start_time >= timeout:
+                break
+            time.sleep(interval)
+
+    @hybridmethod
+    def _read_checkpoint(cls, checkpoint, logfile):
+        """ Get the byte range of a log file that has not been parsed yet.
+
+        Parameters
+        ----------
+        checkpoint: str (mandatory)
+            the Json file with the persisted byte offsets.
+        logfile : str (mandatory)
+            a log file.
+
+        Returns
+        -------
+        start: int
+            the first byte offset that has not been parsed.
+        end: int
+            the end byte offset of the last complete line.
+        fingerprint: dict
+            the log file inode and size.
+        """
+        cls._check_logfile(logfile, {})
+        stat = os.stat(logfile)
+        fingerprint = {"inode": stat.st_ino, "size": stat.st_size}
+        start = 0
+        if os.path.isfile(checkpoint):
+            with open(checkpoint, "rt") as open_file:
+                state = json.load(open_file).get(os.path.abspath(logfile))
+            if (state is not None and state["inode"] == stat.st_ino and
+                    state["size"] <= stat.st_size):
+                start = state["offset"]
+
+        # Find the end of the last complete line
+        end = stat.st_size
+        with open(logfile, "rb") as open_file:
+            while end > start:
+                block_start = max(start, end - 4096)
+                open_file.seek(block_start)
+                position = open_file.read(end - block_start).rfind(b"\n")
+                if position != -1:
+                    end = block_start + position + 1
+                    break
+                end = block_start
+
+        return start, end, fingerprint
+
+    @hybridmethod
+    def _write_checkpoint(cls, checkpoint, logfile, offset, fingerprint):
+        """ Persist the parsed byte offset of a log file. The checkpoint may
+        be shared by several parsers: it is updated under a lock, a file lock
+        if available, and atomically replaced.
+
+        Parameters
+        ----------
+        checkpoint: str (mandatory)
+            the Json file with the persisted byte offsets.
+        logfile : str (mandatory)
+            a log file.
+        offset: int (mandatory)
+            the parsed byte offset.
+        fingerprint: dict (mandatory)
+            the log file inode and size.
+        """
+        dirname = os.path.dirname(os.path.abspath(checkpoint))
+        with _CHECKPOINT_LOCK, open(checkpoint + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            checkpoints = {}
+            if os.path.isfile(checkpoint):
+                with open(checkpoint, "rt") as open_file:
+                    checkpoints = json.load(open_file)
+            state = {"offset": offset}
+            state.update(fingerprint)
+            checkpoints[os.path.abspath(logfile)] = state
+            fd, tmp_checkpoint = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+            with os.fdopen(fd, "wt") as open_file:
+                json.dump(checkpoints, open_file, indent=4)
+            # COMPATIBILITY: atomic replace is available since python 3.3
+            getattr(os, "replace", os.rename)(tmp_checkpoint, checkpoint)
+
+    @hybridmethod
+    def _parse_logfile(cls, logfile, job_pattern=None, timestamp_pattern=None,
+                       custom_patterns=None, hierarchy=None, jobs_alias=None,
+                       engine=None, prefilter=None, workers=1, start=0,
+                       end=None, cache=None, profile=None, memory_map=False,
+                       normalize_timestamps=None):
+        """ Parse a log file without modifying the class dataset.
+        See 'parse_logfile' and 'iter_logfile' for the parameters
+        description, the cache is only used to parse a whole log file.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) parsed items, where the key path is the
+            tuple of the hierarchy keys of the record.
+        """
+        # Class parameters
+        profile = cls._get_profile(
+            profile, job_pattern=job_pattern,
+            timestamp_pattern=timestamp_pattern,
+            custom_patterns=custom_patterns, hierarchy=hierarchy,
+            jobs_alias=jobs_alias, engine=engine, prefilter=prefilter,
+            normalize_timestamps=normalize_timestamps)
+        if profile.patterns is None:
+            raise ValueError("A 'job_pattern', a 'timestamp_pattern' and "
+                             "'custom_patterns' are expected.")
+        hierarchy = profile.hierarchy
+        if hierarchy is None:
+            hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
+
+        # Load the cached parsing
+        cls._check_logfile(logfile, profile.custom_patterns)
+        cache_key = None
+        if cache is not None and start == 0 and end is None:
+            cache_key = cache.key([logfile], {
+                "type": "logfile", "job_pattern": profile.job_pattern,
+                "timestamp_pattern": profile.timestamp_pattern,
+                "custom_patterns": profile.custom_patterns,
+                "hierarchy": hierarchy, "jobs_alias": profile.jobs_alias,
+                "normalize_timestamps": bool(profile.normalize_timestamps)})
+            records = cache.get(cache_key)
+            if records is not None:
+                return records
+
+        # Parse the log file: a compressed log file is streamed in a single
+        # process
+        if cls.stats is not None:
+            cls.stats.bytes_read += (
+                end if end is not None else os.path.getsize(logfile)) - start
+        if workers > 1 and compression(logfile) is None:
+            matches = cls._iter_chunks(
+                logfile, profile.patterns, workers, start, end, memory_map)
+        else:
+            matches = cls._iter_matches(
+                logfile, *profile.patterns, start=start, end=end,
+                memory_map=memory_map)
+        normalizer = None
+        if profile.normalize_timestamps:
+            normalizer = TimestampNormalizer()
+        records = cls._parse(
+            matches, logfile, hierarchy, profile.jobs_alias, normalizer)
+
+        # Cache the parsing
+        if cache_key is not None:
+            cache.set(cache_key, [logfile], records)
+
+        return records
+
+    @hybridmethod
+    def _get_profile(cls, profile, **kwargs):
+        """ Get the profile of a parsing.
+
+        Parameters
+        ----------
+        profile: ParserProfile (mandatory)
+            a parsing profile, if None a new profile is created.
+        kwargs: dict
+            the 'ParserProfile' parameters, the parameters that are not None
+            override the profile ones.
+
+        Returns
+        -------
+        profile: ParserProfile
+            the parsing profile.
+        """
+        overrides = dict(
+            (key, value) for key, value in kwargs.items() if value is not None)
+        if profile is None:
+            return ParserProfile(**overrides)
+        if len(overrides) == 0:
+            return profile
+        return profile.replace(**overrides)
+
+    @hybridmethod
+    def _iter_chunks(cls, logfile, patterns, workers, start=0, end=None,
+                     memory_map=False):
+        """ Detect the requested patterns in a log file using a pool of
+        processes, one byte range of the log file per process.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file to be parsed.
+        patterns: 5-uplet (mandatory)
+            the compiled patterns as returned by '_compile_patterns'.
+        workers: int (mandatory)
+            the number of processes.
+        start: int (optional, default 0)
+            the first byte offset of the parsed range.
+        end: int (optional, default None)
+            the end byte offset of the parsed range, the log file size if
+            None.
+        memory_map: bool (optional, default False)
+            if set, each process searches its range of the memory-mapped log
+            file.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, value) detected items in the log
+            file order.
+
+        Raises
+        ------
+        ValueError: if a row can't be parsed. The error is reported by a
+                    serial parsing of the log file in order to give the same
+                    message (ie. line number). If the serial parsing
+                    succeeds, its remaining matches are returned.
+        """
+        tasks = [(logfile, chunk_start, chunk_end, memory_map,
+                  cls.stats is not None) + tuple(patterns)
+                 for chunk_start, chunk_end in cls._chunk_logfile(
+                     logfile, workers, start, end)]
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        nb_matches = 0
+        try:
+            for matches, stats in pool.imap(_parse_chunk, tasks):
+                if stats is not None:
+                    cls.stats.lines_scanned += stats.lines_scanned
+                for match in matches:
+                    nb_matches += 1
+                    yield match
+        except ValueError:
+            matches = cls._iter_matches(logfile, *patterns, start=start,
+                                        end=end, memory_map=memory_map)
+            for match in itertools.islice(matches, nb_matches, None):
+                yield match
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @hybridmethod
+    def _chunk_logfile(cls, logfile, nb_chunks, start=0, end=None):
+        """ Split a log file in byte ranges ending on line boundaries.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file to be split.
+        nb_chunks: int (mandatory)
+            the requested number of byte ranges, less ranges are returned if
+            the log file has not enough lines.
+        start: int (optional, default 0)
+            the first byte offset of the split range, must be a line start.
+        end: int (optional, default None)
+            the end byte offset of the split range, must be a line start. If
+            None, the log file size.
+
+        Returns
+        -------
+        chunks: list of 2-uplet
+            the (start, end) byte offsets of each range.
+        """
+        if end is None:
+            end = os.path.getsize(logfile)
+        offsets = [start]
+        with open(logfile, "rb") as open_file:
+            for cnt in range(1, nb_chunks):
+                position = start + (end - start) * cnt // nb_chunks
+                if position <= offsets[-1]:
+                    continue
+                open_file.seek(position - 1)
+                open_file.readline()
+                position = open_file.tell()
+                if position > offsets[-1] and position < end:
+                    offsets.append(position)
+        offsets.append(end)
+        return list(zip(offsets[:-1], offsets[1:]))
+
+    @hybridmethod
+    def _iter_rows(cls, logfile, start, end):
+        """ Iterate over the rows of a log file byte range. The rows are
+        decoded and their line endings translated as in a file opened in
+        text mode.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file.
+        start: int (mandatory)
+            the range first byte offset, must be a line start.
+        end: int (mandatory)
+            the range end byte offset, must be a line start.
+
+        Returns
+        -------
+        rows: generator of str
+            the log file range rows.
+        """
+        encoding = locale.getpreferredencoding(False)
+        with open(logfile, "rb") as open_file:
+            open_file.seek(start)
+            position = start
+            for row in open_file:
+                if position >= end:
+                    break
+                position += len(row)
+                for subrow in cls._decode_row(row, encoding):
+                    yield subrow
+
+    @hybridmethod
+    def _iter_buffer_rows(cls, logfile, scanner, start=0, end=None,
+                          detectors=None):
+        """ Iterate over the rows of a memory-mapped log file byte range
+        that are hit by a bytes pattern. The buffer is searched with the
+        pattern and only the hit rows, and the skipped rows where a detector
+        is found, are copied and decoded.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file.
+        scanner: re.SRE_Pattern (mandatory)
+            the bytes pattern used to detect the rows of interest. If None,
+            all the rows are returned.
+        start: int (optional, default 0)
+            the range first byte offset, must be a line start.
+        end: int (optional, default None)
+            the range end byte offset, must be a line start. If None, the log
+            file size.
+        detectors: list of re.SRE_Pattern (optional, default None)
+            the bytes patterns as returned by '_compile_detector' used to
+            find the skipped rows that must be checked.
+
+        Returns
+        -------
+        rows: generator of 2-uplet
+            the (line index, row) hit items, the rows are decoded and their
+            line endings translated as in a file opened in text mode.
+        """
+        encoding = locale.getpreferredencoding(False)
+        if end is None:
+            end = os.path.getsize(logfile)
+        if end <= start:
+            return
+        with open(logfile, "rb") as open_file:
+            buf = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                index = 0
+                position = counted = start
+                while position < end:
+
+                    # Find the hit row
+                    row_start = row_end = position
+                    if scanner is not None:
+                        hit = scanner.search(buf, position, end)
+                        row_end = end
+                        if hit is not None and hit.start() < end:
+                            row_end = hit.start()
+                        row_start = buf.rfind(b"\n", position, row_end) + 1
+                        row_start = row_start or position
+
+                        # Decode the skipped rows to be checked
+                        for skipped_start, skipped_end in (
+                                cls._iter_duplicate_rows(
+                                    buf, position, row_start,
+                                    detectors or [])):
+                            index += buf[counted:skipped_start].count(b"\n")
+                            counted = skipped_start
+                            for row in cls._decode_row(
+                                    buf[skipped_start:skipped_end],
+                                    encoding):
+                                yield index, row
+                        if row_end == end:
+                            break
+                    row_end = buf.find(b"\n", row_end, end)
+                    row_end = end if row_end == -1 else row_end + 1
+
+                    # Decode the hit row
+                    index += buf[counted:row_start].count(b"\n")
+                    counted = row_start
+                    for row in cls._decode_row(buf[row_start:row_end],
+                                               encoding):
+                        yield index, row
+                    position = row_end
+                if cls.stats is not None:
+                    cls.stats.lines_scanned += cls._count_rows(
+                        buf, start, end)
+            finally:
+                buf.close()
+
+    @hybridmethod
+    def _has_carriage_returns(cls, logfile, start=0, end=None):
+        """ Check if a log file byte range contains carriage returns.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file.
+        start: int (optional, default 0)
+            the range first byte offset.
+        end: int (optional, default None)
+            the range end byte offset. If None, the log file size.
+
+        Returns
+        -------
+        found: bool
+            True if a carriage return is found in the range.
+        """
+        if end is None:
+            end = os.path.getsize(logfile)
+        if end <= start:
+            return False
+        with open(logfile, "rb") as open_file:
+            buf = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return buf.find(b"\r", start, end) != -1
+            finally:
+                buf.close()
+
+    @hybridmethod
+    def _count_rows(cls, buf, start, end, chunk_size=2 ** 20):
+        """ Count the rows of a memory-mapped log file byte range.
+
+        Parameters
+        ----------
+        buf: mmap.mmap (mandatory)
+            the memory-mapped log file.
+        start: int (mandatory)
+            the range first byte offset, must be a line start.
+        end: int (mandatory)
+            the range end byte offset, must be a line start.
+        chunk_size: int (optional, default 1MB)
+            the size of the buffer slices whose newlines are counted.
+
+        Returns
+        -------
+        nb_rows: int
+            the number of rows, including a last row without line ending.
+        """
+        nb_rows = 0
+        for position in range(start, end, chunk_size):
+            nb_rows += buf[position:min(position + chunk_size, end)].count(
+                b"\n")
+        if end > start and buf[end - 1:end] != b"\n":
+            nb_rows += 1
+        return nb_rows
+
+    @hybridmethod
+    def _decode_row(cls, row, encoding):
+        """ Decode a row and translate its line endings as in a file opened
+        in text mode.
+
+        Parameters
+        ----------
+        row: bytes (mandatory)
+            a log file row.
+        encoding: str (mandatory)
+            the log file encoding.
+
+        Returns
+        -------
+        rows: list of str
+            the decoded rows, a carriage return also ends a row in text mode
+            while the other line boundaries of 'str.splitlines' do not.
+        """
+        row = row.decode(encoding)
+        if "\r" in row:
+            rows = row.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+            last_row = rows.pop()
+            rows = [item + "\n" for item in rows]
+            if last_row:
+                rows.append(last_row)
+            return rows
+        return [row]
+
+    @hybridmethod
+    def _compile_scanner(cls, combined_pattern, literals):
+        """ Compile the bytes pattern used to detect the rows of interest in
+        a memory-mapped log file.
+
+        Parameters
+        ----------
+        combined_pattern: re.SRE_Pattern (mandatory)
+            the alternation of all the custom patterns, may be None.
+        literals: tuple of str (mandatory)
+            the substrings contained in all the rows of interest, may be
+            None.
+
+        Returns
+        -------
+        scanner: re.SRE_Pattern
+            the bytes pattern, None if no pattern can be searched in the
+            whole buffer.
+        """
+        scanner = None
+        if combined_pattern is not None:
+            scanner = cls._encode_pattern(combined_pattern)
+        if scanner is None and literals is not None:
+            scanner = cls._encode_pattern(re.compile(
+                "|".join(re.escape(literal) for literal in literals)))
+        return scanner
+
+    @hybridmethod
+    def _encode_pattern(cls, regex):
+        """ Compile a regular expression as a bytes pattern.
+
+        Parameters
+        ----------
+        regex: re.SRE_Pattern (mandatory)
+            a compiled regular expression.
+
+        Returns
+        -------
+        regex: re.SRE_Pattern
+            the bytes pattern, compiled in multiline mode so that the anchors
+            match at the rows boundaries of a buffer. None if the pattern
+            can't be searched in a buffer.
+        """
+        if _UNSCANNABLE_PATTERN.search(regex.pattern) is not None:
+            return None
+        try:
+            return re.compile(
+                regex.pattern.encode(locale.getpreferredencoding(False)),
+                re.MULTILINE)
+        except (UnicodeError, re.error):
+            return None
+
+    @hybridmethod
+    def iter_logfile(cls, logfile, job_pattern=None, timestamp_pattern=None,
+                     custom_patterns=None, engine=None, prefilter=None,
+                     start=0, end=None, profile=None, memory_map=False):
+        """ Iterate over the data of interest of a log file. The log file is
+        streamed one row at a time, thus the memory usage does not depend on
+        the log file size.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file to be parsed.
+        job_pattern : str (mandatory if no profile)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : str (mandatory if no profile)
+            the regular expression used to detect the timestamps.
+        custom_patterns : dict of dict (mandatory if no profile)
+            a dict with custom names as keys and values that are dictionaries
+            with one mandatory 'regex' item and optional 'splitter' and
+            'literal' items as described in 'parse_logfile'.
+        engine: str (optional, default None)
+            the matching engine in ('combined', 'loop'), if None the profile
+            engine, 'combined' by default.
+        prefilter: bool (optional, default None)
+            if set, skip the rows that contain none of the custom patterns
+            literals without checking them. If None, the profile option, not
+            set by default.
+        start: int (optional, default 0)
+            the first byte offset of the parsed range, must be a line start.
+        end: int (optional, default None)
+            the end byte offset of the parsed range, must be a line start. If
+            None, the log file is parsed until its end.
+        profile: ParserProfile (optional, default None)
+            a precompiled parsing configuration, the parameters that are not
+            None override the profile ones.
+        memory_map: bool (optional, default False)
+            if set, search the memory-mapped log file with bytes patterns
+            and only decode the rows of interest.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, value) detected items in the log
+            file order.
+
+        Raises
+        ------
+        ValueError: if the log file does not exist or if the custom patterns
+                    are not specified as a dictionary.
         """
+        # Class parameters
+        profile = cls._get_profile(
+            profile, job_pattern=job_pattern,
+            timestamp_pattern=timestamp_pattern,
+            custom_patterns=custom_patterns, engine=engine,
+            prefilter=prefilter)
+        if profile.patterns is None:
+            raise ValueError("A 'job_pattern', a 'timestamp_pattern' and "
+                             "'custom_patterns' are expected.")
+
         # Check the input log file exists
+        cls._check_logfile(logfile, profile.custom_patterns)
+
+        return cls._iter_matches(logfile, *profile.patterns, start=start,
+                                 end=end, memory_map=memory_map)
+
+    @hybridmethod
+    def _check_logfile(cls, logfile, custom_patterns):
+        """ Check the log file parsing parameters.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            a log file to be parsed.
+        custom_patterns : dict of dict (mandatory)
+            the custom patterns.
+
+        Raises
+        ------
+        ValueError: if the log file does not exist or if the custom patterns
+                    are not specified as a dictionary.
+        """
         if not os.path.isfile(logfile):
             raise ValueError(
                 "'{0}' is not a valid log file.".format(logfile))
@@ -125,27 +1031,10 @@ class LogParser(object):
             raise ValueError("A dictionary with 'custom_patterns' is "
                              "expected.")
 
-        # Class parameters
-        _job_pattern = re.compile(job_pattern)
-        _timestamp_pattern = re.compile(timestamp_pattern)
-        _custom_patterns = collections.OrderedDict(
-            (name, {"regex": re.compile(value["regex"]),
-                    "splitter": value.get("splitter", None)})
-            for name, value in custom_patterns.items())
-        if hierarchy is None:
-            hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
-
-        # Parse all the input log files
-        final_struct, hierarchy_level = cls._parse(
-            logfile, _job_pattern, _timestamp_pattern, _custom_patterns,
-            hierarchy, jobs_alias)
-
-        # Concatenante the new struct
-        cls._concatenate(cls.data, final_struct, hierarchy_level)
-
-    @classmethod
-    def parse_logdir(cls, logfiles, job_name, timestamp_key, hierarchy=None,
-                     extract_keys=None):
+    @hybridmethod
+    def parse_logdir(cls, logfiles, job_name=None, timestamp_key=None,
+                     hierarchy=None, extract_keys=None, cache=None,
+                     profile=None):
         """ Parse a log folder containing files describing a job. These files
         are expected in Json format containing dictionaries with meaningful
         keys.
@@ -156,10 +1045,11 @@ class LogParser(object):
             the log directory files to be parsed as keys and a boolean
             associated value specifying if the structure needs to be flatten.
             If not, the file name (without extension) is used as a key in the
-            data structure.
-        job_name : str (mandatory)
+            data structure. The gzip, bz2 and xz compressed files are
+            decompressed on the fly.
+        job_name : str (mandatory if no profile)
             the job name.
-        timestamp_key : str (mandatory)
+        timestamp_key : str (mandatory if no profile)
             the key used to retrieve the timestamp.
         hierarchy: dict (optional, default None)
             the parsed log final organization. If None, the job name (
@@ -168,18 +1058,74 @@ class LogParser(object):
         extract_keys: list of str (optiona, default None)
             a list of attributes that will be flatten even if the flatten
             key is set to False.
+        cache: ParseCache (optional, default None)
+            a cache of the parsed structures: if the log files and the
+            parsing configuration are unchanged, the structure is loaded from
+            the cache instead of being parsed.
+        profile: ParserProfile (optional, default None)
+            a parsing configuration, the parameters that are not None
+            override the profile ones.
+        """
+        # Parse all the input log files
+        records = cls._parse_logdir(
+            logfiles, job_name, timestamp_key, hierarchy, extract_keys, cache,
+            profile)
+
+        # Merge the new records
+        cls._merge(records, cls._get_hierarchy(hierarchy, profile))
+
+    @hybridmethod
+    def _parse_logdir(cls, logfiles, job_name=None, timestamp_key=None,
+                      hierarchy=None, extract_keys=None, cache=None,
+                      profile=None):
+        """ Parse a log folder without modifying the class dataset.
+        See 'parse_logdir' for the parameters description.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) parsed item.
         """
+        # Class parameters
+        if profile is not None:
+            profile = cls._get_profile(
+                profile, job_name=job_name, timestamp_key=timestamp_key,
+                hierarchy=hierarchy, extract_keys=extract_keys)
+            job_name = profile.job_name
+            timestamp_key = profile.timestamp_key
+            hierarchy = profile.hierarchy
+            extract_keys = profile.extract_keys
+        if job_name is None or timestamp_key is None:
+            raise ValueError("A 'job_name' and a 'timestamp_key' are "
+                             "expected.")
+
         # Check the input log file exists
         if not isinstance(logfiles, dict):
             raise ValueError("A dictionary with 'logfiles' is expected.")
-        struct = {job_name: {}}
-        temporary_struct = {}
-        extract_keys = extract_keys or []
-        for path, to_flatten in logfiles.items():
+        for path in logfiles:
             if not os.path.isfile(path):
                 raise ValueError(
                     "'{0}' is not a valid log file.".format(path))
-            with open(path, "rt") as open_file:
+
+        # Load the cached parsing
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(list(logfiles), {
+                "type": "logdir", "logfiles": logfiles, "job_name": job_name,
+                "timestamp_key": timestamp_key, "hierarchy": hierarchy,
+                "extract_keys": extract_keys})
+            records = cache.get(cache_key)
+            if records is not None:
+                return records
+
+        # Load the log files
+        if cls.stats is not None:
+            cls.stats.bytes_read += sum(
+                os.path.getsize(path) for path in logfiles)
+        temporary_struct = {}
+        extract_keys = extract_keys or []
+        for path, to_flatten in logfiles.items():
+            with open_logfile(path) as open_file:
                 data = json.load(open_file)
             if to_flatten:
                 temporary_struct.update(data)
@@ -188,44 +1134,37 @@ class LogParser(object):
                     if key in extract_keys:
                         temporary_struct[key] = value
                 temporary_struct[os.path.basename(path).split(".")[0]] = data
-        timestamp = temporary_struct.pop(timestamp_key)
-        struct[job_name][timestamp] = temporary_struct
+        temporary_struct["timestamp"] = temporary_struct.pop(timestamp_key)
+        temporary_struct["job_name"] = job_name
 
         # Class parameters
         if hierarchy is None:
             hierarchy = {"job_name": {"timestamp": {"custom_data": None}}}
 
         # Store information in requested format
-        final_struct = {}
-        for job_name, timestamp_struct in struct.items():
-            for timestamp, data in timestamp_struct.items():
-                data["job_name"] = job_name
-                data["timestamp"] = timestamp
-                hierarchy_level = cls._get_data(final_struct, data, hierarchy)
+        start = clock() if cls.stats is not None else None
+        records = cls._get_records([temporary_struct], hierarchy)
+        if cls.stats is not None:
+            cls.stats.records += len(records)
+            cls.stats.add_time("organize", clock() - start)
 
-        # Concatenante the new struct
-        cls._concatenate(cls.data, final_struct, hierarchy_level)
+        # Cache the parsing
+        if cache_key is not None:
+            cache.set(cache_key, list(logfiles), records)
 
-    @classmethod
-    def _parse(cls, logfile, job_pattern, timestamp_pattern, custom_patterns,
-               hierarchy=None, jobs_alias=None):
-        """ Parse a log file.
+        return records
+
+    @hybridmethod
+    def _parse(cls, matches, logfile, hierarchy=None, jobs_alias=None,
+               normalizer=None):
+        """ Organize the data of interest detected in a log file.
 
         Parameters
         ----------
+        matches: iterable of 4-uplet (mandatory)
+            the (job_id, timestamp, name, value) detected items.
         logfile : str (mandatory)
-            the path to the log file that will be parsed.
-        job_pattern : str (mandatory)
-            the regular expression used to detect the job IDs.
-        timestamp_pattern : str (mandatory)
-            the regular expression used to detect the timestamps.
-        custom_patterns : dict of dict (mandatory)
-            a dict with custom names as keys and values that are dictionaries
-            with one mandatory 'regex' item that will be used to identify some
-            data of interest in the log and an optional 'splitter' item
-            containing a 2-uplet of the form (splitter, position) that will be
-            used to keep only a part of the matched data. If not specified
-            or None, no filter is applied.
+            the path to the log file, used in error messages.
         hierarchy: dict (optional, default None)
             the parsed log final organization. If None, the job IDs ('job_id'
             key) followed by the timestamps ('timestamp' key) and finally the
@@ -233,42 +1172,405 @@ class LogParser(object):
         jobs_alias: str (optional, default None)
             if the log file concerns a single job, replace the job ID by this
             alias.
+        normalizer: TimestampNormalizer (optional, default None)
+            if set, the timestamps are normalized.
 
         Returns
         -------
-        final_struct : dict of dict of dict
-            the reorganized log:
-                * the first keys are the job ids.
-                * the second keys are the processings timestamps.
-                * the last dict contains the requested information.
-        hierarchy_level: int (optional, defaul 0)
-            the hierarchy level, ie. number of dictionaries.
+        records: list of 2-uplet
+            the (key path, record) items of the reorganized log, where the
+            key path is the tuple of the hierarchy keys of the record, by
+            default the job id and the processing timestamp, and the record
+            contains the requested information.
 
         Raises
         ------
-        ValueError: if multiple matches are found for a pattern or
-                    if multiple patterns are detected in the same row or
-                    if the timestamp or the job id can't be retrieved in a
-                    row with a match or
-                    if the log is currupted.
+        ValueError: if the same (job_id, timestamp, name) triplet is detected
+                    multiple times, ie. if the log is currupted.
         """
-        # Parse the log file
-        with open(logfile, "rt") as open_file:
-            lines = open_file.readlines()
+        if hierarchy is None:
+            hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
 
-        # Go through each line in the log file, detect requested patterns, and
-        # fill the returned structure
-        all_patterns = [job_pattern, timestamp_pattern]
-        for name, struct in custom_patterns.items():
-            all_patterns.append(struct["regex"])
+        # Fill the returned structure
+        stats = cls.stats
+        if stats is not None:
+            matches = stats.iter_matches(matches)
         struct = {}
-        for index, row in enumerate(lines):
+        for job_id, timestamp, name, custom_data in matches:
+            if normalizer is not None:
+                timestamp = normalizer.normalize(timestamp, logfile)
+            struct.setdefault(job_id, {}).setdefault(timestamp, {})
+            if name in struct[job_id][timestamp]:
+                raise ValueError("The triplet '{0}-{1}-{2}' has been "
+                                 "detected multiple times in log file "
+                                 "'{3}'. The log file might be "
+                                 "corrupted.".format(job_id, timestamp,
+                                                     name, logfile))
+            struct[job_id][timestamp][name] = custom_data
 
-            # Detect matches
-            all_matches = {}
-            for cnt, pattern in enumerate(all_patterns):
-                matches = pattern.findall(row)
-                if len(matches) == 0:
+        # Store information in requested format
+        start = clock() if stats is not None else None
+        items = []
+        for job_id, timestamp_struct in struct.items():
+            if jobs_alias is not None:
+                job_id = jobs_alias
+            for timestamp, data in timestamp_struct.items():
+                data["job_id"] = job_id
+                data["timestamp"] = timestamp
+                items.append(data)
+        records = cls._get_records(items, hierarchy)
+        if stats is not None:
+            stats.records += len(records)
+            stats.add_time("organize", clock() - start)
+
+        return records
+
+    @hybridmethod
+    def _iter_matches(cls, logfile, job_pattern, timestamp_pattern,
+                      custom_patterns, combined_pattern=None, literals=None,
+                      start=0, end=None, memory_map=False):
+        """ Stream a log file and detect the requested patterns.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            the path to the log file that will be parsed.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+        combined_pattern: re.SRE_Pattern (optional, default None)
+            the alternation of all the custom patterns. If None, each pattern
+            is applied in turn on each row.
+        literals: tuple of str (optional, default None)
+            skip the rows that contain none of these literals. If None, all
+            the rows are matched.
+        start: int (optional, default 0)
+            the first byte offset of the parsed range, must be a line start.
+        end: int (optional, default None)
+            the end byte offset of the parsed range, must be a line start. If
+            None, the log file is parsed until its end.
+        memory_map: bool (optional, default False)
+            if set and if the log file is not compressed, search the
+            memory-mapped log file with bytes patterns and only decode the
+            rows of interest. The log file is read in text mode if it
+            contains carriage returns, since the bytes patterns anchors
+            don't match before them.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, custom_data) detected items.
+
+        Raises
+        ------
+        ValueError: if multiple matches are found for a pattern or
+                    if multiple patterns are detected in the same row or
+                    if the timestamp or the job id can't be retrieved in a
+                    row with a match.
+        """
+        memory_map = (
+            memory_map and compression(logfile) is None and
+            not cls._has_carriage_returns(logfile, start, end))
+
+        # The rows that are skipped in a buffer are searched for multiple job
+        # IDs or timestamps unless the rows are prefiltered
+        detectors = []
+        if memory_map and literals is None:
+            detectors = [cls._compile_detector(regex)
+                         for regex in (job_pattern, timestamp_pattern)]
+        if (memory_map and compression(logfile) is None and
+                combined_pattern is not None and None not in detectors):
+            regexes = [job_pattern, timestamp_pattern, combined_pattern] + [
+                struct["regex"] for struct in custom_patterns.values()]
+            buffer_patterns = [
+                cls._encode_pattern(regex) for regex in regexes
+                if regex is combined_pattern or regex.groups <= 1]
+            if len(buffer_patterns) == len(regexes) and (
+                    None not in buffer_patterns):
+                for match in cls._match_buffer(
+                        logfile, job_pattern, timestamp_pattern,
+                        custom_patterns, combined_pattern, buffer_patterns,
+                        start, end, detectors):
+                    yield match
+                return
+        if memory_map and compression(logfile) is None:
+            scanner = None
+            if None not in detectors:
+                scanner = cls._compile_scanner(combined_pattern, literals)
+            rows = cls._iter_buffer_rows(logfile, scanner, start, end,
+                                         detectors)
+        elif start != 0 or end is not None:
+            if compression(logfile) is not None:
+                raise ValueError("The compressed log file '{0}' can't be "
+                                 "parsed by byte range.".format(logfile))
+            if end is None:
+                end = os.path.getsize(logfile)
+            rows = enumerate(cls._iter_rows(logfile, start, end))
+            if cls.stats is not None:
+                rows = cls.stats.iter_rows(rows)
+        else:
+            with open_logfile(logfile) as open_file:
+                rows = enumerate(open_file)
+                if cls.stats is not None:
+                    rows = cls.stats.iter_rows(rows)
+                for match in cls._match_rows(
+                        rows, logfile, job_pattern, timestamp_pattern,
+                        custom_patterns, combined_pattern, literals):
+                    yield match
+            return
+        for match in cls._match_rows(
+                rows, logfile, job_pattern, timestamp_pattern,
+                custom_patterns, combined_pattern, literals):
+            yield match
+
+    @hybridmethod
+    def _match_rows(cls, rows, logfile, job_pattern, timestamp_pattern,
+                    custom_patterns, combined_pattern=None, literals=None):
+        """ Detect the requested patterns with the loop or combined engine.
+
+        Parameters
+        ----------
+        rows: iterable of 2-uplet (mandatory)
+            the log file (line index, row) items.
+        logfile : str (mandatory)
+            the path to the log file, used in error messages.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+        combined_pattern: re.SRE_Pattern (optional, default None)
+            the alternation of all the custom patterns. If None, the loop
+            engine is used.
+        literals: tuple of str (optional, default None)
+            skip the rows that contain none of these literals.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, custom_data) detected items.
+        """
+        if combined_pattern is None:
+            return cls._match_loop(
+                rows, logfile, job_pattern, timestamp_pattern,
+                custom_patterns, literals)
+        return cls._match_combined(
+            rows, logfile, job_pattern, timestamp_pattern,
+            custom_patterns, combined_pattern, literals)
+
+    @hybridmethod
+    def _compile_patterns(cls, job_pattern, timestamp_pattern,
+                          custom_patterns, engine="combined", prefilter=None):
+        """ Compile the regular expressions used to parse a log file.
+
+        Parameters
+        ----------
+        job_pattern : str (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : str (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : dict of dict (mandatory)
+            a dict with custom names as keys and values that are dictionaries
+            with one mandatory 'regex' item and optional 'splitter' and
+            'literal' items.
+        engine: str (optional, default 'combined')
+            the matching engine in ('combined', 'loop').
+        prefilter: bool (optional, default None)
+            if set, collect the custom patterns literals.
+
+        Returns
+        -------
+        job_pattern : re.SRE_Pattern
+            the compiled job IDs regular expression.
+        timestamp_pattern : re.SRE_Pattern
+            the compiled timestamps regular expression.
+        custom_patterns : OrderedDict of dict
+            the compiled custom regular expressions and their splitters.
+        combined_pattern: re.SRE_Pattern
+            the alternation of all the custom patterns, None if the 'loop'
+            engine is requested or if the patterns can't be combined.
+        literals: tuple of str
+            the substrings contained in all the rows matched by the custom
+            patterns, None if the prefilter is disabled or if a literal can't
+            be found for a custom pattern.
+
+        Raises
+        ------
+        ValueError: if the engine is not recognize.
+        """
+        if engine not in ("combined", "loop"):
+            raise ValueError("Unrecognize '{0}' engine.".format(engine))
+        _job_pattern = re.compile(job_pattern)
+        _timestamp_pattern = re.compile(timestamp_pattern)
+        _custom_patterns = collections.OrderedDict(
+            (name, {"regex": re.compile(value["regex"]),
+                    "splitter": value.get("splitter", None)})
+            for name, value in custom_patterns.items())
+        _combined_pattern = None
+        if engine == "combined":
+            _combined_pattern = cls._combine_patterns(_custom_patterns)
+        _literals = None
+        if prefilter:
+            _literals = cls._collect_literals(
+                custom_patterns, _custom_patterns)
+        return (_job_pattern, _timestamp_pattern, _custom_patterns,
+                _combined_pattern, _literals)
+
+    @hybridmethod
+    def _combine_patterns(cls, custom_patterns):
+        """ Combine the custom patterns in a single alternation.
+
+        Each pattern is followed by an empty '_lp<index>' named group that
+        identifies the matched pattern. The marker is appended rather than
+        wrapping the pattern: a leading group hides the literal prefix of a
+        pattern and disables the fast prefix scan of the regex engine.
+
+        Parameters
+        ----------
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+
+        Returns
+        -------
+        combined_pattern: re.SRE_Pattern
+            the alternation of all the custom patterns, None if the patterns
+            use flags, numbered back references or conditionals that can't be
+            preserved in an alternation.
+        """
+        regexes = []
+        for cnt, struct in enumerate(custom_patterns.values()):
+            regex = struct["regex"]
+            if (regex.flags & ~re.UNICODE or
+                    _UNCOMBINABLE_PATTERN.search(regex.pattern) is not None):
+                return None
+            regexes.append("(?:{0})(?P<_lp{1}>)".format(regex.pattern, cnt))
+        if len(regexes) == 0:
+            return None
+        try:
+            return re.compile("|".join(regexes))
+        except re.error:
+            return None
+
+    @hybridmethod
+    def _collect_literals(cls, custom_patterns, compiled_patterns):
+        """ Collect the literals used to prefilter the log file rows.
+
+        Parameters
+        ----------
+        custom_patterns : dict of dict (mandatory)
+            the custom patterns with an optional 'literal' item.
+        compiled_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+
+        Returns
+        -------
+        literals: tuple of str
+            the shortest literals first, a row matched by a custom pattern
+            contains at least one of them. None if a literal can't be found
+            for a custom pattern.
+        """
+        literals = set()
+        for name, struct in compiled_patterns.items():
+            literal = custom_patterns[name].get("literal", None)
+            if literal is None:
+                literal = cls._extract_literal(struct["regex"])
+            if not literal:
+                return None
+            literals.add(literal)
+
+        # A row that contains a literal contains all its substrings: keep
+        # only the shortest ones
+        minimal_literals = []
+        for literal in sorted(literals, key=len):
+            if not any(item in literal for item in minimal_literals):
+                minimal_literals.append(literal)
+        return tuple(minimal_literals)
+
+    @hybridmethod
+    def _extract_literal(cls, regex):
+        """ Extract the longest literal substring contained in all the
+        matches of a regular expression.
+
+        Parameters
+        ----------
+        regex: re.SRE_Pattern (mandatory)
+            a compiled regular expression.
+
+        Returns
+        -------
+        literal: str
+            the longest run of literal characters in the top level sequence
+            of the regular expression, None if no literal can be found.
+        """
+        if regex.flags & re.IGNORECASE:
+            return None
+        longest = current = ""
+        items = list(sre_parse.parse(regex.pattern, regex.flags))
+        while len(items) > 0:
+            op, av = items.pop(0)
+            if op == sre_constants.LITERAL:
+                current += unichr(av)
+                continue
+            elif (op == sre_constants.SUBPATTERN and
+                    not (len(av) == 4 and av[1] & re.IGNORECASE)):
+                items = list(av[-1]) + items
+                continue
+            if len(current) > len(longest):
+                longest = current
+            current = ""
+        if len(current) > len(longest):
+            longest = current
+        return longest or None
+
+    @hybridmethod
+    def _match_loop(cls, rows, logfile, job_pattern, timestamp_pattern,
+                    custom_patterns, literals=None):
+        """ Detect the requested patterns by applying each pattern in turn on
+        each row.
+
+        Parameters
+        ----------
+        rows: iterable of 2-uplet (mandatory)
+            the log file (line index, row) items.
+        logfile : str (mandatory)
+            the path to the log file, used in error messages.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+        literals: tuple of str (optional, default None)
+            skip the rows that contain none of these literals.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, custom_data) detected items.
+        """
+        all_patterns = [job_pattern, timestamp_pattern]
+        for name, struct in custom_patterns.items():
+            all_patterns.append(struct["regex"])
+        names = list(custom_patterns.keys())
+        for index, row in rows:
+
+            # Skip the rows without literal
+            if literals is not None:
+                for literal in literals:
+                    if literal in row:
+                        break
+                else:
+                    continue
+
+            # Detect matches
+            all_matches = {}
+            for cnt, pattern in enumerate(all_patterns):
+                matches = pattern.findall(row)
+                if len(matches) == 0:
                     continue
                 elif len(matches) > 1:
                     raise ValueError("Multiple matches found for pattern "
@@ -286,118 +1588,1009 @@ class LogParser(object):
                     raise ValueError(
                         "Multiple matches found for patterns '{0}' on log "
                         "file '{1}' line {2}: '{3}'.".format(
-                            [p.pattern for p in custom_patterns],
+                            [p.pattern for p in all_patterns[2:]],
                             logfile, index, row))
                 all_matches[str(cnt)] = matches[0]
 
             # Organize matches
             if len(all_matches) == 3:
-
-                # > get information
                 job_id = all_matches.pop("0")
                 timestamp = all_matches.pop("1")
                 custom_index, custom_data = list(all_matches.items())[0]
-                name = list(custom_patterns.keys())[int(custom_index) - 2]
-                if custom_patterns[name]["splitter"] is not None:
-                    splitter, pos = custom_patterns[name]["splitter"]
-                    custom_data = custom_data.split(splitter)[pos]
-
-                # > store information
-                struct.setdefault(job_id, {}).setdefault(timestamp, {})
-                if name in struct[job_id][timestamp]:
-                    raise ValueError("The triplet '{0}-{1}-{2}' has been "
-                                     "detected multiple times in log file "
-                                     "'{3}'. The log file might be "
-                                     "corrupted.".format(job_id, timestamp,
-                                                         name, logfile))
-                struct[job_id][timestamp][name] = custom_data
+                name = names[int(custom_index) - 2]
+                yield cls._split(job_id, timestamp, name, custom_data,
+                                 custom_patterns)
 
-        # Store information in requested format
-        final_struct = {}
-        for job_id, timestamp_struct in struct.items():
-            if jobs_alias is not None:
-                job_id = jobs_alias
-            for timestamp, data in timestamp_struct.items():
-                data["job_id"] = job_id
-                data["timestamp"] = timestamp
-                hierarchy_level = cls._get_data(final_struct, data, hierarchy)
+    @hybridmethod
+    def _match_combined(cls, rows, logfile, job_pattern, timestamp_pattern,
+                        custom_patterns, combined_pattern, literals=None):
+        """ Detect the requested patterns by scanning each row once with the
+        alternation of all the custom patterns. The job ID, timestamp and
+        custom patterns are then only applied on the rows with a hit, in
+        order to detect the rows matched by multiple patterns.
 
-        return final_struct, hierarchy_level
+        Parameters
+        ----------
+        rows: iterable of 2-uplet (mandatory)
+            the log file (line index, row) items.
+        logfile : str (mandatory)
+            the path to the log file, used in error messages.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+        combined_pattern: re.SRE_Pattern (mandatory)
+            the alternation of all the custom patterns.
+        literals: tuple of str (optional, default None)
+            skip the rows that contain none of these literals.
 
-    @classmethod
-    def _get_data(cls, struct, data, hierarchy, hierarchy_level=0):
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, custom_data) detected items.
+        """
+        names = list(custom_patterns.keys())
+        regexes = [struct["regex"] for struct in custom_patterns.values()]
+        for index, row in rows:
+
+            # Skip the rows without literal
+            if literals is not None:
+                for literal in literals:
+                    if literal in row:
+                        break
+                else:
+                    continue
+
+            # Detect the custom pattern: the alternation only reports the
+            # leftmost non overlapping hits, thus the other custom patterns
+            # are searched in the hit row
+            hit = combined_pattern.search(row)
+            if hit is None:
+                if literals is None:
+                    cls._check_row(row, index, logfile, job_pattern,
+                                   timestamp_pattern)
+                continue
+            cnt = int(hit.lastgroup[3:])
+            for other_cnt, regex in enumerate(regexes):
+                if other_cnt != cnt and regex.search(row) is not None:
+                    raise ValueError(
+                        "Multiple matches found for patterns '{0}' on log "
+                        "file '{1}' line {2}: '{3}'.".format(
+                            [regex.pattern for regex in regexes],
+                            logfile, index, row))
+            name = names[cnt]
+
+            # Detect matches
+            all_matches = []
+            for pattern in (job_pattern, timestamp_pattern,
+                            custom_patterns[name]["regex"]):
+                matches = pattern.findall(row)
+                if len(matches) > 1:
+                    raise ValueError("Multiple matches found for pattern "
+                                     "'{0}' on log file '{1}' line {2}: "
+                                     "'{3}'.".format(pattern.pattern, logfile,
+                                                     index, row))
+                all_matches.extend(matches)
+            if len(all_matches) < 3:
+                raise ValueError("Can't detect timestamp or job id from "
+                                 "patterns '{0}', '{1}' on log file '{2}' "
+                                 "line {3}: '{4}'.".format(
+                                     timestamp_pattern.pattern,
+                                     job_pattern.pattern,
+                                     logfile, index, row))
+            job_id, timestamp, custom_data = all_matches
+            yield cls._split(job_id, timestamp, name, custom_data,
+                             custom_patterns)
+
+    @hybridmethod
+    def _check_row(cls, row, index, logfile, job_pattern, timestamp_pattern):
+        """ Check that a row without custom data has at most one job ID and
+        one timestamp.
+
+        Parameters
+        ----------
+        row: str (mandatory)
+            the log file row.
+        index: int (mandatory)
+            the row line index, used in error messages.
+        logfile : str (mandatory)
+            the path to the log file, used in error messages.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+
+        Raises
+        ------
+        ValueError: if multiple matches are found for a pattern.
+        """
+        for pattern in (job_pattern, timestamp_pattern):
+            if len(pattern.findall(row)) > 1:
+                raise ValueError("Multiple matches found for pattern "
+                                 "'{0}' on log file '{1}' line {2}: "
+                                 "'{3}'.".format(pattern.pattern, logfile,
+                                                 index, row))
+
+    @hybridmethod
+    def _compile_detector(cls, regex):
+        """ Compile the bytes pattern used to find the rows of a buffer where
+        a regular expression may be found multiple times.
+
+        Parameters
+        ----------
+        regex: re.SRE_Pattern (mandatory)
+            a compiled regular expression.
+
+        Returns
+        -------
+        detector: re.SRE_Pattern
+            the bytes pattern matching two occurrences of the regular
+            expression in a row, None if it can't be searched in a buffer.
+        """
+        try:
+            regex = re.compile("(?:{0})[^\n]*?(?:{0})".format(regex.pattern),
+                               regex.flags)
+        except re.error:
+            return None
+        return cls._encode_pattern(regex)
+
+    @hybridmethod
+    def _iter_duplicate_rows(cls, buf, start, end, detectors):
+        """ Iterate over the rows of a memory-mapped log file byte range
+        where a detector is found.
+
+        Parameters
+        ----------
+        buf: mmap.mmap (mandatory)
+            the memory-mapped log file.
+        start: int (mandatory)
+            the range first byte offset, must be a line start.
+        end: int (mandatory)
+            the range end byte offset, must be a line start.
+        detectors: list of re.SRE_Pattern (mandatory)
+            the bytes patterns as returned by '_compile_detector'.
+
+        Returns
+        -------
+        rows: generator of 2-uplet
+            the (start, end) byte offsets of the found rows.
+        """
+        position = start
+        while position < end and len(detectors) > 0:
+            found = [detector.search(buf, position, end)
+                     for detector in detectors]
+            found = [match.start() for match in found if match is not None]
+            if len(found) == 0:
+                break
+            row_start = buf.rfind(b"\n", position, min(found)) + 1
+            row_start = row_start or position
+            row_end = buf.find(b"\n", min(found), end)
+            row_end = end if row_end == -1 else row_end + 1
+            yield row_start, row_end
+            position = row_end
+
+    @hybridmethod
+    def _match_buffer(cls, logfile, job_pattern, timestamp_pattern,
+                      custom_patterns, combined_pattern, buffer_patterns,
+                      start=0, end=None, detectors=None):
+        """ Detect the requested patterns in a memory-mapped log file. The
+        buffer is searched with the bytes alternation of all the custom
+        patterns, the bytes job ID, timestamp and matched custom patterns are
+        then applied on the hit rows, and only the matched data are decoded.
+
+        The hit rows with non ASCII characters or carriage returns, the hit
+        rows where another custom pattern is found, the hit rows that can't
+        be parsed, and the skipped rows where a detector is found, are
+        decoded and processed by the combined engine, which gives the same
+        results and error messages as the text mode.
+
+        Parameters
+        ----------
+        logfile : str (mandatory)
+            the path to the log file that will be parsed.
+        job_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the job IDs.
+        timestamp_pattern : re.SRE_Pattern (mandatory)
+            the regular expression used to detect the timestamps.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+        combined_pattern: re.SRE_Pattern (mandatory)
+            the alternation of all the custom patterns.
+        buffer_patterns: list of re.SRE_Pattern (mandatory)
+            the bytes job ID, timestamp and combined patterns followed by the
+            bytes custom patterns.
+        start: int (optional, default 0)
+            the first byte offset of the parsed range, must be a line start.
+        end: int (optional, default None)
+            the end byte offset of the parsed range, must be a line start. If
+            None, the log file is parsed until its end.
+        detectors: list of re.SRE_Pattern (optional, default None)
+            the bytes patterns as returned by '_compile_detector' used to
+            find the skipped rows that must be checked.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, custom_data) detected items.
+        """
+        encoding = locale.getpreferredencoding(False)
+        names = list(custom_patterns.keys())
+        job_bytes, timestamp_bytes, scanner = buffer_patterns[:3]
+        custom_bytes = buffer_patterns[3:]
+        other_bytes = [custom_bytes[:cnt] + custom_bytes[cnt + 1:]
+                       for cnt in range(len(custom_bytes))]
+        if end is None:
+            end = os.path.getsize(logfile)
+        if end <= start:
+            return
+        with open(logfile, "rb") as open_file:
+            buf = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                index = 0
+                position = counted = start
+                while position < end:
+
+                    # Find the hit row: the hit is the first one of the row
+                    hit = scanner.search(buf, position, end)
+                    hit_start = hit_end = end
+                    if hit is not None and hit.start() < end:
+                        hit_start, hit_end = hit.span()
+                    row_start = buf.rfind(b"\n", position, hit_start) + 1
+                    row_start = row_start or position
+
+                    # Process the skipped rows to be checked in text mode
+                    for skipped_start, skipped_end in (
+                            cls._iter_duplicate_rows(
+                                buf, position, row_start, detectors or [])):
+                        index += buf[counted:skipped_start].count(b"\n")
+                        counted = skipped_start
+                        rows = [(index, row) for row in cls._decode_row(
+                            buf[skipped_start:skipped_end], encoding)]
+                        for match in cls._match_combined(
+                                rows, logfile, job_pattern,
+                                timestamp_pattern, custom_patterns,
+                                combined_pattern):
+                            yield match
+                    if hit_start == end:
+                        break
+                    row_end = buf.find(b"\n", hit_start, end)
+                    row_end = end if row_end == -1 else row_end + 1
+                    position = row_end
+
+                    # Detect matches: the row is processed in text mode if
+                    # another custom pattern is found
+                    cnt = int(hit.lastgroup[3:])
+                    in_buffer = (
+                        hit_start < hit_end <= row_end and
+                        _NON_ASCII_BYTES.search(
+                            buf, row_start, row_end) is None)
+                    for regex in other_bytes[cnt] if in_buffer else ():
+                        if regex.search(buf, row_start, row_end) is not None:
+                            in_buffer = False
+                            break
+                    if in_buffer:
+                        job_ids = job_bytes.findall(buf, row_start, row_end)
+                        timestamps = timestamp_bytes.findall(
+                            buf, row_start, row_end)
+                        custom_data = custom_bytes[cnt].findall(
+                            buf, row_start, row_end)
+                        if (len(job_ids) == 1 and len(timestamps) == 1 and
+                                len(custom_data) == 1):
+                            yield cls._split(
+                                job_ids[0].decode(encoding),
+                                timestamps[0].decode(encoding),
+                                names[cnt], custom_data[0].decode(encoding),
+                                custom_patterns)
+                            continue
+
+                    # Process the row in text mode
+                    index += buf[counted:row_start].count(b"\n")
+                    counted = row_start
+                    rows = [(index, row) for row in cls._decode_row(
+                        buf[row_start:row_end], encoding)]
+                    for match in cls._match_combined(
+                            rows, logfile, job_pattern, timestamp_pattern,
+                            custom_patterns, combined_pattern):
+                        yield match
+                if cls.stats is not None:
+                    cls.stats.lines_scanned += cls._count_rows(
+                        buf, start, end)
+            finally:
+                buf.close()
+
+    @hybridmethod
+    def _split(cls, job_id, timestamp, name, custom_data, custom_patterns):
+        """ Keep only the requested part of a matched custom data.
+
+        Parameters
+        ----------
+        job_id: str (mandatory)
+            the matched job ID.
+        timestamp: str (mandatory)
+            the matched timestamp.
+        name: str (mandatory)
+            the matched custom pattern name.
+        custom_data: str (mandatory)
+            the matched custom data.
+        custom_patterns : OrderedDict of dict (mandatory)
+            the compiled custom regular expressions and their splitters.
+
+        Returns
+        -------
+        match: 4-uplet
+            the (job_id, timestamp, name, custom_data) detected item.
+        """
+        if custom_patterns[name]["splitter"] is not None:
+            splitter, pos = custom_patterns[name]["splitter"]
+            custom_data = custom_data.split(splitter)[pos]
+        return job_id, timestamp, name, custom_data
+
+    @hybridmethod
+    def _get_records(cls, items, hierarchy):
         """ Organize some unstructured data.
 
         Parameters
         ----------
-        struct: dict (mandatory)
-            the final structure that is modified in place.
-        data: dict (mandatory)
-            unstructured data.
+        items: iterable of dict (mandatory)
+            unstructured data, modified in place.
         hierarchy: dict (mandatory)
             the parsed log final organization. Keys must be in the data
             structure.
-        hierarchy_level: int (optional, defaul 0)
-            the hierarchy level, ie. number of dictionaries.
 
         Returns
         -------
-        hierarchy_level: int (optional, defaul 0)
-            the hierarchy level, ie. number of dictionaries.
+        records: list of 2-uplet
+            the (key path, record) items, where the key path is the tuple of
+            the hierarchy keys values and the record contains the remaining
+            data.
 
         Raises
         ------
-        ValueError: if leaf structure is not empty in order to avoid data
-                    overwriting.
+        ValueError: if two items have the same key path in order to avoid
+                    data overwriting.
                     if the hierarchy format is not supported.
         """
-        hierarchy_level += 1
-        for key, value in hierarchy.items():
-            if value is None:
-                if struct != {}:
-                    raise ValueError("Can't process data without lose.")
-                struct.update(data)
-            elif isinstance(value, dict):
-                inner_value = data.pop(key)
-                if inner_value not in struct:
-                    struct[inner_value] = {}
-                hierarchy_level = cls._get_data(
-                    struct[inner_value], data, value, hierarchy_level)
-            else:
+        keys = cls._get_hierarchy_keys(hierarchy)
+        records = []
+        paths = set()
+        for data in items:
+            path = tuple(data.pop(key) for key in keys)
+            if path in paths:
+                raise ValueError("Can't process data without lose.")
+            paths.add(path)
+            records.append((path, data))
+        return records
+
+    @hybridmethod
+    def _get_hierarchy_keys(cls, hierarchy):
+        """ Get the keys of a hierarchy.
+
+        Parameters
+        ----------
+        hierarchy: dict (mandatory)
+            a parsed log organization: nested dictionaries with a single
+            item each, the last value being None.
+
+        Returns
+        -------
+        keys: tuple of str
+            the hierarchy keys, without the last one.
+
+        Raises
+        ------
+        ValueError: if the hierarchy format is not supported.
+        """
+        keys = []
+        level = hierarchy
+        while level is not None:
+            if not isinstance(level, dict) or len(level) != 1:
                 raise ValueError(
                     "'{0}' hierarchy format not supported.".format(hierarchy))
-        return hierarchy_level
+            key, level = next(iter(level.items()))
+            if level is not None:
+                keys.append(key)
+        return tuple(keys)
 
-    @classmethod
-    def _concatenate(cls, data, new_data, hierarchy_level, current_level=0):
-        """ Concatenate a the class dataset with a new dataset.
+    @hybridmethod
+    def merge(cls, data, hierarchy=None, update=False):
+        """ Merge a dataset, for instance the dataset of an independent
+        parser, in the parser dataset. The merge is locked, thus datasets
+        can be merged concurrently in a shared parser.
+
+        Parameters
+        ----------
+        data: dict (mandatory)
+            the dataset to be merged without lose.
+        hierarchy: dict (optional, default None)
+            the dataset organization. If None, the job IDs followed by the
+            timestamps and finally the custom data.
+        update: bool (optional, default False)
+            if set, new items can be added in a leaf structure that is not
+            empty.
+
+        Raises
+        ------
+        ValueError: if leaf structure is not empty in order to avoid data
+                    overwriting, or if the leaf items overlap in update mode.
+        """
+        if hierarchy is None:
+            hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
+        hierarchy_level = len(cls._get_hierarchy_keys(hierarchy)) + 1
+        cls._merge(list(cls._iter_records(data, hierarchy_level)), hierarchy,
+                   update)
+
+    @hybridmethod
+    def query_range(cls, start=None, end=None, project=None):
+        """ Get the records with a timestamp in a range. The range bounds are
+        found by binary search in the sorted timestamps index maintained
+        when data are parsed.
+
+        The timestamps are compared as strings, thus the ISO 8601 formated
+        timestamps are sorted chronologically. The records that have been
+        added directly in the class dataset are not indexed, and the
+        records that have been removed are skipped.
+
+        Parameters
+        ----------
+        start: str (optional, default None)
+            the range included lower bound. If None, no lower bound.
+        end: str (optional, default None)
+            the range excluded upper bound. If None, no upper bound.
+        project: str (optional, default None)
+            only get the records of this first level key. If None, get the
+            records of all the first level keys.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) items sorted by timestamp, where the key
+            path is the tuple of the hierarchy keys of the record.
+        """
+        with cls._lock:
+            if project is None:
+                projects = list(cls._timestamps.keys())
+            else:
+                projects = [project]
+            slices = []
+            for name in projects:
+                entries = cls._timestamps.get(name, [])
+                lower = 0
+                if start is not None:
+                    lower = bisect.bisect_left(entries, (start, ))
+                upper = len(entries)
+                if end is not None:
+                    upper = bisect.bisect_left(entries, (end, ), lower)
+                slices.append(entries[lower: upper])
+            records = []
+            previous = None
+            for entry in heapq.merge(*slices):
+                if entry == previous:
+                    continue
+                previous = entry
+                record = cls._get_record(entry[1])
+                if record is not None:
+                    records.append((entry[1], record))
+        return records
+
+    @hybridmethod
+    def create_index(cls, name):
+        """ Create a hash index on a record field. The index is built from
+        the records merged in the class dataset and is kept up to date when
+        data are parsed.
+
+        Parameters
+        ----------
+        name: str (mandatory)
+            the field name, ie. a custom pattern name.
+        """
+        with cls._lock:
+            index = {}
+            cls._indexes[name] = index
+            for project, depth in cls._depths.items():
+                if project in cls.data:
+                    cls._index_fields(
+                        cls._iter_records({project: cls.data[project]},
+                                          depth + 1),
+                        {name: index})
+
+    @hybridmethod
+    def drop_index(cls, name):
+        """ Remove a record field hash index.
+
+        Parameters
+        ----------
+        name: str (mandatory)
+            the field name.
+        """
+        with cls._lock:
+            cls._indexes.pop(name, None)
+
+    @hybridmethod
+    def lookup(cls, name, value=None, project=None):
+        """ Get the records with a field value using the field hash index.
+
+        Parameters
+        ----------
+        name: str (mandatory)
+            the indexed field name.
+        value: object (optional, default None)
+            the field value. If None, get the records with any value.
+        project: str (optional, default None)
+            only get the records of this first level key. If None, get the
+            records of all the first level keys.
+
+        Returns
+        -------
+        records: list of 2-uplet
+            the (key path, record) items sorted by key path, where the key
+            path is the tuple of the hierarchy keys of the record.
+
+        Raises
+        ------
+        ValueError: if the field is not indexed.
+        """
+        with cls._lock:
+            if name not in cls._indexes:
+                raise ValueError("Unrecognize '{0}' index.".format(name))
+            index = cls._indexes[name]
+            if value is None:
+                paths = set()
+                for value_paths in index.values():
+                    paths.update(value_paths)
+            else:
+                try:
+                    paths = index.get(value, ())
+                except TypeError:
+                    paths = ()
+            records = []
+            for path in sorted(paths):
+                if project is not None and path[0] != project:
+                    continue
+                record = cls._get_record(path)
+                if record is None or name not in record or (
+                        value is not None and record[name] != value):
+                    continue
+                records.append((path, record))
+        return records
+
+    @hybridmethod
+    def clear(cls):
+        """ Remove all the records of the class dataset and its indexes.
+        """
+        with cls._lock:
+            cls.data.clear()
+            cls._timestamps.clear()
+            cls._depths.clear()
+            for index in cls._indexes.values():
+                index.clear()
+
+    @hybridmethod
+    def _get_record(cls, path):
+        """ Get a record of the class dataset.
+
+        Parameters
+        ----------
+        path: tuple (mandatory)
+            the record key path.
+
+        Returns
+        -------
+        record: dict
+            the record, None if the record has been removed.
+        """
+        record = cls.data
+        try:
+            for key in path:
+                record = record[key]
+        except (KeyError, TypeError):
+            return None
+        return record
+
+    @hybridmethod
+    def _iter_records(cls, data, hierarchy_level):
+        """ Iterate over the records of a dataset.
 
         Parameters
         ----------
         data: dict (mandatory)
-            the class dataset.
-        new_data: dict (mandatory)
-            a new dataset to be concatenated without lose.
+            a dataset.
         hierarchy_level: int (mandatory)
             the hierarchy level, ie. number of dictionaries.
-        current_level: int (optional, default 0)
-            the current hierarchy level.
+
+        Returns
+        -------
+        records: iterator of 2-uplet
+            the (key path, record) items.
+        """
+        paths = [((), data)]
+        for cnt in range(hierarchy_level - 1):
+            paths = [(path + (key, ), value)
+                     for path, struct in paths
+                     for key, value in struct.items()]
+        return iter(paths)
+
+    @hybridmethod
+    def _get_hierarchy(cls, hierarchy, profile):
+        """ Get the hierarchy of a parsing.
+
+        Parameters
+        ----------
+        hierarchy: dict (mandatory)
+            the hierarchy parameter, may be None.
+        profile: ParserProfile (mandatory)
+            the profile parameter, may be None.
+
+        Returns
+        -------
+        hierarchy: dict
+            the hierarchy, None for the default one.
+        """
+        if hierarchy is None and profile is not None:
+            return profile.hierarchy
+        return hierarchy
+
+    @hybridmethod
+    def _merge(cls, records, hierarchy=None, update=False):
+        """ Merge new records in the class dataset and index them.
+
+        Parameters
+        ----------
+        records: list of 2-uplet (mandatory)
+            the (key path, record) new items to be merged without lose.
+        hierarchy: dict (optional, default None)
+            the new records organization. If None, the default organization
+            with the timestamps in second position.
+        update: bool (optional, default False)
+            if set, new items can be added in a record that is not empty.
 
         Raises
         ------
-        ValueError: if leaf structure is not empty in order to avoid data
-                    overwriting.
-        """
-        current_level += 1
-        for key, value in new_data.items():
-            if current_level < (hierarchy_level - 1):
-                if key not in data:
-                    data[key] = {}
-                cls._concatenate(data[key], value, hierarchy_level,
-                                 current_level)
+        ValueError: if a record is not empty in order to avoid data
+                    overwriting, or if the record items overlap in update
+                    mode.
+        """
+        # The merge is locked: the threads parsing in the same dataset only
+        # wait for each other while merging
+        stats = cls.stats
+        with cls._lock:
+            cls._prune_indexes()
+            start = clock() if stats is not None else None
+            counter = [0]
+            try:
+                if isinstance(cls.data, ColumnarStore):
+                    cls.data.merge(cls._count_merged(records, counter),
+                                   update)
+                else:
+                    cls._merge_records(
+                        cls.data, cls._count_merged(records, counter),
+                        update)
+            finally:
+                # Only index the records merged before a failure
+                if stats is not None:
+                    stats.add_time("merge", clock() - start)
+                    start = clock()
+                merged = records[:counter[0]]
+                for path, record in merged:
+                    cls._depths[path[0]] = len(path)
+                cls._index_timestamps(merged, hierarchy)
+                if cls._indexes:
+                    cls._index_fields(merged, cls._indexes)
+                if stats is not None:
+                    stats.add_time("index", clock() - start)
+
+    @hybridmethod
+    def _count_merged(cls, records, counter):
+        """ Iterate over records and count the merged ones.
+
+        Parameters
+        ----------
+        records: list of 2-uplet (mandatory)
+            the (key path, record) new items.
+        counter: list of int (mandatory)
+            a one-item list incremented when the next record is requested,
+            ie. once the previous record has been merged.
+
+        Returns
+        -------
+        records: generator of 2-uplet
+            the (key path, record) new items.
+        """
+        for item in records:
+            yield item
+            counter[0] += 1
+
+    @hybridmethod
+    def _prune_indexes(cls):
+        """ Remove the index entries of the first level keys that are no
+        longer in the class dataset, ie. if the dataset has been cleared or
+        replaced without calling 'clear'.
+        """
+        removed = set(
+            project for project in cls._depths if project not in cls.data)
+        if len(removed) == 0:
+            return
+        for project in removed:
+            del cls._depths[project]
+            cls._timestamps.pop(project, None)
+        for index in cls._indexes.values():
+            for value, paths in list(index.items()):
+                paths = set(path for path in paths if path[0] not in removed)
+                if len(paths) > 0:
+                    index[value] = paths
+                else:
+                    del index[value]
+
+    @hybridmethod
+    def _index_timestamps(cls, records, hierarchy=None):
+        """ Add the timestamps of new records in the sorted timestamps index.
+
+        Parameters
+        ----------
+        records: list of 2-uplet (mandatory)
+            the (key path, record) new items.
+        hierarchy: dict (optional, default None)
+            the new records organization. If None, the default organization
+            with the timestamps in second position.
+        """
+        # Find the timestamps position in the key paths
+        if hierarchy is None:
+            hierarchy = {"job_id": {"timestamp": {"custom_data": None}}}
+        position = 0
+        while isinstance(hierarchy, dict) and "timestamp" not in hierarchy:
+            hierarchy = next(iter(hierarchy.values()), None)
+            position += 1
+        if not isinstance(hierarchy, dict):
+            return
+
+        # Collect the new key paths
+        new_entries = {}
+        for path, record in records:
+            if position >= len(path):
+                break
+            new_entries.setdefault(path[0], []).append(
+                (str(path[position]), path))
+
+        # Merge the sorted entries: the sort is linear on sorted runs
+        for project, entries in new_entries.items():
+            project_entries = cls._timestamps.setdefault(project, [])
+            project_entries.extend(entries)
+            project_entries.sort()
+
+    @hybridmethod
+    def _index_fields(cls, records, indexes):
+        """ Add new records in the fields hash indexes.
+
+        Parameters
+        ----------
+        records: iterable of 2-uplet (mandatory)
+            the (key path, record) new items.
+        indexes: dict (mandatory)
+            the hash index of each field to be updated.
+        """
+        for path, record in records:
+            if not isinstance(record, Mapping):
+                continue
+            for name, index in indexes.items():
+                if name not in record:
+                    continue
+                try:
+                    index.setdefault(record[name], set()).add(path)
+                except TypeError:
+                    continue
+
+    @hybridmethod
+    def _merge_records(cls, data, records, update=False):
+        """ Merge new records in a dataset in a single pass. The parent
+        structure of each key path is memorized, thus the records sharing a
+        parent (ie. the records of a job) are merged with a single lookup.
+
+        Parameters
+        ----------
+        data: dict (mandatory)
+            the dataset, modified in place.
+        records: iterable of 2-uplet (mandatory)
+            the (key path, record) new items to be merged without lose.
+        update: bool (optional, default False)
+            if set, new items can be added in a record that is not empty.
+
+        Raises
+        ------
+        ValueError: if a record is not empty in order to avoid data
+                    overwriting, or if the record items overlap in update
+                    mode.
+        """
+        parents = {}
+        for path, record in records:
+            parent_path = path[:-1]
+            parent = parents.get(parent_path)
+            if parent is None:
+                parent = data
+                for key in parent_path:
+                    node = parent.get(key)
+                    if node is None:
+                        node = parent[key] = {}
+                    parent = node
+                parents[parent_path] = parent
+            current = parent.get(path[-1])
+            if current is None:
+                parent[path[-1]] = dict(record)
+            elif current and (
+                    not update or any(key in current for key in record)):
+                raise ValueError("Can't process data without lose.")
             else:
-                if key not in data:
-                    data[key] = {}
-                elif data[key] != {}:
-                    raise ValueError("Can't process data without lose.")
-                data[key].update(value)
+                current.update(record)
+
+    @hybridmethod
+    def _get_struct(cls, records):
+        """ Organize records in nested dictionaries.
+
+        Parameters
+        ----------
+        records: iterable of 2-uplet (mandatory)
+            the (key path, record) items.
+
+        Returns
+        -------
+        struct: dict
+            the records organized by key path.
+        """
+        struct = {}
+        for path, record in records:
+            parent = struct
+            for key in path[:-1]:
+                parent = parent.setdefault(key, {})
+            parent[path[-1]] = record
+        return struct
+
+
+class ParserProfile(object):
+    """ A reusable parsing configuration. The regular expressions are
+    compiled once, thus a profile can be used to parse many log files. A
+    profile can be sent to worker processes, where its regular expressions
+    are compiled again when it is unpickled.
+
+    Attributes
+    ----------
+    `job_pattern`, `timestamp_pattern`, `custom_patterns`, `hierarchy`,
+    `jobs_alias`, `engine`, `prefilter`, `normalize_timestamps`: the
+        'LogParser.parse_logfile' parameters.
+    `job_name`, `timestamp_key`, `extract_keys`: the 'LogParser.parse_logdir'
+        parameters.
+    `patterns`: 5-uplet
+        the compiled patterns as returned by 'LogParser._compile_patterns',
+        None if no pattern is specified.
+
+    Methods
+    -------
+    replace
+    """
+    def __init__(self, job_pattern=None, timestamp_pattern=None,
+                 custom_patterns=None, hierarchy=None, jobs_alias=None,
+                 engine="combined", prefilter=None, job_name=None,
+                 timestamp_key=None, extract_keys=None,
+                 normalize_timestamps=False):
+        """ Initialize the 'ParserProfile' class.
+        See 'LogParser.parse_logfile' and 'LogParser.parse_logdir' for the
+        parameters description.
+
+        Raises
+        ------
+        ValueError: if only some of the patterns are specified, if the custom
+                    patterns are not specified as a dictionary or if the
+                    engine is not recognize.
+        """
+        self.job_pattern = job_pattern
+        self.timestamp_pattern = timestamp_pattern
+        self.custom_patterns = custom_patterns
+        self.hierarchy = hierarchy
+        self.jobs_alias = jobs_alias
+        self.engine = engine
+        self.prefilter = prefilter
+        self.job_name = job_name
+        self.timestamp_key = timestamp_key
+        self.extract_keys = extract_keys
+        self.normalize_timestamps = normalize_timestamps
+        self.patterns = None
+        patterns = (job_pattern, timestamp_pattern, custom_patterns)
+        if patterns.count(None) == 3:
+            return
+        if patterns.count(None) > 0:
+            raise ValueError("A 'job_pattern', a 'timestamp_pattern' and "
+                             "'custom_patterns' are expected.")
+        if not isinstance(custom_patterns, dict):
+            raise ValueError("A dictionary with 'custom_patterns' is "
+                             "expected.")
+        self.patterns = LogParser._compile_patterns(
+            job_pattern, timestamp_pattern, custom_patterns, engine,
+            prefilter)
+
+    def replace(self, **kwargs):
+        """ Create a new profile with some parameters replaced.
+
+        Parameters
+        ----------
+        kwargs: dict
+            the replaced parameters.
+
+        Returns
+        -------
+        profile: ParserProfile
+            the new profile, the patterns are only compiled again if they
+            are replaced.
+        """
+        if not any(key in kwargs for key in (
+                "job_pattern", "timestamp_pattern", "custom_patterns",
+                "engine", "prefilter")):
+            profile = copy.copy(self)
+            for key, value in kwargs.items():
+                setattr(profile, key, value)
+            return profile
+        params = dict(
+            (key, getattr(self, key)) for key in (
+                "job_pattern", "timestamp_pattern", "custom_patterns",
+                "hierarchy", "jobs_alias", "engine", "prefilter", "job_name",
+                "timestamp_key", "extract_keys", "normalize_timestamps"))
+        params.update(kwargs)
+        return ParserProfile(**params)
+
+
+def _parse_entry(entry, parser=None):
+    """ Parse a description file entry without modifying the class dataset.
+    This function is defined at the module level in order to be sent to the
+    worker processes.
+
+    Parameters
+    ----------
+    entry: 5-uplet (mandatory)
+        the entry name, the parsing method in ('logfile', 'logdir'), the
+        parsing method parameters, the parsing cache and a flag set to
+        instrument the parsing in a worker process.
+    parser: LogParser (optional, default None)
+        the parser whose statistics are collected, if None the 'LogParser'
+        class.
+
+    Returns
+    -------
+    records: list of 2-uplet
+        the (key path, record) parsed items.
+    stats: ParseStats
+        the worker process parsing statistics, None if the flag is not set.
+    """
+    name, ptype, log_struct, cache, instrument = entry
+    if parser is None:
+        parser = LogParser
+    if instrument:
+        parser.stats = ParseStats()
+    if ptype == "logfile":
+        records = parser._parse_logfile(cache=cache, **log_struct)
+    else:
+        records = parser._parse_logdir(cache=cache, **log_struct)
+    return records, (parser.stats if instrument else None)
+
+
+def _parse_chunk(task):
+    """ Detect the requested patterns in a log file byte range. This function
+    is defined at the module level in order to be sent to the worker
+    processes.
+
+    Parameters
+    ----------
+    task: tuple (mandatory)
+        the log file, the range start and end byte offsets, the memory map
+        option, a flag set to instrument the parsing and the compiled
+        patterns as returned by 'LogParser._compile_patterns'.
+
+    Returns
+    -------
+    matches: list of 4-uplet
+        the (job_id, timestamp, name, value) detected items.
+    stats: ParseStats
+        the worker process parsing statistics, None if the flag is not set.
+    """
+    logfile, start, end, memory_map, instrument = task[:5]
+    LogParser.stats = ParseStats() if instrument else None
+    matches = list(LogParser._iter_matches(
+        logfile, *task[5:], start=start, end=end, memory_map=memory_map))
+    return matches, LogParser.stats
@@ -0,0 +1,215 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import division
+import time
+
+
+# COMPATIBILITY: the performance counter is available since python 3.3
+clock = getattr(time, "perf_counter", time.time)
+
+
+class ParseStats(object):
+    """ The statistics of the parsing pipeline.
+
+    The parsings are instrumented when an instance is set as the
+    'LogParser.stats' class attribute, ie.
+    'LogParser.stats = ParseStats()'. By default this attribute is None and
+    the parsings are not instrumented.
+
+    The log files are read and matched by a single generator, thus the
+    'read' stage is the time spent waiting for the log file rows and the
+    'match' stage is the remaining scan time. A memory-mapped log file is
+    searched without reading its rows: its scan is reported in the 'match'
+    stage. With workers, the log file rows are read and matched in the
+    worker processes: the wall time of the parallel scan is reported in the
+    'match' stage, and the stage times of the parallel description entries
+    are summed, thus they may exceed the wall time.
+
+    Attributes
+    ----------
+    `lines_scanned`: int
+        the number of log file rows.
+    `lines_matched`: dict
+        the number of rows matched by each custom pattern.
+    `bytes_read`: int
+        the size of the parsed log files, or of their parsed byte ranges, as
+        stored on the disk.
+    `records`: int
+        the number of organized records.
+    `timings`: dict
+        the wall time in seconds of each stage: 'read' (log files reads),
+        'match' (regular expressions matching), 'organize' (key paths
+        building), 'merge' (records merging) and 'index' (timestamps and
+        fields indexing).
+    `callback`: callable
+        a function called as 'callback(stage, duration, stats)' each time a
+        parsing stage ends, may be None.
+
+    Methods
+    -------
+    throughput
+    report
+    reset
+    """
+    stages = ("read", "match", "organize", "merge", "index")
+
+    def __init__(self, callback=None):
+        """ Initialize the 'ParseStats' class.
+
+        Parameters
+        ----------
+        callback: callable (optional, default None)
+            a function called as 'callback(stage, duration, stats)' each
+            time a parsing stage ends, for instance to forward the stages
+            durations to a metrics system.
+        """
+        self.callback = callback
+        self.reset()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["callback"] = None
+        return state
+
+    def reset(self):
+        """ Reset all the statistics.
+        """
+        self.lines_scanned = 0
+        self.lines_matched = {}
+        self.bytes_read = 0
+        self.records = 0
+        self.timings = dict((stage, 0.) for stage in self.stages)
+
+    def throughput(self):
+        """ Compute the parsing throughputs.
+
+        Returns
+        -------
+        throughput: dict
+            the number of rows scanned per second of scan ('lines' key) and
+            the number of records organized per second of parsing
+            ('records' key).
+        """
+        scan = self.timings["read"] + self.timings["match"]
+        total = sum(self.timings.values())
+        return {
+            "lines": self.lines_scanned / scan if scan > 0 else 0.,
+            "records": self.records / total if total > 0 else 0.
+        }
+
+    def report(self):
+        """ Get all the statistics.
+
+        Returns
+        -------
+        report: dict
+            the statistics, with Json serializable values.
+        """
+        return {
+            "lines_scanned": self.lines_scanned,
+            "lines_matched": dict(self.lines_matched),
+            "bytes_read": self.bytes_read,
+            "records": self.records,
+            "timings": dict(self.timings),
+            "throughput": self.throughput()
+        }
+
+    def add_time(self, stage, duration):
+        """ Add the duration of a parsing stage.
+
+        Parameters
+        ----------
+        stage: str (mandatory)
+            the stage name.
+        duration: float (mandatory)
+            the stage duration in seconds.
+        """
+        self.timings[stage] += duration
+        if self.callback is not None:
+            self.callback(stage, duration, self)
+
+    def update(self, stats):
+        """ Add the statistics collected by another instance, for instance
+        in a worker process.
+
+        Parameters
+        ----------
+        stats: ParseStats (mandatory)
+            the added statistics.
+        """
+        self.lines_scanned += stats.lines_scanned
+        for name, nb_lines in stats.lines_matched.items():
+            self.lines_matched[name] = (
+                self.lines_matched.get(name, 0) + nb_lines)
+        self.bytes_read += stats.bytes_read
+        self.records += stats.records
+        for stage in self.stages:
+            if stats.timings[stage] > 0:
+                self.add_time(stage, stats.timings[stage])
+
+    def iter_rows(self, rows):
+        """ Count the log file rows and the time spent reading them.
+
+        Parameters
+        ----------
+        rows: iterable of 2-uplet (mandatory)
+            the log file (line index, row) items.
+
+        Returns
+        -------
+        rows: generator of 2-uplet
+            the log file (line index, row) items.
+        """
+        rows = iter(rows)
+        duration = 0.
+        nb_rows = 0
+        try:
+            while True:
+                start = clock()
+                item = next(rows, None)
+                duration += clock() - start
+                if item is None:
+                    break
+                nb_rows += 1
+                yield item
+        finally:
+            self.lines_scanned += nb_rows
+            self.add_time("read", duration)
+
+    def iter_matches(self, matches):
+        """ Count the matched rows of each custom pattern and the time spent
+        scanning the log file.
+
+        Parameters
+        ----------
+        matches: iterable of 4-uplet (mandatory)
+            the (job_id, timestamp, name, value) detected items.
+
+        Returns
+        -------
+        matches: generator of 4-uplet
+            the (job_id, timestamp, name, value) detected items.
+        """
+        matches = iter(matches)
+        lines_matched = self.lines_matched
+        read_duration = self.timings["read"]
+        duration = 0.
+        try:
+            while True:
+                start = clock()
+                match = next(matches, None)
+                duration += clock() - start
+                if match is None:
+                    break
+                lines_matched[match[2]] = lines_matched.get(match[2], 0) + 1
+                yield match
+        finally:
+            read_duration = self.timings["read"] - read_duration
+            self.add_time("match", max(duration - read_duration, 0.))
@@ -0,0 +1,387 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+from array import array
+# COMPATIBILITY: the abstract base classes have been moved in the
+# collections.abc module since python 3.3
+try:
+    from collections.abc import Mapping
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import Mapping
+    from collections import MutableMapping
+
+
+# The marker of the rows without value in a plain column
+_MISSING = object()
+
+
+class Column(object):
+    """ An array-backed column of values.
+
+    The values are dictionary-encoded while the column has few distinct
+    values. Otherwise the codes and the values dictionary would use more
+    memory than the values, and the column switches to a plain list of the
+    rows values.
+
+    Attributes
+    ----------
+    `codes`: array of int
+        the value code of each row, -1 if the row has no value. None if the
+        column is plain.
+    `values`: list
+        the distinct values, the hashable values are only stored once. If
+        the column is plain, the value of each row.
+    """
+    __slots__ = ("codes", "values", "_lookup")
+
+    # The number of distinct values above which a column may become plain
+    max_codes = 64
+
+    def __init__(self, nb_rows=0):
+        """ Initialize the 'Column' class.
+
+        Parameters
+        ----------
+        nb_rows: int (optional, default 0)
+            the number of rows without value.
+        """
+        self.codes = array("i", [-1]) * nb_rows
+        self.values = []
+        self._lookup = {}
+
+    def get(self, row):
+        """ Get the value of a row.
+
+        Parameters
+        ----------
+        row: int (mandatory)
+            the row index.
+
+        Returns
+        -------
+        value: object
+            the row value.
+
+        Raises
+        ------
+        KeyError: if the row has no value.
+        """
+        if self.codes is None:
+            value = self.values[row]
+            if value is _MISSING:
+                raise KeyError(row)
+            return value
+        code = self.codes[row]
+        if code == -1:
+            raise KeyError(row)
+        return self.values[code]
+
+    def has(self, row):
+        """ Check if a row has a value.
+
+        Parameters
+        ----------
+        row: int (mandatory)
+            the row index.
+
+        Returns
+        -------
+        has_value: bool
+            True if the row has a value.
+        """
+        if self.codes is None:
+            return self.values[row] is not _MISSING
+        return self.codes[row] != -1
+
+    def set(self, row, value):
+        """ Set the value of a row.
+
+        Parameters
+        ----------
+        row: int (mandatory)
+            the row index.
+        value: object (mandatory)
+            the row value.
+        """
+        if self.codes is None:
+            self.values[row] = value
+            return
+        try:
+            code = self._lookup.get(value)
+        except TypeError:
+            code = None
+            hashable = False
+        else:
+            hashable = True
+        if code is None:
+            if (len(self.values) >= self.max_codes and
+                    len(self.values) * 2 > len(self.codes)):
+                self._to_plain()
+                self.values[row] = value
+                return
+            code = len(self.values)
+            self.values.append(value)
+            if hashable:
+                self._lookup[value] = code
+        self.codes[row] = code
+
+    def remove(self, row):
+        """ Remove the value of a row.
+
+        Parameters
+        ----------
+        row: int (mandatory)
+            the row index.
+        """
+        if self.codes is None:
+            self.values[row] = _MISSING
+        else:
+            self.codes[row] = -1
+
+    def append(self):
+        """ Add a row without value.
+        """
+        if self.codes is None:
+            self.values.append(_MISSING)
+        else:
+            self.codes.append(-1)
+
+    def _to_plain(self):
+        """ Replace the dictionary encoding by the list of the rows values.
+        """
+        self.values = [
+            _MISSING if code == -1 else self.values[code]
+            for code in self.codes]
+        self.codes = None
+        self._lookup = None
+
+
+class RecordView(MutableMapping):
+    """ A dict-like view of a store record.
+    """
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        """ Initialize the 'RecordView' class.
+
+        Parameters
+        ----------
+        store: ColumnarStore (mandatory)
+            the store containing the record.
+        row: int (mandatory)
+            the record row index.
+        """
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, name):
+        column = self._store.columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        try:
+            return column.get(self._row)
+        except KeyError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        self._store._column(name).set(self._row, value)
+
+    def __delitem__(self, name):
+        self[name]
+        self._store.columns[name].remove(self._row)
+
+    def __iter__(self):
+        for name, column in self._store.columns.items():
+            if column.has(self._row):
+                yield name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class NodeView(Mapping):
+    """ A dict-like view of a store hierarchy level.
+    """
+    __slots__ = ("_store", "_node")
+
+    def __init__(self, store, node):
+        """ Initialize the 'NodeView' class.
+
+        Parameters
+        ----------
+        store: ColumnarStore (mandatory)
+            the store containing the hierarchy level.
+        node: dict (mandatory)
+            the hierarchy level with the key codes as keys and the inner
+            levels or the record row indices as values.
+        """
+        self._store = store
+        self._node = node
+
+    def __getitem__(self, key):
+        code = self._store._key_codes.get(key)
+        if code is None or code not in self._node:
+            raise KeyError(key)
+        return self._store._view(self._node[code])
+
+    def __iter__(self):
+        keys = self._store.keys_table
+        for code in self._node:
+            yield keys[code]
+
+    def __len__(self):
+        return len(self._node)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarStore(NodeView):
+    """ A compact store of the parsed log records that can replace the
+    'LogParser.data' nested dictionaries.
+
+    The hierarchy keys (ie. job IDs and timestamps) are dictionary-encoded
+    as integer codes, and each record field is stored in an array-backed
+    column of dictionary-encoded values, thus the records don't own a
+    dictionary. The store and its levels are read through dict-like views.
+
+    Attributes
+    ----------
+    `columns`: dict of Column
+        the record fields columns.
+    `keys_table`: list
+        the hierarchy keys, indexed by their codes.
+    `nb_rows`: int
+        the number of records.
+
+    Methods
+    -------
+    merge
+    clear
+    to_dict
+    """
+    __slots__ = ("columns", "keys_table", "nb_rows", "_key_codes")
+
+    def __init__(self):
+        """ Initialize the 'ColumnarStore' class.
+        """
+        super(ColumnarStore, self).__init__(self, {})
+        self.columns = {}
+        self.keys_table = []
+        self.nb_rows = 0
+        self._key_codes = {}
+
+    def merge(self, records, update=False):
+        """ Merge new records in a single pass.
+
+        Parameters
+        ----------
+        records: iterable of 2-uplet (mandatory)
+            the (key path, record) new items to be merged without lose.
+        update: bool (optional, default False)
+            if set, new items can be added in a record that is not empty.
+
+        Raises
+        ------
+        ValueError: if a record is not empty in order to avoid data
+                    overwriting, or if the record items overlap in update
+                    mode.
+        """
+        parents = {}
+        for path, value in records:
+            parent_path = path[:-1]
+            node = parents.get(parent_path)
+            if node is None:
+                node = self._node
+                for key in parent_path:
+                    node = node.setdefault(self._key_code(key), {})
+                    if not isinstance(node, dict):
+                        raise ValueError("Can't process data without lose.")
+                parents[parent_path] = node
+            code = self._key_code(path[-1])
+            if code not in node:
+                node[code] = self._new_row()
+            row = node[code]
+            if isinstance(row, dict):
+                raise ValueError("Can't process data without lose.")
+            record = RecordView(self, row)
+            if len(record) > 0 and (
+                    not update or any(key in record for key in value)):
+                raise ValueError("Can't process data without lose.")
+            record.update(value)
+
+    def clear(self):
+        """ Remove all the records.
+        """
+        self._node.clear()
+        self.columns.clear()
+        del self.keys_table[:]
+        self._key_codes.clear()
+        self.nb_rows = 0
+
+    def to_dict(self):
+        """ Copy the store in nested dictionaries.
+
+        Returns
+        -------
+        data: dict
+            the store data as 'LogParser.data' nested dictionaries.
+        """
+        return self._to_dict(self._node)
+
+    def _to_dict(self, node):
+        """ Copy a hierarchy level in nested dictionaries.
+        """
+        data = {}
+        for code, value in node.items():
+            if isinstance(value, dict):
+                data[self.keys_table[code]] = self._to_dict(value)
+            else:
+                data[self.keys_table[code]] = dict(RecordView(self, value))
+        return data
+
+    def _view(self, value):
+        """ Get the view of a hierarchy level or of a record.
+        """
+        if isinstance(value, dict):
+            return NodeView(self, value)
+        return RecordView(self, value)
+
+    def _key_code(self, key):
+        """ Get the code of a hierarchy key, a new code is created if
+        necessary.
+        """
+        code = self._key_codes.get(key)
+        if code is None:
+            code = len(self.keys_table)
+            self.keys_table.append(key)
+            self._key_codes[key] = code
+        return code
+
+    def _new_row(self):
+        """ Add an empty record.
+        """
+        for column in self.columns.values():
+            column.append()
+        self.nb_rows += 1
+        return self.nb_rows - 1
+
+    def _column(self, name):
+        """ Get a record field column, a new column is created if necessary.
+        """
+        column = self.columns.get(name)
+        if column is None:
+            column = Column(self.nb_rows)
+            self.columns[name] = column
+        return column
@@ -0,0 +1,475 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+"""
+A local in-memory Elasticsearch HTTP server stub used by the tests and the
+benchmarks of the manager functions.
+"""
+
+# System import
+from __future__ import print_function
+import re
+import json
+import functools
+import threading
+from collections import OrderedDict
+# COMPATIBILITY: the HTTP server modules have been renamed in python 3
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+    from urlparse import parse_qs
+# COMPATIBILITY: basestring has been replaced by str in python 3
+try:
+    basestring
+except NameError:
+    basestring = str
+
+
+class ElasticsearchStub(object):
+    """ A minimal Elasticsearch 2.x HTTP server storing the documents in
+    memory.
+
+    The server handles the index creation, the mapping, the aliases, the
+    bulk, the search and the scroll requests. The searches support the
+    'match_all', 'term' and 'bool' queries, the 'sort' clause, the 'terms'
+    and 'top_hits' aggregations and the 'size', 'from', 'scroll' and
+    'search_type=scan' parameters. It listens to the local host on a free
+    port once started.
+
+    Attributes
+    ----------
+    `port`: int
+        the port the server is listen to.
+    `documents`: OrderedDict
+        the stored documents organized by index, type and ID.
+    `mappings`: dict
+        the mappings organized by index and type.
+    `requests`: list of 2-uplet
+        the (method, path) of each received request.
+    `nb_connections`: int
+        the number of accepted connections.
+    `rejected_ids`: set
+        the IDs of the documents to be rejected by the bulk requests.
+
+    Methods
+    -------
+    start
+    stop
+    """
+    def __init__(self, host="localhost", port=0):
+        """ Initialize the 'ElasticsearchStub' class.
+
+        Parameters
+        ----------
+        host: str (optional, default 'localhost')
+            the server host.
+        port: int (optional, default 0)
+            the server port, 0 to use a free port.
+        """
+        self.documents = OrderedDict()
+        self.mappings = {}
+        self.requests = []
+        self.nb_connections = 0
+        self.rejected_ids = set()
+        self._scrolls = {}
+        self._nb_scrolls = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = _StubServer((host, port), _StubHandler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """ Serve the requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the server.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def handle(self, method, path, params, body):
+        """ Process a request.
+
+        Parameters
+        ----------
+        method: str (mandatory)
+            the HTTP method.
+        path: str (mandatory)
+            the request path.
+        params: dict (mandatory)
+            the request query parameters.
+        body: str (mandatory)
+            the request body.
+
+        Returns
+        -------
+        status: int
+            the HTTP status.
+        response: dict
+            the Json response.
+        """
+        with self._lock:
+            self.requests.append((method, path))
+            parts = [part for part in path.split("/") if part]
+            if len(parts) == 0:
+                return 200, {"version": {"number": "2.4.1"}}
+            if parts == ["_aliases"]:
+                return 200, dict((index, {"aliases": {}})
+                                 for index in self.documents)
+            if parts == ["_bulk"]:
+                return 200, self._bulk(body)
+            if parts == ["_search", "scroll"]:
+                return self._scroll(method, params, body)
+            if parts[-1] == "_search":
+                try:
+                    return self._search(parts[:-1], params, body)
+                except ValueError as exc:
+                    return 400, {"error": str(exc), "status": 400}
+            if method == "PUT" and len(parts) == 1:
+                return self._create(parts[0], body)
+            if method == "PUT" and len(parts) == 3 and parts[1] == "_mapping":
+                return self._put_mapping(parts[0], parts[2], body)
+            return 400, {"error": "unsupported '{0} {1}' request".format(
+                method, path), "status": 400}
+
+    def _create(self, index, body):
+        """ Create an index.
+        """
+        if index in self.documents:
+            return 400, {
+                "error": {"type": "index_already_exists_exception"},
+                "status": 400}
+        self.documents[index] = OrderedDict()
+        self.mappings[index] = {}
+        mappings = json.loads(body).get("mappings", {}) if body else {}
+        for doc_type, mapping in mappings.items():
+            self.mappings[index][doc_type] = mapping
+        return 200, {"acknowledged": True}
+
+    def _put_mapping(self, index, doc_type, body):
+        """ Define the mapping of a document type.
+        """
+        if index not in self.documents:
+            return 404, {"error": {"type": "index_not_found_exception"},
+                         "status": 404}
+        self.mappings[index][doc_type] = json.loads(body)
+        return 200, {"acknowledged": True}
+
+    def _search(self, parts, params, body):
+        """ Search documents.
+        """
+        query = json.loads(body) if body else {}
+        indices = list(self.documents.keys())
+        if len(parts) > 0 and parts[0] != "_all":
+            indices = parts[0].split(",")
+        doc_types = parts[1].split(",") if len(parts) > 1 else None
+        hits = []
+        for index in indices:
+            for doc_type, docs in self.documents.get(index, {}).items():
+                if doc_types is not None and doc_type not in doc_types:
+                    continue
+                mapping = self.mappings.get(index, {}).get(doc_type, {})
+                for doc_id, source in docs.items():
+                    if self._match(query.get("query"), source, mapping):
+                        hits.append({
+                            "_index": index, "_type": doc_type,
+                            "_id": doc_id, "_score": 1.0,
+                            "_source": source})
+        self._sort(hits, query.get("sort", []))
+        size = int(params.get("size", query.get("size", 10)))
+        offset = int(params.get("from", query.get("from", 0)))
+        total = len(hits)
+        response = {"took": 1, "timed_out": False,
+                    "_shards": {"total": 1, "successful": 1, "failed": 0},
+                    "hits": {"total": total, "max_score": 1.0,
+                             "hits": hits[offset: offset + size]}}
+        if "aggs" in query:
+            response["aggregations"] = self._aggregate(hits, query["aggs"])
+        hits = hits[offset:]
+        if "scroll" in params:
+            scroll_id = str(self._nb_scrolls)
+            self._nb_scrolls += 1
+            if params.get("search_type") == "scan":
+                response["hits"]["hits"] = []
+            else:
+                hits = hits[size:]
+            self._scrolls[scroll_id] = (hits, size, total)
+            response["_scroll_id"] = scroll_id
+        return 200, response
+
+    def _scroll(self, method, params, body):
+        """ Get the next page of a scrolled search, or clear it.
+        """
+        scroll_ids = [params.get("scroll_id", body)]
+        if body.startswith("{"):
+            scroll_ids = json.loads(body)["scroll_id"]
+            if not isinstance(scroll_ids, list):
+                scroll_ids = [scroll_ids]
+        if method == "DELETE":
+            for scroll_id in scroll_ids:
+                self._scrolls.pop(scroll_id, None)
+            return 200, {"succeeded": True}
+        if scroll_ids[0] not in self._scrolls:
+            return 404, {"error": {"type": "search_context_missing_exception"},
+                         "status": 404}
+        hits, size, total = self._scrolls[scroll_ids[0]]
+        self._scrolls[scroll_ids[0]] = (hits[size:], size, total)
+        return 200, {"_scroll_id": scroll_ids[0], "took": 1,
+                     "timed_out": False,
+                     "_shards": {"total": 1, "successful": 1, "failed": 0},
+                     "hits": {"total": total, "max_score": 1.0,
+                              "hits": hits[:size]}}
+
+    def _match(self, query, source, mapping):
+        """ Check if a document matches a query. The strings that are not
+        mapped as not analyzed values are split in lowercase words, as the
+        ES standard analyzer does, and the other values are compared as
+        terms.
+        """
+        if query is None or "match_all" in query:
+            return True
+        if "term" in query:
+            field, value = next(iter(query["term"].items()))
+            if isinstance(value, dict):
+                value = value["value"]
+            if field not in source:
+                return False
+            if (isinstance(source[field], basestring) and
+                    self._analyzed(field, mapping)):
+                return value in re.findall(r"\w+", source[field].lower())
+            return self._term(source[field]) == self._term(value)
+        if "bool" in query:
+            clauses = []
+            for name in ("must", "filter"):
+                clause = query["bool"].get(name, [])
+                clauses.extend(
+                    clause if isinstance(clause, list) else [clause])
+            return all(self._match(clause, source, mapping)
+                       for clause in clauses)
+        raise ValueError("Unsupported '{0}' query.".format(query))
+
+    def _term(self, value):
+        """ Get the indexed term of a value: as ES does, the term filter
+        value is converted to the field type, eg. 1 matches '1'.
+        """
+        if isinstance(value, basestring):
+            return value
+        return json.dumps(value)
+
+    def _analyzed(self, field, mapping):
+        """ Check if a string field is analyzed.
+        """
+        properties = mapping.get("properties", {})
+        if field in properties:
+            return properties[field].get("index") != "not_analyzed"
+        for template in mapping.get("dynamic_templates", []):
+            for params in template.values():
+                if (params.get("match_mapping_type") == "string" and
+                        params["mapping"].get("index") == "not_analyzed"):
+                    return False
+        return True
+
+    def _sort(self, hits, clauses):
+        """ Sort hits inplace.
+        """
+        for clause in reversed(clauses):
+            if isinstance(clause, dict):
+                field, order = next(iter(clause.items()))
+                if isinstance(order, dict):
+                    order = order.get("order", "asc")
+            else:
+                field, order = clause, "asc"
+            hits.sort(key=lambda hit: (field in hit["_source"],
+                                       hit["_source"].get(field)),
+                      reverse=(order == "desc"))
+
+    def _aggregate(self, hits, aggs):
+        """ Compute the aggregations of hits.
+        """
+        results = {}
+        for name, agg in aggs.items():
+            if "terms" in agg:
+                field = agg["terms"]["field"]
+                buckets = OrderedDict()
+                for hit in hits:
+                    key = hit.get(field, hit["_source"].get(field))
+                    if key is not None:
+                        buckets.setdefault(key, []).append(hit)
+                results[name] = {"buckets": []}
+                for key, bucket_hits in buckets.items():
+                    bucket = {"key": key, "doc_count": len(bucket_hits)}
+                    bucket.update(
+                        self._aggregate(bucket_hits, agg.get("aggs", {})))
+                    results[name]["buckets"].append(bucket)
+            elif "top_hits" in agg:
+                top_hits = [dict(hit) for hit in hits]
+                self._sort(top_hits, agg["top_hits"].get("sort", []))
+                includes = agg["top_hits"].get("_source", {}).get("include")
+                for hit in top_hits:
+                    if includes is not None:
+                        hit["_source"] = dict(
+                            (key, value)
+                            for key, value in hit["_source"].items()
+                            if key in includes)
+                results[name] = {"hits": {
+                    "total": len(hits), "max_score": 1.0,
+                    "hits": top_hits[:agg["top_hits"].get("size", 3)]}}
+            else:
+                raise ValueError("Unsupported '{0}' aggregation.".format(agg))
+        return results
+
+    def _bulk(self, body):
+        """ Index documents.
+        """
+        lines = [line for line in body.split("\n") if line.strip()]
+        items = []
+        for action_line, source_line in zip(lines[::2], lines[1::2]):
+            op_type, action = json.loads(action_line).popitem()
+            source = json.loads(source_line)
+            item = {"_index": action["_index"], "_type": action["_type"],
+                    "_id": action["_id"]}
+            if action["_id"] in self.rejected_ids:
+                item["status"] = 400
+                item["error"] = {"type": "mapper_parsing_exception",
+                                 "reason": "rejected document"}
+            else:
+                docs = self.documents.setdefault(
+                    action["_index"], OrderedDict()).setdefault(
+                        action["_type"], OrderedDict())
+                item["created"] = action["_id"] not in docs
+                item["status"] = 201 if item["created"] else 200
+                docs[action["_id"]] = source
+            items.append({op_type: item})
+        errors = any("error" in item for elem in items
+                     for item in elem.values())
+        return {"took": 1, "errors": errors, "items": items}
+
+
+class AsyncElasticsearchStub(object):
+    """ An asynchronous ES client sending the requests of a synchronous ES
+    client in the loop default executor.
+
+    Attributes
+    ----------
+    `indices`: object
+        the asynchronous indices client.
+    `max_pending`: int
+        the maximum number of requests pending at the same time.
+    """
+    def __init__(self, client):
+        """ Initialize the 'AsyncElasticsearchStub' class.
+
+        Parameters
+        ----------
+        client: Elasticsearch (mandatory)
+            the synchronous ES client.
+        """
+        self.max_pending = 0
+        self._client = client
+        self._nb_pending = 0
+        self._lock = threading.Lock()
+        self.indices = _AsyncNamespace(self, client.indices)
+
+    def __getattr__(self, name):
+        return self._wrap(getattr(self._client, name))
+
+    def _wrap(self, method):
+        """ Get the asynchronous version of a synchronous client method.
+        """
+        def wrapper(*args, **kwargs):
+            import asyncio
+            return asyncio.get_event_loop().run_in_executor(
+                None, functools.partial(self._call, method, args, kwargs))
+        return wrapper
+
+    def _call(self, method, args, kwargs):
+        """ Send a request and count the pending requests.
+        """
+        with self._lock:
+            self._nb_pending += 1
+            self.max_pending = max(self.max_pending, self._nb_pending)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._nb_pending -= 1
+
+
+class _AsyncNamespace(object):
+    """ An asynchronous version of a synchronous client namespace.
+    """
+    def __init__(self, stub, namespace):
+        self._stub = stub
+        self._namespace = namespace
+
+    def __getattr__(self, name):
+        return self._stub._wrap(getattr(self._namespace, name))
+
+
+class _StubServer(ThreadingMixIn, HTTPServer):
+    """ A multithreaded HTTP server.
+    """
+    daemon_threads = True
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """ Forward the requests to the stub.
+    """
+    protocol_version = "HTTP/1.1"
+    # The headers and the content are written separately: send them without
+    # waiting for the client acknowledgements
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.stub._lock:
+            self.server.stub.nb_connections += 1
+
+    def do_request(self):
+        url = urlparse(self.path)
+        params = dict((key, values[-1])
+                      for key, values in parse_qs(url.query).items())
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        status, response = self.server.stub.handle(
+            self.command, url.path, params, body)
+        content = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_request
+
+    def log_message(self, format, *args):
+        pass
@@ -10,7 +10,14 @@
 import unittest
 import os
 import sys
+import bz2
+import gzip
+import shutil
+import locale
+import json
+import pickle
 import tempfile
+import functools
 from collections import OrderedDict
 # COMPATIBILITY: since python 3.3 mock is included in unittest module
 python_version = sys.version_info
@@ -22,10 +29,19 @@ else:
 # Pylogparser import
 import pylogparser
 from pylogparser import LogParser
+from pylogparser import ParserProfile
+from pylogparser import ParseCache
+from pylogparser import ColumnarStore
+from pylogparser import TimestampNormalizer
+from pylogparser import ParseStats
+from pylogparser import SQLiteBackend
 from pylogparser import dump_log_es
 from pylogparser import load_log_es
+from pylogparser import iter_log_es
 from pylogparser import tree
 from pylogparser import match
+from pylogparser import LogStore
+from pylogparser.testing import ElasticsearchStub
 
 
 class LogParserTests(unittest.TestCase):
@@ -85,6 +101,695 @@ class LogParserTests(unittest.TestCase):
                 jobs_alias="project1_freesurfer")
         self.assertEqual(sorted(parser.data.keys()), ["project1_freesurfer"])
 
+    def test_logfile_engines(self):
+        """ Test the logfile parser matching engines give the same data.
+        """
+        parser = LogParser()
+        engine_data = {}
+        for engine in ("loop", "combined"):
+            parser.data.clear()
+            for basename in ("fsreconall_1.txt", "fsreconall_2.txt"):
+                logfile = os.path.join(self.demodir, basename)
+                parser.parse_logfile(
+                    logfile=logfile,
+                    job_pattern="job_\d+",
+                    timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                    custom_patterns={
+                        "code_in_study": {
+                            "regex": "subjectid = \d{4}",
+                            "splitter": (" = ", 1)
+                        },
+                        "exitcode": {
+                            "regex": "exitcode = \d",
+                            "splitter": (" = ", 1)
+                        },
+                        "hostname": {
+                            "regex": "hostname = .*",
+                            "splitter": (" = ", 1)
+                        }
+                    },
+                    engine=engine)
+            engine_data[engine] = dict(parser.data)
+        self.assertEqual(engine_data["loop"], engine_data["combined"])
+        self.assertEqual(
+            engine_data["combined"]["job_3"]["2015-11-10T01:38"]["exitcode"],
+            "1")
+        with self.assertRaises(ValueError):
+            parser.parse_logfile(
+                logfile=os.path.join(self.demodir, "fsreconall_1.txt"),
+                job_pattern="job_\d+",
+                timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                custom_patterns={
+                    "cmd": {"regex": "cmd = "},
+                    "freesurfer": {"regex": "freesurfer'"}
+                })
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(tmpdir, "overlap.txt")
+        with open(logfile, "wt") as open_file:
+            open_file.write("job_1 2016-01-01T10:00 cmd = run exitcode = 1\n")
+        for custom_patterns in (
+                {"cmd": {"regex": "cmd = .*"},
+                 "exitcode": {"regex": "exitcode = \d"}},
+                {"exitcode": {"regex": "exitcode = \d"},
+                 "code": {"regex": "code = \d"}}):
+            for engine in ("loop", "combined"):
+                for memory_map in (False, True):
+                    with self.assertRaises(ValueError):
+                        list(LogParser.iter_logfile(
+                            logfile, "job_\d+",
+                            "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                            custom_patterns, engine=engine,
+                            memory_map=memory_map))
+        with open(logfile, "wt") as open_file:
+            open_file.write("job_1 2016-01-01T10:00 exitcode = 1\n"
+                            "2016-01-01T10:00 job_1 job_2 banner\n"
+                            "job_2 2016-01-01T10:00 exitcode = 0\n")
+        for custom_patterns in (
+                {"exitcode": {"regex": "exitcode = \d"}},
+                {"exitcode": {"regex": "exitcode = (\d)()"}}):
+            for engine in ("loop", "combined"):
+                for memory_map in (False, True):
+                    with self.assertRaises(ValueError):
+                        list(LogParser.iter_logfile(
+                            logfile, "job_\d+",
+                            "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                            custom_patterns, engine=engine,
+                            memory_map=memory_map))
+                    matches = LogParser.iter_logfile(
+                        logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                        custom_patterns, engine=engine, prefilter=True,
+                        memory_map=memory_map)
+                    self.assertEqual(len(list(matches)), 2)
+        shutil.rmtree(tmpdir)
+
+    def test_logfile_prefilter(self):
+        """ Test the logfile parser literal prefilter.
+        """
+        logfile = os.path.join(self.demodir, "fsreconall_1.txt")
+        custom_patterns = {
+            "code_in_study": {
+                "regex": "subjectid = \d{4}",
+                "splitter": (" = ", 1)
+            },
+            "exitcode": {
+                "regex": "exitcode = \d",
+                "splitter": (" = ", 1)
+            }
+        }
+        self.assertEqual(
+            LogParser._compile_patterns(
+                "job_\d+", "\d{4}", custom_patterns, "loop", True)[-1],
+            ("exitcode = ", "subjectid = "))
+        for engine in ("loop", "combined"):
+            matches = LogParser.iter_logfile(
+                logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                custom_patterns, engine=engine, prefilter=True)
+            self.assertEqual(len(list(matches)), 6)
+        custom_patterns["exitcode"]["literal"] = "dummy"
+        matches = LogParser.iter_logfile(
+            logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            custom_patterns, prefilter=True)
+        self.assertEqual(len(list(matches)), 3)
+
+    def test_logfile_workers(self):
+        """ Test the logfile parser with a pool of processes.
+        """
+        logfile = os.path.join(self.demodir, "fsreconall_1.txt")
+        custom_patterns = {
+            "code_in_study": {
+                "regex": "subjectid = \d{4}",
+                "splitter": (" = ", 1)
+            },
+            "hostname": {
+                "regex": "hostname = .*",
+                "splitter": (" = ", 1)
+            }
+        }
+        args = (logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                custom_patterns)
+        self.assertEqual(len(LogParser._chunk_logfile(logfile, 4)), 4)
+        self.assertEqual(LogParser._parse_logfile(*args),
+                         LogParser._parse_logfile(*args, workers=4))
+        custom_patterns["cmd"] = {"regex": "'-s'"}
+        custom_patterns["freesurfer"] = {"regex": "'-c'"}
+        messages = []
+        for workers in (1, 4):
+            try:
+                LogParser._parse_logfile(*args, workers=workers)
+            except ValueError as error:
+                messages.append(str(error))
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0], messages[1])
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(tmpdir, "form_feed.txt")
+        with open(logfile, "wb") as open_file:
+            for cnt in range(8):
+                open_file.write(
+                    "201{0} job_{0} \x0c x = {0}\r\n".format(cnt).encode())
+        args = (logfile, "job_\d+", "\d{4}", {"x": {"regex": "x = \d"}})
+        records = LogParser._parse_logfile(*args)
+        self.assertEqual(len(records), 8)
+        for workers in (1, 2):
+            for memory_map in (False, True):
+                self.assertEqual(
+                    LogParser._parse_logfile(*args, workers=workers,
+                                             memory_map=memory_map),
+                    records)
+        parser = LogParser.isolated()
+        parser.parse_logfile(*args, workers=2,
+                             checkpoint=os.path.join(tmpdir, "checkpoint"))
+        self.assertEqual(parser.data, LogParser._get_struct(records))
+        shutil.rmtree(tmpdir)
+
+    def test_logfile_checkpoint(self):
+        """ Test the logfile parser incremental mode.
+        """
+        parser = LogParser()
+        parser.data.clear()
+        with open(os.path.join(self.demodir, "fsreconall_1.txt"),
+                  "rt") as open_file:
+            lines = open_file.readlines()
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(tmpdir, "fsreconall.txt")
+        checkpoint = os.path.join(tmpdir, "checkpoint.json")
+        kwargs = {
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "cmd": {"regex": "cmd = .*", "splitter": (" = ", 1)},
+                "exitcode": {"regex": "exitcode = \d", "splitter": (" = ", 1)}
+            },
+            "checkpoint": checkpoint
+        }
+        with open(logfile, "wt") as open_file:
+            open_file.writelines(lines[:9])
+            open_file.write(lines[9][:20])
+        new_data = parser.parse_logfile(logfile, **kwargs)
+        self.assertEqual(new_data, [(("job_1", "2015-11-10T01:33"),
+                                     {"cmd": new_data[0][1]["cmd"]})])
+        self.assertNotIn("exitcode",
+                         parser.data["job_1"]["2015-11-10T01:33"])
+        with open(logfile, "at") as open_file:
+            open_file.write(lines[9][20:])
+            open_file.writelines(lines[10:])
+        new_data = parser.parse_logfile(logfile, **kwargs)
+        self.assertEqual(sorted(set(path[0] for path, record in new_data)),
+                         ["job_1", "job_2", "job_3"])
+        self.assertEqual(
+            parser.data["job_1"]["2015-11-10T01:33"]["exitcode"], "0")
+        new_data = {}
+        parser.follow_logfile(logfile, timeout=0, callback=new_data.update,
+                              **kwargs)
+        self.assertEqual(new_data, {})
+        profile = ParserProfile(
+            kwargs["job_pattern"], kwargs["timestamp_pattern"],
+            kwargs["custom_patterns"], engine="loop")
+        with open(logfile, "at") as open_file:
+            open_file.write(lines[10].replace("job_1", "job_4"))
+        parser.follow_logfile(logfile, checkpoint=checkpoint, profile=profile,
+                              memory_map=True, timeout=0,
+                              callback=new_data.update)
+        self.assertEqual(sorted(new_data.keys()), ["job_4"])
+        self.assertRaises(ValueError, parser.follow_logfile, logfile,
+                          profile=profile, timeout=0)
+        self.assertEqual(
+            parser.data,
+            LogParser._get_struct(LogParser._parse_logfile(
+                logfile, kwargs["job_pattern"], kwargs["timestamp_pattern"],
+                kwargs["custom_patterns"])))
+        os.remove(logfile)
+        with open(logfile, "wt") as open_file:
+            open_file.writelines(lines[:9])
+        self.assertRaises(ValueError, parser.parse_logfile, logfile, **kwargs)
+        import threading
+        threads = [
+            threading.Thread(
+                target=LogParser.isolated()._write_checkpoint,
+                args=(checkpoint, "log_{0}.txt".format(cnt), cnt,
+                      {"inode": cnt, "size": cnt}))
+            for cnt in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(checkpoint, "rt") as open_file:
+            offsets = json.load(open_file)
+        self.assertTrue(all(
+            offsets[os.path.abspath("log_{0}.txt".format(cnt))]["offset"] ==
+            cnt for cnt in range(8)))
+        self.assertEqual(
+            [path for path in os.listdir(tmpdir) if path.endswith(".tmp")],
+            [])
+        shutil.rmtree(tmpdir)
+
+    def test_logfile_cache(self):
+        """ Test the logfile parser on-disk cache.
+        """
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(tmpdir, "fsreconall.txt")
+        shutil.copy(os.path.join(self.demodir, "fsreconall_1.txt"), logfile)
+        cache = ParseCache(os.path.join(tmpdir, "cache"))
+        kwargs = {
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "cmd": {"regex": "cmd = .*", "splitter": (" = ", 1)}
+            },
+            "cache": cache
+        }
+        parsing = LogParser._parse_logfile(logfile, **kwargs)
+        with mock.patch.object(LogParser, "_parse") as mock_parse:
+            mock_parse.return_value = []
+            self.assertEqual(LogParser._parse_logfile(logfile, **kwargs),
+                             parsing)
+            self.assertEqual(len(mock_parse.call_args_list), 0)
+            with open(logfile, "at") as open_file:
+                open_file.write("\n")
+            LogParser._parse_logfile(logfile, **kwargs)
+            self.assertEqual(len(mock_parse.call_args_list), 1)
+        self.assertEqual(LogParser._parse_logfile(logfile, **kwargs), [])
+        cache.invalidate(logfile)
+        self.assertEqual(os.listdir(cache.cachedir), [])
+        self.assertEqual(LogParser._parse_logfile(logfile, **kwargs),
+                         parsing)
+        cache.max_size = 0
+        cache.invalidate()
+        LogParser._parse_logfile(logfile, **kwargs)
+        self.assertEqual(os.listdir(cache.cachedir), [])
+        shutil.rmtree(tmpdir)
+
+    def test_logfile_profile(self):
+        """ Test the logfile parser with a precompiled profile.
+        """
+        logfile = os.path.join(self.demodir, "fsreconall_1.txt")
+        kwargs = {
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "cmd": {"regex": "cmd = .*", "splitter": (" = ", 1)},
+                "exitcode": {"regex": "exitcode = \d", "splitter": (" = ", 1)}
+            },
+            "jobs_alias": "project1_freesurfer"
+        }
+        profile = pickle.loads(pickle.dumps(ParserProfile(**kwargs)))
+        parsing = LogParser._parse_logfile(logfile, **kwargs)
+        with mock.patch.object(LogParser, "_compile_patterns") as mock_cmp:
+            self.assertEqual(
+                LogParser._parse_logfile(logfile, profile=profile), parsing)
+            self.assertEqual(
+                LogParser._parse_logfile(logfile, profile=profile,
+                                         workers=2), parsing)
+            new_parsing = LogParser._parse_logfile(
+                logfile, profile=profile, jobs_alias="project2_freesurfer")
+            self.assertEqual(len(mock_cmp.call_args_list), 0)
+        self.assertEqual(set(path[0] for path, record in new_parsing),
+                         set(["project2_freesurfer"]))
+        self.assertEqual(profile.jobs_alias, "project1_freesurfer")
+        for engine in ("loop", "combined"):
+            engine_profile = LogParser._get_profile(
+                ParserProfile(engine="combined", **kwargs), engine=engine)
+            self.assertEqual(engine_profile.engine, engine)
+            self.assertEqual(engine_profile.patterns[3] is None,
+                             engine == "loop")
+        self.assertRaises(ValueError, ParserProfile, job_pattern="job_\d+")
+        self.assertRaises(ValueError, LogParser._parse_logfile, logfile,
+                          profile=ParserProfile(job_name="job"))
+
+    def test_logfile_compressed(self):
+        """ Test the logfile and logdir parsers on compressed files.
+        """
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(self.demodir, "fsreconall_1.txt")
+        profile = ParserProfile(
+            job_pattern="job_\d+",
+            timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            custom_patterns={
+                "cmd": {"regex": "cmd = .*", "splitter": (" = ", 1)}
+            })
+        parsing = LogParser._parse_logfile(logfile, profile=profile)
+        for ext, opener in ((".gz", gzip.GzipFile), (".bz2", bz2.BZ2File)):
+            path = os.path.join(tmpdir, "fsreconall" + ext)
+            with open(logfile, "rb") as in_file:
+                with opener(path, "wb") as out_file:
+                    shutil.copyfileobj(in_file, out_file)
+            for workers in (1, 2):
+                self.assertEqual(
+                    LogParser._parse_logfile(path, profile=profile,
+                                             workers=workers), parsing)
+            self.assertRaises(
+                ValueError, LogParser.parse_logfile, path, profile=profile,
+                checkpoint=os.path.join(tmpdir, "checkpoint.json"))
+        dirfiles = {}
+        for name in ("runtime", "inputs", "outputs"):
+            path = os.path.join(self.demodir, "dtifit_0001", name + ".json")
+            gzpath = os.path.join(tmpdir, name + ".json.gz")
+            with open(path, "rb") as in_file:
+                with gzip.GzipFile(gzpath, "wb") as out_file:
+                    shutil.copyfileobj(in_file, out_file)
+            dirfiles[path] = (name == "runtime")
+        kwargs = {"job_name": "project1_dtifit", "timestamp_key": "timestamp"}
+        parsing = LogParser._parse_logdir(dirfiles, **kwargs)
+        self.assertEqual(LogParser._parse_logdir(dict(
+            (os.path.join(tmpdir, os.path.basename(path) + ".gz"), flatten)
+            for path, flatten in dirfiles.items()), **kwargs), parsing)
+        shutil.rmtree(tmpdir)
+
+    def test_logfile_memory_map(self):
+        """ Test the logfile parser memory map mode.
+        """
+        tmpdir = tempfile.mkdtemp()
+        logfile = os.path.join(tmpdir, "fsreconall.txt")
+        with open(os.path.join(self.demodir, "fsreconall_1.txt"),
+                  "rb") as open_file:
+            lines = open_file.readlines()
+        lines[10] = lines[10].replace(b"INFO", u"INF\u00d8".encode(
+            locale.getpreferredencoding(False)))
+        with open(logfile, "wb") as open_file:
+            open_file.writelines(lines)
+        kwargs = {
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "cmd": {"regex": "cmd = .*", "splitter": (" = ", 1)},
+                "exitcode": {"regex": "exitcode = \d", "splitter": (" = ", 1)}
+            }
+        }
+        for engine in ("combined", "loop"):
+            profile = ParserProfile(engine=engine, **kwargs)
+            matches = list(LogParser.iter_logfile(logfile, profile=profile))
+            self.assertEqual(
+                list(LogParser.iter_logfile(logfile, profile=profile,
+                                            memory_map=True)), matches)
+            for workers in (1, 2):
+                self.assertEqual(
+                    LogParser._parse_logfile(logfile, profile=profile,
+                                             workers=workers,
+                                             memory_map=True),
+                    LogParser._parse_logfile(logfile, profile=profile))
+        crlf_logfile = os.path.join(tmpdir, "fsreconall_crlf.txt")
+        with open(crlf_logfile, "wb") as open_file:
+            open_file.writelines(
+                [line.replace(b"\n", b"\r\n") for line in lines])
+        crlf_kwargs = dict(kwargs)
+        crlf_kwargs["custom_patterns"] = {
+            "hostname": {"regex": "hostname = \w+$", "splitter": (" = ", 1)},
+            "exitcode": {"regex": "exitcode = \d$", "splitter": (" = ", 1)}}
+        parsing = LogParser._parse_logfile(crlf_logfile, **crlf_kwargs)
+        self.assertEqual(len(parsing), 3)
+        for workers in (1, 2):
+            self.assertEqual(
+                LogParser._parse_logfile(crlf_logfile, workers=workers,
+                                         memory_map=True, **crlf_kwargs),
+                parsing)
+        with open(logfile, "ab") as open_file:
+            open_file.write(lines[11].replace(b"hostname = ",
+                                              b"exitcode = 1 cmd = "))
+        errors = []
+        for memory_map in (False, True):
+            try:
+                list(LogParser.iter_logfile(logfile, memory_map=memory_map,
+                                            **kwargs))
+            except ValueError as error:
+                errors.append(str(error))
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0], errors[1])
+        shutil.rmtree(tmpdir)
+
+    def test_query_range(self):
+        """ Test the timestamp range queries.
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            logfile = os.path.join(tmpdir, "log.txt")
+            with open(logfile, "wt") as open_file:
+                for index, date in enumerate(("2015-11-10T10:00",
+                                              "2015-11-09T10:00",
+                                              "2015-11-11T10:00")):
+                    open_file.write(
+                        "{0} - job_{1}.cmd = run\n".format(date, index))
+            LogParser.clear()
+            LogParser.parse_logfile(
+                logfile=logfile,
+                job_pattern="job_\d+",
+                timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                custom_patterns={
+                    "cmd": {
+                        "regex": "cmd = .*",
+                        "splitter": (" = ", 1)
+                    }
+                })
+            records = LogParser.query_range("2015-11-09T12:00")
+            self.assertEqual(
+                [keys for keys, record in records],
+                [("job_0", "2015-11-10T10:00"), ("job_2", "2015-11-11T10:00")])
+            self.assertEqual(records[0][1], {"cmd": "run"})
+            records = LogParser.query_range(
+                end="2015-11-11T10:00", project="job_1")
+            self.assertEqual([keys for keys, record in records],
+                             [("job_1", "2015-11-09T10:00")])
+            self.assertEqual(LogParser.query_range(project="unknown"), [])
+            LogParser.data.clear()
+            self.assertEqual(LogParser.query_range(), [])
+            for cnt in range(2):
+                LogParser.parse_logfile(
+                    logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                    {"cmd": {"regex": "cmd = .*"}})
+                LogParser.data = {}
+            LogParser.parse_logfile(
+                logfile, "job_\d+", "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                {"cmd": {"regex": "cmd = .*"}})
+            self.assertEqual(LogParser._timestamps["job_1"],
+                             [("2015-11-09T10:00",
+                               ("job_1", "2015-11-09T10:00"))])
+        finally:
+            LogParser.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_isolated_parsers(self):
+        """ Test the independent parsers and the concurrent merges.
+        """
+        import threading
+        tmpdir = tempfile.mkdtemp()
+        try:
+            logfiles = []
+            for cnt in range(8):
+                logfile = os.path.join(tmpdir, "log{0}.txt".format(cnt))
+                with open(logfile, "wt") as open_file:
+                    for index in range(50):
+                        open_file.write(
+                            "2015-11-10T10:{0:02d} - job_{1}.exitcode = "
+                            "{2}\n".format(index, cnt * 50 + index, cnt % 2))
+                logfiles.append(logfile)
+            kwargs = {
+                "job_pattern": "job_\d+",
+                "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                "custom_patterns": {
+                    "exitcode": {
+                        "regex": "exitcode = \d",
+                        "splitter": (" = ", 1)
+                    }
+                }
+            }
+            LogParser.clear()
+
+            # Parse concurrently in a shared independent parser
+            shared = LogParser.isolated()
+            shared.create_index("exitcode")
+            threads = [
+                threading.Thread(target=shared.parse_logfile,
+                                 args=(logfile, ), kwargs=kwargs)
+                for logfile in logfiles]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(shared.data), 400)
+            self.assertEqual(len(shared.query_range()), 400)
+            self.assertEqual(len(shared.lookup("exitcode", "1")), 200)
+            self.assertEqual(LogParser.data, {})
+            self.assertEqual(LogParser._indexes, {})
+
+            # Merge the datasets of independent parsers
+            parsers = [LogParser.isolated(), LogParser.isolated()]
+            for parser, logfile in zip(parsers, logfiles):
+                parser.parse_logfile(logfile, **kwargs)
+            self.assertEqual(len(parsers[0].data), 50)
+            self.assertNotEqual(parsers[0].data, parsers[1].data)
+            for parser in parsers:
+                LogParser.merge(parser.data)
+            self.assertEqual(len(LogParser.data), 100)
+            self.assertEqual(len(LogParser.query_range()), 100)
+            self.assertRaises(ValueError, LogParser.merge, parsers[0].data)
+            self.assertIs(LogParser(), LogParser())
+            self.assertIsNot(LogParser.isolated(), LogParser())
+        finally:
+            LogParser.clear()
+            shutil.rmtree(tmpdir)
+
+    def test_lookup(self):
+        """ Test the fields hash indexes.
+        """
+        LogParser.clear()
+        LogParser.create_index("exitcode")
+        try:
+            for basename in ("fsreconall_1.txt", "fsreconall_2.txt"):
+                LogParser.parse_logfile(
+                    logfile=os.path.join(self.demodir, basename),
+                    job_pattern="job_\d+",
+                    timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                    custom_patterns={
+                        "exitcode": {
+                            "regex": "exitcode = \d",
+                            "splitter": (" = ", 1)
+                        },
+                        "hostname": {
+                            "regex": "hostname = .*",
+                            "splitter": (" = ", 1)
+                        }
+                    })
+            records = LogParser.lookup("exitcode", "1")
+            self.assertEqual([keys for keys, record in records],
+                             [("job_3", "2015-11-10T01:38")])
+            self.assertEqual(len(LogParser.lookup("exitcode")), 4)
+            self.assertEqual(
+                len(LogParser.lookup("exitcode", "0", project="job_1")), 2)
+            self.assertRaises(ValueError, LogParser.lookup, "hostname")
+            LogParser.create_index("hostname")
+            self.assertEqual(len(LogParser.lookup("hostname", "host.domain")),
+                             4)
+            LogParser.data.clear()
+            self.assertEqual(LogParser.lookup("exitcode", "1"), [])
+        finally:
+            LogParser.drop_index("exitcode")
+            LogParser.drop_index("hostname")
+            LogParser.clear()
+        parser = LogParser.isolated()
+        dirname = os.path.join(self.demodir, "dtifit_0001")
+        parser.parse_logdir(
+            logfiles=OrderedDict([
+                (os.path.join(dirname, "inputs.json"), False),
+                (os.path.join(dirname, "runtime.json"), True),
+                (os.path.join(dirname, "outputs.json"), False)]),
+            job_name="project1_dtifit", timestamp_key="timestamp",
+            hierarchy={"job_name": {"subjectid": {"timestamp": {
+                "custom_data": None}}}},
+            extract_keys=["subjectid"])
+        parser.create_index("tool")
+        self.assertEqual(len(parser.lookup("tool", "pyconnectomist_dtifit")),
+                         1)
+
+    def test_timestamp_normalizer(self):
+        """ Test the timestamps normalization.
+        """
+        normalizer = TimestampNormalizer(cache_size=2)
+        for timestamp, expected in (
+                ("2015-11-09T14:59", "2015-11-09T14:59:00"),
+                ("2015-11-09T15:00", "2015-11-09T15:00:00"),
+                ("2015-11-09 14:59:22.5", "2015-11-09T14:59:22.500000"),
+                ("Nov 9 2015 14:59", "2015-11-09T14:59:00")):
+            self.assertEqual(normalizer.normalize(timestamp, "key"), expected)
+        self.assertEqual(len(normalizer._cache), 2)
+        self.assertRaises(ValueError, normalizer.normalize, "2015-13-09")
+        self.assertRaises(ValueError, TimestampNormalizer, ["%d/%m/%Y"])
+        LogParser.clear()
+        try:
+            LogParser.parse_logfile(
+                logfile=os.path.join(self.demodir, "fsreconall_1.txt"),
+                job_pattern="job_\d+",
+                timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+                custom_patterns={
+                    "exitcode": {
+                        "regex": "exitcode = \d",
+                        "splitter": (" = ", 1)
+                    }
+                },
+                normalize_timestamps=True)
+            self.assertEqual(sorted(LogParser.data["job_3"].keys()),
+                             ["2015-11-10T01:38:00"])
+        finally:
+            LogParser.clear()
+
+    def test_parse_stats(self):
+        """ Test the parsing instrumentation.
+        """
+        logfile = os.path.join(self.demodir, "fsreconall_1.txt")
+        kwargs = {
+            "logfile": logfile,
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "exitcode": {
+                    "regex": "exitcode = \d",
+                    "splitter": (" = ", 1)
+                },
+                "hostname": {
+                    "regex": "hostname = .*",
+                    "splitter": (" = ", 1)
+                }
+            }
+        }
+        with open(logfile, "rt") as open_file:
+            rows = open_file.readlines()
+        expected = {
+            "lines_scanned": len(rows),
+            "lines_matched": {
+                "exitcode": len([row for row in rows if "exitcode =" in row]),
+                "hostname": len([row for row in rows if "hostname =" in row])
+            },
+            "bytes_read": os.path.getsize(logfile),
+            "records": 3
+        }
+        reports = []
+        for options in ({}, {"memory_map": True}, {"workers": 2}):
+            events = []
+            LogParser.clear()
+            LogParser.stats = ParseStats(
+                callback=lambda *args: events.append(args[:2]))
+            try:
+                LogParser.parse_logfile(**dict(kwargs, **options))
+                report = LogParser.stats.report()
+            finally:
+                LogParser.stats = None
+                LogParser.clear()
+            reports.append(report)
+            self.assertEqual(
+                dict((key, report[key]) for key in expected), expected)
+            self.assertEqual(
+                sorted(stage for stage, duration in events),
+                ["index", "match", "merge", "organize"] +
+                (["read"] if not options else []))
+            self.assertAlmostEqual(
+                sum(report["timings"].values()),
+                sum(duration for _, duration in events))
+            self.assertGreater(report["throughput"]["records"], 0)
+        self.assertGreater(reports[0]["throughput"]["lines"], 0)
+        self.assertEqual(ParseStats().throughput(),
+                         {"lines": 0., "records": 0.})
+
+    def test_iter_logfile(self):
+        """ Test the logfile streaming parser.
+        """
+        matches = LogParser.iter_logfile(
+            logfile=os.path.join(self.demodir, "fsreconall_1.txt"),
+            job_pattern="job_\d+",
+            timestamp_pattern="\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            custom_patterns={
+                "code_in_study": {
+                    "regex": "subjectid = \d{4}",
+                    "splitter": (" = ", 1)
+                },
+                "exitcode": {
+                    "regex": "exitcode = \d",
+                    "splitter": (" = ", 1)
+                }
+            })
+        self.assertEqual(
+            next(matches),
+            ("job_1", "2015-11-10T01:33", "code_in_study", "0001"))
+        self.assertEqual(len(list(matches)), 5)
+        self.assertRaises(ValueError, LogParser.iter_logfile, "dummy",
+                          "job_\d+", "\d{4}", {})
+
     def test_logdir(self):
         """ Test the logdir parser.
         """
@@ -124,9 +829,135 @@ class LogParserTests(unittest.TestCase):
         with open(modify_descfile, "wt") as open_file:
             open_file.write(jbuffer)
         LogParser.load(modify_descfile, verbose=0)
-        os.remove(modify_descfile)
         self.assertEqual(sorted(parser.data.keys()),
                          ["project2_dtifit", "project2_freesurfer"])
+        with open(modify_descfile, "wt") as open_file:
+            open_file.write(jbuffer.replace('"profile": "dtifit"',
+                                            '"profile": "unknown"'))
+        self.assertRaises(ValueError, LogParser.load, modify_descfile)
+        os.remove(modify_descfile)
+
+    def test_load_workers(self):
+        """ Test the load method with a pool of processes.
+        """
+        parser = LogParser()
+        descfile = os.path.join(self.demodir, "pylogparser_demo.json")
+        modify_descfile = tempfile.NamedTemporaryFile(suffix=".json").name
+        with open(descfile, "rt") as open_file:
+            jbuffer = open_file.read().replace("DEMODIR", self.demodir)
+        with open(modify_descfile, "wt") as open_file:
+            open_file.write(jbuffer)
+        workers_data = []
+        for workers in (1, 2):
+            parser.data.clear()
+            LogParser.load(modify_descfile, verbose=0, workers=workers)
+            workers_data.append(dict(parser.data))
+        self.assertEqual(workers_data[0], workers_data[1])
+        self.assertRaises(ValueError, LogParser.load, modify_descfile,
+                          workers=2)
+        os.remove(modify_descfile)
+
+    def test_merge_records(self):
+        """ Test the flat records merge.
+        """
+        records = [
+            (("job_1", "2015-11-10T01:33"), {"cmd": "a"}),
+            (("job_1", "2015-11-10T02:33"), {"cmd": "b"}),
+            (("job_2", "2015-11-10T01:33"), {"cmd": "c"})]
+        for store in ({}, ColumnarStore()):
+            LogParser._merge_records(store, [])
+            if isinstance(store, ColumnarStore):
+                merge = store.merge
+                store.merge([])
+            else:
+                merge = functools.partial(LogParser._merge_records, store)
+            self.assertEqual(len(store), 0)
+            merge(records)
+            self.assertEqual(dict(store["job_1"]["2015-11-10T02:33"]),
+                             {"cmd": "b"})
+            self.assertRaises(ValueError, merge, records[:1])
+            self.assertRaises(ValueError, merge, records[:1], update=True)
+            merge([(("job_1", "2015-11-10T01:33"), {"exitcode": "0"})],
+                  update=True)
+            self.assertEqual(dict(store["job_1"]["2015-11-10T01:33"]),
+                             {"cmd": "a", "exitcode": "0"})
+        self.assertEqual(
+            LogParser._get_struct(records),
+            {"job_1": {"2015-11-10T01:33": {"cmd": "a"},
+                       "2015-11-10T02:33": {"cmd": "b"}},
+             "job_2": {"2015-11-10T01:33": {"cmd": "c"}}})
+        self.assertRaises(ValueError, LogParser._get_records, [
+            {"job_id": "job_1", "timestamp": "2015-11-10T01:33"},
+            {"job_id": "job_1", "timestamp": "2015-11-10T01:33"}],
+            {"job_id": {"timestamp": {"custom_data": None}}})
+        self.assertRaises(ValueError, LogParser._get_hierarchy_keys,
+                          {"job_id": None, "timestamp": None})
+        self.assertEqual(LogParser._parse([], "log.txt"), [])
+        for data in ({}, ColumnarStore()):
+            parser = LogParser.isolated(data)
+            parser.create_index("cmd")
+            parser._merge(records[:1])
+            self.assertRaises(ValueError, parser._merge, records)
+            self.assertEqual(parser._timestamps["job_1"],
+                             [("2015-11-10T01:33",
+                               ("job_1", "2015-11-10T01:33"))])
+            self.assertEqual(parser._indexes["cmd"],
+                             {"a": set([("job_1", "2015-11-10T01:33")])})
+        LogParser.clear()
+        try:
+            LogParser._merge([])
+            self.assertEqual(LogParser.data, {})
+        finally:
+            LogParser.clear()
+
+    def test_columnar_store(self):
+        """ Test the columnar store gives the same data as the dictionaries.
+        """
+        descfile = os.path.join(self.demodir, "pylogparser_demo.json")
+        modify_descfile = tempfile.NamedTemporaryFile(suffix=".json").name
+        with open(descfile, "rt") as open_file:
+            jbuffer = open_file.read().replace("DEMODIR", self.demodir)
+        with open(modify_descfile, "wt") as open_file:
+            open_file.write(jbuffer)
+        LogParser.data.clear()
+        LogParser.load(modify_descfile)
+        data = LogParser.data
+        store = ColumnarStore()
+        LogParser.data = store
+        try:
+            LogParser.load(modify_descfile)
+            self.assertRaises(ValueError, LogParser.load, modify_descfile)
+        finally:
+            LogParser.data = data
+            os.remove(modify_descfile)
+        self.assertEqual(store, data)
+        self.assertEqual(store.to_dict(), data)
+        record = store["project2_freesurfer"]["0001"]["2015-11-10T01:33"]
+        self.assertEqual(record["exitcode"], "0")
+        self.assertNotIn("code_in_study", record)
+        record["status"] = "done"
+        self.assertEqual(
+            dict(record),
+            dict(data["project2_freesurfer"]["0001"]["2015-11-10T01:33"],
+                 status="done"))
+        self.assertEqual(len(store["project2_freesurfer"]["0003"]), 2)
+        tree(store, level=10, display_content=True)
+
+    @unittest.skipIf(python_version[:2] < (3, 7), "requires PEP 562")
+    def test_lazy_import(self):
+        """ Test the storage modules are imported on first access.
+        """
+        import subprocess
+        output = subprocess.check_output([
+            sys.executable, "-c",
+            "import sys, pylogparser; pylogparser.LogParser(); "
+            "print('elasticsearch' in sys.modules, "
+            "'dateutil' in sys.modules); "
+            "from pylogparser import match, SQLiteBackend; "
+            "print('elasticsearch' in sys.modules)"])
+        self.assertEqual(output.decode().split(), ["False", "False", "True"])
+        self.assertIn("LogStore", dir(pylogparser))
+        self.assertRaises(AttributeError, getattr, pylogparser, "unknown")
 
     def test_tree(self):
         """ Test the tree command.
@@ -155,9 +986,7 @@ class LogParserTests(unittest.TestCase):
             extract_keys=["subjectid"])
         tree(parser.data, level=10, display_content=True)
 
-    @mock.patch("elasticsearch.client.indices.IndicesClient.put_mapping")
-    @mock.patch("elasticsearch.Elasticsearch.index")
-    def test_dump_es(self, mock_es_index, mock_mapping):
+    def test_dump_es(self):
         """ Test the dump ElasticSearch function.
         """
         parser = LogParser()
@@ -182,64 +1011,295 @@ class LogParserTests(unittest.TestCase):
                 }
             },
             extract_keys=["subjectid"])
-        dump_log_es(parser.data, "dummy", "dummy", url="dummy", port=0,
-                    verbose=2)
-        self.assertEqual(len(mock_es_index.call_args_list), 1)
+        data = {"project2_dtifit": {"0001": {
+            "2015-11-09T14:59:22": {"exitcode": "0"},
+            "2015-11-10T14:59:22": {"exitcode": "1"},
+            "2015-11-11T14:59:22": {"exitcode": "0"}
+        }}}
+        with ElasticsearchStub() as stub:
+            stub.rejected_ids.add("2015-11-10T14:59:22")
+            errors = dump_log_es(parser.data, "dummy", "dummy",
+                                 url="localhost", port=stub.port, verbose=2)
+            self.assertEqual(errors, [])
+            self.assertEqual(len(stub.documents["project1_dtifit"]), 1)
+            errors = dump_log_es(data, "dummy", "dummy", url="localhost",
+                                 port=stub.port, chunk_size=2, workers=2)
+            requests = stub.requests
+        self.assertEqual([item["_id"] for item in errors],
+                         ["2015-11-10T14:59:22"])
+        self.assertEqual(
+            len(stub.documents["project2_dtifit"]["0001"]), 2)
+        self.assertEqual(
+            stub.mappings["project2_dtifit"]["0001"]["properties"],
+            {"timestamp": {"type": "date"}})
+        methods = [method for method, path in requests]
+        self.assertEqual(methods.count("PUT"), 2 * 2)
+        self.assertEqual(requests[-2:], [("POST", "/_bulk")] * 2)
 
-    @mock.patch("elasticsearch.client.indices.IndicesClient.get_aliases")
-    @mock.patch("elasticsearch.Elasticsearch.search")
-    def test_load_es(self, mock_es_search, mock_aliases):
+    def test_load_es(self):
         """ Test the load ElasticSearch function.
         """
-        mock_es_search.return_value = {
-            "took": 23,
-            "timed_out": False,
-            "_shards": {
-                "total": 1,
-                "successful": 1,
-                "failed": 0
+        data = {"index1": {"0001": OrderedDict(
+            ("2015-11-{0:02d}T14:59:22".format(day), {"test": str(day)})
+            for day in range(1, 26))}}
+        with ElasticsearchStub() as stub:
+            dump_log_es(data, "dummy", "dummy", url="localhost",
+                        port=stub.port)
+            data = load_log_es("dummy", "dummy", url="localhost",
+                               port=stub.port, verbose=2, size=10)
+            records = list(iter_log_es(
+                "dummy", "dummy", url="localhost", port=stub.port,
+                index="index1", preserve_order=False, size=10))
+            self.assertEqual(stub._scrolls, {})
+        self.assertEqual(len(data["index1"]["0001"]), 25)
+        self.assertEqual(list(data["index1"]["0001"].keys())[0],
+                         "2015-11-25T14:59:22")
+        self.assertEqual(data["index1"]["0001"]["2015-11-01T14:59:22"]["test"],
+                         "1")
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records[0][:2], ("index1", "0001"))
+
+    def test_match_es(self):
+        """ Test the match ElasticSearch function.
+        """
+        data = {
+            "index1": {
+                "0001": {
+                    "2015-11-09T14:59:22": {"exitcode": "1"},
+                    "2015-11-10T14:59:22": {"exitcode": "0"}
+                },
+                "0002": {
+                    "2015-11-09T14:59:22": {"exitcode": "0"}
+                }
             },
-            "hits": {
-                "total": 1,
-                "max_score": 1.0,
-                "hits": [{
-                    "_index": "index1",
-                    "_type": "0001",
-                    "_id": "1",
-                    "_score": 1.0,
-                    "_source": {
-                        "test": "ok",
-                    }
-                }]
+            "index2": {
+                "0004": {
+                    "2015-11-08T14:59:22": {"exitcode": 1},
+                    "2015-11-09T14:59:22": {"exitcode": 1},
+                    "2015-11-10T14:59:22": {"exitcode": "1"}
+                },
+                "0003": {
+                    "2015-11-09T14:59:22": {"exitcode": "1",
+                                            "hostname": "Node-1.cea.fr"}
+                }
             }
         }
-        mock_aliases.return_value = {"index1": None}
-        data = load_log_es("dummy", "dummy", url="dummy", port=0, verbose=2)
-        self.assertEqual(data["index1"]["0001"]["1"]["test"], "ok")
+        with ElasticsearchStub() as stub:
+            dump_log_es(data, "dummy", "dummy", url="localhost",
+                        port=stub.port)
+            self.assertEqual(
+                match("hostname", "dummy", "dummy", port=stub.port,
+                      match_value="Node-1.cea.fr"),
+                {"index2": {"0003": "Node-1.cea.fr"}})
+            stub.mappings["index2"]["0003"] = {}
+            self.assertEqual(
+                match("hostname", "dummy", "dummy", port=stub.port,
+                      match_value="Node-1.cea.fr"), {})
+            nb_requests = len(stub.requests)
+            kwargs = {"match_name": "exitcode", "login": "dummy",
+                      "password": "dummy", "url": "localhost",
+                      "port": stub.port}
+            latest = match(match_value=None, index="index1", doc_type=None,
+                           verbose=2, **kwargs)
+            self.assertEqual(len(stub.requests), nb_requests + 1)
+            failed = match(match_value="1", **kwargs)
+            failed_job = match(match_value="1", index="index1",
+                               doc_type="0002", **kwargs)
+            nb_requests = len(stub.requests)
+            failed_int = match(match_value=1, **kwargs)
+            self.assertEqual(len(stub.requests), nb_requests + 3)
+        self.assertEqual(latest, {"index1": {"0001": "0", "0002": "0"}})
+        self.assertEqual(failed, {"index1": {"0001": "1"},
+                                  "index2": {"0003": "1", "0004": "1"}})
+        self.assertEqual(failed_job, {})
+        self.assertEqual(failed_int, {"index2": {"0004": 1}})
 
-    @mock.patch("pylogparser.manager.load_log_es")
-    def test_match_es(self, mock_load):
-        """ Test the match ElasticSearch function.
+    def test_log_store(self):
+        """ Test the ElasticSearch session reuses its connections.
+        """
+        data = {"index1": {"0001": {"2015-11-09T14:59:22": {"exitcode": "1"}}}}
+        with ElasticsearchStub() as stub:
+            with LogStore("dummy", "dummy", url="localhost",
+                          port=stub.port) as store:
+                dump_log_es(data, None, None, store=store)
+                for cnt in range(5):
+                    matches = match("exitcode", None, None, store=store)
+                loaded = store.load()
+                self.assertEqual(store.match("exitcode"), matches)
+            self.assertEqual(stub.nb_connections, 1)
+            for cnt in range(2):
+                match("exitcode", "dummy", "dummy", url="localhost",
+                      port=stub.port)
+            self.assertEqual(stub.nb_connections, 3)
+        self.assertEqual(matches, {"index1": {"0001": "1"}})
+        self.assertEqual(loaded["index1"]["0001"]["2015-11-09T14:59:22"][
+            "exitcode"], "1")
+
+    def test_sqlite_backend(self):
+        """ Test the SQLite storage backend.
+        """
+        data = {
+            "index1": {
+                "0001": {
+                    "2015-11-09T14:59:22": {"exitcode": "1", "cmd": "a"},
+                    "2015-11-10T14:59:22": {"exitcode": "0", "cmd": "b"}
+                },
+                "0002": {
+                    "2015-11-09T14:59:22": {"exitcode": "1", "cmd": "a"}
+                }
+            },
+            "index2": {
+                "0003": {
+                    "2015-11-09T14:59:22": {"exitcode": 1.0, "score": 1.0}
+                }
+            }
+        }
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "log.db")
+            with SQLiteBackend(path, fields=["exitcode"],
+                               batch_size=2) as backend:
+                self.assertEqual(backend.dump(data), [])
+                self.assertEqual(backend.match("exitcode", "1"),
+                                 {"index1": {"0001": "1", "0002": "1"}})
+                self.assertEqual(backend.match("exitcode", index="index1"),
+                                 {"index1": {"0001": "0", "0002": "1"}})
+                for name in ("exitcode", "score"):
+                    for value in (1, 1.0, True):
+                        self.assertEqual(backend.match(name, value),
+                                         {"index2": {"0003": 1.0}})
+                self.assertEqual(backend.match("cmd", "a", doc_type="0001"),
+                                 {"index1": {"0001": "a"}})
+                plan = backend.connection.execute(
+                    "EXPLAIN QUERY PLAN SELECT project, job, data, "
+                    "MAX(timestamp) FROM fields JOIN records USING (project, "
+                    "job, timestamp) WHERE name = ? AND value = ? "
+                    "GROUP BY project, job", ("exitcode", "1")).fetchall()
+                self.assertIn("fields_value", str(plan))
+            with SQLiteBackend(path, fields=["cmd"]) as backend:
+                self.assertEqual(backend.fields, ["exitcode", "cmd"])
+                self.assertEqual(backend.match("cmd", "b"),
+                                 {"index1": {"0001": "b"}})
+                loaded = backend.load()
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(list(loaded["index1"]["0001"].keys()),
+                         ["2015-11-10T14:59:22", "2015-11-09T14:59:22"])
+        self.assertEqual(loaded["index1"]["0002"]["2015-11-09T14:59:22"],
+                         {"exitcode": "1", "cmd": "a",
+                          "timestamp": "2015-11-09T14:59:22"})
+
+    @unittest.skipIf(python_version[:2] < (3, 5), "requires asyncio")
+    def test_aio_es(self):
+        """ Test the asyncio ElasticSearch functions.
+        """
+        import asyncio
+        from elasticsearch import Elasticsearch
+        from pylogparser import aio
+        from pylogparser.testing import AsyncElasticsearchStub
+        data = dict(("index{0}".format(cnt), {"0001": {
+            "2015-11-09T14:59:22": {"exitcode": str(cnt % 2)},
+            "2015-11-10T14:59:22": {"exitcode": "0"}
+        }}) for cnt in range(4))
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            with ElasticsearchStub() as stub:
+                client = AsyncElasticsearchStub(
+                    Elasticsearch(["localhost"], port=stub.port))
+                errors = loop.run_until_complete(aio.dump_log_es(
+                    data, None, None, chunk_size=1, concurrency=2,
+                    client=client))
+                max_pending = client.max_pending
+                loaded, matches = loop.run_until_complete(asyncio.gather(
+                    aio.load_log_es(None, None, size=1, client=client),
+                    aio.match("exitcode", None, None, match_value="1",
+                              client=client)))
+                int_matches = loop.run_until_complete(aio.match(
+                    "exitcode", None, None, match_value=1, client=client))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(stub.documents), 4)
+        self.assertLessEqual(max_pending, 2)
+        self.assertEqual(sorted(loaded.keys()), sorted(data.keys()))
+        self.assertEqual(list(loaded["index0"]["0001"].keys()),
+                         ["2015-11-10T14:59:22", "2015-11-09T14:59:22"])
+        self.assertEqual(matches, {"index1": {"0001": "1"},
+                                   "index3": {"0001": "1"}})
+        self.assertEqual(int_matches, {})
+        self.assertRaises(ValueError, aio._get_client, None, None,
+                          "localhost", 9200, None)
+        chunks = aio._iter_chunks(data, 1, 2 ** 20)
+        self.assertEqual(next(chunks).count("\n"), 2)
+        self.assertEqual(len(list(chunks)), 7)
+
+    def test_aio_parse(self):
+        """ Test the asyncio parsing functions.
+        """
+        import asyncio
+        from pylogparser import aio
+        descfile = os.path.join(self.demodir, "pylogparser_demo.json")
+        modify_descfile = tempfile.NamedTemporaryFile(suffix=".json").name
+        with open(descfile, "rt") as open_file:
+            jbuffer = open_file.read().replace("DEMODIR", self.demodir)
+        with open(modify_descfile, "wt") as open_file:
+            open_file.write(jbuffer)
+        kwargs = {
+            "job_pattern": "job_\d+",
+            "timestamp_pattern": "\d{4}-\d{2}-\d{2}T\d{2}:\d{2}",
+            "custom_patterns": {
+                "exitcode": {"regex": "exitcode = \d", "splitter": (" = ", 1)}
+            }
+        }
+        logfiles = [os.path.join(self.demodir, basename)
+                    for basename in ("fsreconall_1.txt", "fsreconall_2.txt")]
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            results = loop.run_until_complete(asyncio.gather(
+                aio.load(modify_descfile),
+                *[aio.parse_logfile(logfile, data=ColumnarStore(), **kwargs)
+                  for logfile in logfiles]))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            os.remove(modify_descfile)
+        self.assertEqual(sorted(results[0].keys()),
+                         ["project2_dtifit", "project2_freesurfer"])
+        for logfile, data in zip(logfiles, results[1:]):
+            self.assertIsInstance(data, ColumnarStore)
+            self.assertEqual(
+                data.to_dict(),
+                LogParser._get_struct(
+                    LogParser._parse_logfile(logfile, **kwargs)))
+
+    def test_benchmark(self):
+        """ Test the benchmark suite on small synthetic logs.
         """
-        input_data = OrderedDict()
-        input_data["index1"] = OrderedDict()
-        input_data["index1"]["0001"] = OrderedDict()
-        input_data["index1"]["0001"]["1"] = OrderedDict()
-        input_data["index1"]["0001"]["1"]["timestamp"] = "1"
-        input_data["index1"]["0001"]["1"]["exitcode"] = "1"
-        input_data["index1"]["0001"]["2"] = OrderedDict()
-        input_data["index1"]["0001"]["2"]["timestamp"] = "2"
-        input_data["index1"]["0001"]["2"]["exitcode"] = "0"
-        input_data["index1"]["0002"] = OrderedDict()
-        input_data["index1"]["0002"]["1"] = OrderedDict()
-        input_data["index1"]["0002"]["1"]["timestamp"] = "3"
-        input_data["index1"]["0002"]["1"]["exitcode"] = "0"
-        mock_load.return_value = input_data
-        data = match(match_name="exitcode", login="dummy", password="dummy",
-                     url="dummy", port=0, match_value=None, index="index1",
-                     doc_type=None, verbose=0)
-        self.assertEqual(data["index1"]["0001"], "1")
-        self.assertEqual(data["index1"]["0002"], "0")
+        from pylogparser import benchmark
+        tmpdir = tempfile.mkdtemp()
+        try:
+            custom_patterns = benchmark.write_logfile(
+                os.path.join(tmpdir, "log.txt"), nb_jobs=3, nb_fields=6)
+            self.assertEqual(
+                sorted(custom_patterns.keys()),
+                ["cmd", "code_in_study", "exitcode", "field4", "field5",
+                 "hostname"])
+            LogParser.data["shared_job"] = {"2016-01-01T10:00": {}}
+            results = benchmark.benchmark_suite(
+                os.path.join(tmpdir, "suite"), nb_jobs=5, nb_fields=6,
+                nb_dirs=2, repeat=1)
+            self.assertIn("shared_job", LogParser.data)
+        finally:
+            LogParser.data.pop("shared_job", None)
+            shutil.rmtree(tmpdir)
+        self.assertEqual(
+            sorted(results.keys()),
+            ["_get_records", "_merge_records", "_parse", "dump_log_es",
+             "load", "load_log_es", "match", "tree"])
+        self.assertEqual(LogParser.data, {})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+##########################################################################
+# pylogparser - Copyright (C) AGrigis, 2016
+# Distributed under the terms of the CeCILL-B license, as published by
+# the CEA-CNRS-INRIA. Refer to the LICENSE file or to
+# http://www.cecill.info/licences/Licence_CeCILL-B_V1-en.html
+# for details.
+##########################################################################
+
+# System import
+from __future__ import print_function
+import re
+import datetime
+from collections import OrderedDict
+
+
+# The regular expression of each supported format directive
+_DIRECTIVES = {
+    "Y": r"(\d{4})",
+    "m": r"(\d{1,2})",
+    "d": r"(\d{1,2})",
+    "H": r"(\d{1,2})",
+    "M": r"(\d{1,2})",
+    "S": r"(\d{1,2})",
+    "f": r"(\d{1,6})"
+}
+
+
+class TimestampNormalizer(object):
+    """ Convert timestamps to the ISO 8601 format.
+
+    The format of the timestamps is detected once for each key (ie. a log
+    file or an ES type) among the candidate formats, and the timestamps are
+    converted by a compiled regular expression. The 'dateutil' parser is
+    only used when no candidate format matches. The last converted
+    timestamps are memorized.
+
+    Attributes
+    ----------
+    `formats`: list of str
+        the candidate 'strptime' formats, only the '%Y', '%m', '%d', '%H',
+        '%M', '%S' and '%f' directives are supported.
+    `cache_size`: int
+        the maximum number of memorized timestamps.
+
+    Methods
+    -------
+    normalize
+    """
+    # The default candidate formats, unambiguous with the 'dateutil' parser
+    default_formats = (
+        "%Y-%m-%dT%H:%M:%S.%f",
+        "%Y-%m-%dT%H:%M:%S",
+        "%Y-%m-%dT%H:%M",
+        "%Y-%m-%d %H:%M:%S.%f",
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%d %H:%M",
+        "%Y-%m-%d"
+    )
+
+    def __init__(self, formats=None, cache_size=4096):
+        """ Initialize the 'TimestampNormalizer' class.
+
+        Parameters
+        ----------
+        formats: list of str (optional, default None)
+            the candidate formats, if None the 'default_formats'.
+        cache_size: int (optional, default 4096)
+            the maximum number of memorized timestamps.
+
+        Raises
+        ------
+        ValueError: if a format directive is not supported.
+        """
+        self.formats = list(formats or self.default_formats)
+        self.cache_size = cache_size
+        self._patterns = [
+            (self._compile_format(fmt), "%f" in fmt) for fmt in self.formats]
+        self._key_patterns = {}
+        self._cache = OrderedDict()
+
+    def normalize(self, timestamp, key=None):
+        """ Convert a timestamp to the ISO 8601 format.
+
+        Parameters
+        ----------
+        timestamp: str (mandatory)
+            the timestamp to be converted.
+        key: object (optional, default None)
+            the timestamps group sharing the same format.
+
+        Returns
+        -------
+        timestamp: str
+            the ISO 8601 timestamp, as returned by the 'dateutil' parser.
+
+        Raises
+        ------
+        ValueError: if the timestamp can't be parsed.
+        """
+        result = self._cache.get(timestamp)
+        if result is not None:
+            return result
+        pattern = self._key_patterns.get(key)
+        result = None
+        if pattern is not None:
+            result = self._convert(pattern, timestamp)
+        if result is None:
+            for pattern in self._patterns:
+                result = self._convert(pattern, timestamp)
+                if result is not None:
+                    self._key_patterns[key] = pattern
+                    break
+        if result is None:
+            from dateutil import parser
+            result = parser.parse(timestamp).isoformat()
+        if len(self._cache) >= self.cache_size:
+            self._cache.popitem(last=False)
+        self._cache[timestamp] = result
+        return result
+
+    def _convert(self, pattern, timestamp):
+        """ Convert a timestamp with a compiled format.
+
+        Parameters
+        ----------
+        pattern: 2-uplet (mandatory)
+            the compiled format and a flag set if the format ends with
+            fractional seconds.
+        timestamp: str (mandatory)
+            the timestamp to be converted.
+
+        Returns
+        -------
+        timestamp: str
+            the ISO 8601 timestamp, None if the timestamp doesn't match the
+            format.
+        """
+        regex, fractional = pattern
+        match = regex.match(timestamp)
+        if match is None:
+            return None
+        fields = list(match.groups())
+        if fractional:
+            fields[-1] = fields[-1].ljust(6, "0")
+        try:
+            return datetime.datetime(*[int(field) for field in fields]
+                                     ).isoformat()
+        except ValueError:
+            return None
+
+    def _compile_format(self, fmt):
+        """ Compile a format.
+
+        Parameters
+        ----------
+        fmt: str (mandatory)
+            a 'strptime' format with at least the year, month and day
+            directives, and the directives in decreasing order of magnitude.
+
+        Returns
+        -------
+        regex: re.SRE_Pattern
+            the format regular expression, the groups are the date fields.
+
+        Raises
+        ------
+        ValueError: if a format directive is not supported.
+        """
+        parts = re.split(r"%(.)", fmt)
+        directives = "".join(parts[1::2])
+        if len(directives) < 3 or not "YmdHMSf".startswith(directives):
+            raise ValueError("Unsupported '{0}' timestamp format.".format(fmt))
+        regex = ""
+        for index, part in enumerate(parts):
+            regex += _DIRECTIVES[part] if index % 2 else re.escape(part)
+        return re.compile(regex + r"\Z")
@@ -8,6 +8,29 @@
 
 # System import
 from __future__ import print_function
+import io
+import bz2
+import gzip
+import types
+import locale
+# COMPATIBILITY: the abstract base classes have been moved in the
+# collections.abc module since python 3.3
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+# COMPATIBILITY: the lzma module is available since python 3.3
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+# The compressed formats magic bytes
+COMPRESSION_MAGICS = (
+    ("gzip", b"\x1f\x8b"),
+    ("bz2", b"BZh"),
+    ("xz", b"\xfd7zXZ\x00"))
 
 
 class Singleton(type):
@@ -29,13 +52,36 @@ class Singleton(type):
         return cls.instance
 
 
+class hybridmethod(object):
+    """ This decorator defines a method bound to the instance when it is
+    called on an instance and to the class when it is called on the class.
+    Thus the method attributes are the instance attributes, that default to
+    the class attributes.
+    """
+    def __init__(self, function):
+        """ Initialize the 'hybridmethod' class.
+
+        Parameters
+        ----------
+        function: callable (mandatory)
+            the decorated function.
+        """
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return types.MethodType(self.function, owner)
+        return types.MethodType(self.function, instance)
+
+
 def tree(data, padding=None, level=-1, display_content=False, current_level=0):
     """ Prints the tree structure of log data.
 
     Parameters
     ----------
     data: dict (mandatory)
-        the log data structure.
+        the log data structure, or any mapping such as a 'ColumnarStore'.
     padding: list of str (optional, default None)
         the tree left paddings.
     level: int (optional, default -1)
@@ -55,7 +101,7 @@ def tree(data, padding=None, level=-1, display_content=False, current_level=0):
         new_padding = padding + ["|", " "]
         if level != -1 and current_level == level:
             continue
-        if isinstance(value, dict):
+        if isinstance(value, Mapping):
             tree(value,
                  padding=new_padding,
                  level=level,
@@ -74,3 +120,67 @@ def with_metaclass(mcls):
         body.pop("__weakref__", None)
         return mcls(cls.__name__, cls.__bases__, body)
     return decorator
+
+
+def compression(path):
+    """ Detect the compression format of a file from its magic bytes.
+
+    Parameters
+    ----------
+    path: str (mandatory)
+        a file path.
+
+    Returns
+    -------
+    compression: str
+        the compression format in ('gzip', 'bz2', 'xz'), None if the file is
+        not compressed.
+    """
+    with open(path, "rb") as open_file:
+        header = open_file.read(6)
+    for name, magic in COMPRESSION_MAGICS:
+        if header.startswith(magic):
+            return name
+    return None
+
+
+def open_logfile(path, mode="rt"):
+    """ Open a log file, the compressed files are decompressed on the fly.
+
+    Parameters
+    ----------
+    path: str (mandatory)
+        a file path, the compression format is detected from its magic
+        bytes.
+    mode: str (optional, default 'rt')
+        the opening mode in ('rt', 'rb').
+
+    Returns
+    -------
+    open_file: file object
+        the opened file, the text mode decodes the file with the preferred
+        encoding and translates the line endings as the builtin 'open'.
+
+    Raises
+    ------
+    ValueError: if the mode is not recognize or if the xz format is not
+                supported.
+    """
+    if mode not in ("rt", "rb"):
+        raise ValueError("Unrecognize '{0}' mode.".format(mode))
+    fmt = compression(path)
+    if fmt is None:
+        return open(path, mode)
+    if fmt == "gzip":
+        open_file = gzip.GzipFile(path, "rb")
+    elif fmt == "bz2":
+        open_file = bz2.BZ2File(path, "rb")
+    elif lzma is not None:
+        open_file = lzma.LZMAFile(path, "rb")
+    else:
+        raise ValueError("The xz compressed log file '{0}' can't be opened "
+                         "without the 'lzma' module.".format(path))
+    if mode == "rb":
+        return open_file
+    return io.TextIOWrapper(
+        open_file, encoding=locale.getpreferredencoding(False))